@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+
+import pandas as pd
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from load_data.users_aggregate import USER_AGGREGATE_SELECT
+from load_data.captain_aggregate import CAPTAIN_AGGREGATE_SELECT
+from src import db
+from src.dashboard import DIM_CAPTAIN_SELECT, DIM_USER_SELECT, FACT_RIDE_SELECT
+from src.transform_data import (
+    SILVER_PARTITIONS, SILVER_TABLES, constraint_phases, create_partitions, create_table_queries_silver,
+)
+
+# Where baselines are read from / written to
+BENCHMARK_BASELINE = os.getenv(
+    "BENCHMARK_BASELINE", os.path.join(os.path.dirname(__file__), "gold_benchmark_baseline.json")
+)
+# Allowed slowdown (and extra buffer reads) over the baseline before a statement is flagged
+BENCHMARK_TOLERANCE = float(os.getenv("BENCHMARK_TOLERANCE", "0.25"))
+# Timing differences below this are noise, whatever the ratio
+MIN_REGRESSION_MS = 5.0
+
+DEFAULT_SCALES = [1, 10]
+DEFAULT_REPEAT = 3
+
+# -----------------------
+# Statements under test
+# -----------------------
+# Each is run against the synthetic data with silver.* pointed at the bench schema
+GOLD_STATEMENTS = {
+    "user_aggregate": USER_AGGREGATE_SELECT.format(ride_filter="", key_filter=""),
+    "captain_aggregate": CAPTAIN_AGGREGATE_SELECT.format(ride_filter="", key_filter=""),
+    # Dashboard star schema, as STAR_SCHEMA_SQL builds it (the fact table is written in ride_date order)
+    "fact_ride": f"{FACT_RIDE_SELECT} ORDER BY r.ride_date",
+    "dim_user": DIM_USER_SELECT,
+    "dim_captain": DIM_CAPTAIN_SELECT,
+}
+
+# -----------------------
+# Synthetic silver data
+# -----------------------
+# Rows per unit of scale; payments cover 95% of rides and feedback 70%.
+# Rides span the last 730 days, payments and feedback carry their ride's date
+SCALE_ROWS = {"users": 1000, "captains": 200, "rides": 10000}
+
+SYNTHETIC_DATA_SQL = {
+    'users': """
+        INSERT INTO {schema}.users
+        SELECT 'U' || i,
+               'User ' || i,
+               (ARRAY['Male', 'Female', 'Other'])[1 + i % 3],
+               18 + i % 50,
+               DATE '2023-01-01' + (i % 700)::int,
+               (ARRAY['Bangalore', 'Hyderabad', 'Chennai', 'Mumbai', 'Delhi'])[1 + i % 5]
+        FROM generate_series(1::bigint, :users) i
+    """,
+    'captains': """
+        INSERT INTO {schema}.captains
+        SELECT 'C' || i,
+               'Captain ' || i,
+               21 + i % 40,
+               i % 15,
+               (ARRAY['Bangalore', 'Hyderabad', 'Chennai', 'Mumbai', 'Delhi'])[1 + i % 5],
+               3 + (i % 200) / 100.0
+        FROM generate_series(1::bigint, :captains) i
+    """,
+    'rides': """
+        INSERT INTO {schema}.rides
+        SELECT 'R' || i,
+               'U' || (1 + (i * 7919) % :users),
+               'C' || (1 + (i * 104729) % :captains),
+               CURRENT_DATE - ((i * 31) % 730)::int,
+               'Loc ' || (i * 17) % 40,
+               'Loc ' || (i * 23) % 40,
+               ((i * 37) % 3000) / 100.0,
+               5 + (i * 13) % 60,
+               (ARRAY['completed', 'completed', 'completed', 'cancelled', 'no_show'])[1 + i % 5]
+        FROM generate_series(1::bigint, :rides) i
+    """,
+    'payments': """
+        INSERT INTO {schema}.payments
+        SELECT 'P' || i,
+               'R' || i,
+               (ARRAY['cash', 'upi', 'card', 'wallet'])[1 + i % 4],
+               fare,
+               pct,
+               round(fare * pct / 100, 2),
+               fare - round(fare * pct / 100, 2),
+               (ARRAY['success', 'success', 'success', 'failed'])[1 + i % 4],
+               CURRENT_DATE - ((i * 31) % 730)::int
+        FROM generate_series(1::bigint, :rides) i,
+             LATERAL (SELECT 50 + (i * 17) % 500 AS fare, (i % 5) * 5 AS pct) v
+        WHERE i % 20 <> 0
+    """,
+    'feedback': """
+        INSERT INTO {schema}.feedback
+        SELECT 'F' || i,
+               'R' || i,
+               (i % 11) / 2.0,
+               ((i * 3) % 11) / 2.0,
+               (ARRAY['late', 'rude', 'vehicle', 'route', 'payment', NULL])[1 + i % 6],
+               (ARRAY['Good ride', 'Could be better', 'Great captain', NULL])[1 + i % 4],
+               CURRENT_DATE - ((i * 31) % 730)::int
+        FROM generate_series(1::bigint, :rides) i
+        WHERE i % 10 < 7
+    """,
+}
+
+
+def bench_schema(scale):
+    return f"bench_silver_s{scale}"
+
+
+def _retarget(sql, schema):
+    return re.sub(r"\bsilver\.", f"{schema}.", sql)
+
+
+def load_synthetic_silver(conn, scale):
+    """(Re)create bench_silver_s<scale> with the silver DDL, keys and indexes and synthetic rows."""
+    schema = bench_schema(scale)
+    params = {table: rows * scale for table, rows in SCALE_ROWS.items()}
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {schema}"))
+    dbapi_conn = conn.connection.dbapi_connection
+    months = conn.execute(text(
+        "SELECT generate_series(date_trunc('month', CURRENT_DATE - 730), CURRENT_DATE, '1 month')::date"
+    )).scalars().all()
+    for table in SILVER_TABLES:
+        conn.execute(text(create_table_queries_silver[table].format(schema=schema)))
+        if table in SILVER_PARTITIONS:
+            with dbapi_conn.cursor() as cur:
+                create_partitions(cur, schema, table, months)
+        conn.execute(text(SYNTHETIC_DATA_SQL[table].format(schema=schema)), params)
+    # Same keys and indexes as a silver load builds, one statement at a time here
+    for statements in constraint_phases(SILVER_TABLES, schema):
+        for statement in statements:
+            conn.exec_driver_sql(statement.as_string(dbapi_conn))
+    for table in SILVER_TABLES:
+        conn.execute(text(f"ANALYZE {schema}.{table}"))
+    print(f"✅ Synthetic silver loaded into {schema} ({params['rides']} rides)")
+
+
+def _schema_exists(conn, schema):
+    return conn.execute(
+        text("SELECT 1 FROM information_schema.schemata WHERE schema_name = :schema"), {"schema": schema}
+    ).scalar() is not None
+
+
+# -----------------------
+# EXPLAIN (ANALYZE, BUFFERS)
+# -----------------------
+# Monthly partitions (rides_p202401, ...) are reported as their table
+PARTITION_SUFFIX = re.compile(r"_p\d{6}$")
+
+
+def _relation(node):
+    return PARTITION_SUFFIX.sub("", node["Relation Name"])
+
+
+def _plan_shape(node):
+    """Node types (and scanned relations) of a plan tree, e.g. HashAggregate(Hash Join(Seq Scan rides, ...)).
+
+    Runs of identical children, such as the partitions under an Append, are
+    shown once with a count: Append(Seq Scan rides x25).
+    """
+    label = node["Node Type"]
+    if "Relation Name" in node:
+        label += f" {_relation(node)}"
+    runs = []
+    for child in map(_plan_shape, node.get("Plans", [])):
+        if runs and runs[-1][0] == child:
+            runs[-1][1] += 1
+        else:
+            runs.append([child, 1])
+    if runs:
+        label += "(" + ", ".join(child if n == 1 else f"{child} x{n}" for child, n in runs) + ")"
+    return label
+
+
+def _scan_counts(node, counts=None):
+    """Scans per table; a partitioned table scanned once counts once, however many partitions it has."""
+    counts = {} if counts is None else counts
+    children = node.get("Plans", [])
+    if node["Node Type"] in ("Append", "Merge Append") and children and all("Relation Name" in c for c in children):
+        names = {_relation(child) for child in children}
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+    if "Relation Name" in node:
+        counts[_relation(node)] = counts.get(_relation(node), 0) + 1
+    for child in children:
+        _scan_counts(child, counts)
+    return counts
+
+
+def explain_statement(conn, sql, repeat=DEFAULT_REPEAT):
+    """Run EXPLAIN (ANALYZE, BUFFERS) repeat times; timings are the median over the runs."""
+    runs = [
+        conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")).scalar()[0]
+        for _ in range(repeat)
+    ]
+    plan = runs[-1]["Plan"]
+    return {
+        "planning_ms": round(statistics.median(run["Planning Time"] for run in runs), 3),
+        "execution_ms": round(statistics.median(run["Execution Time"] for run in runs), 3),
+        "shared_hit_blocks": plan.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": plan.get("Shared Read Blocks", 0),
+        "temp_blocks": plan.get("Temp Read Blocks", 0) + plan.get("Temp Written Blocks", 0),
+        "rows": plan.get("Actual Rows"),
+        "scans": _scan_counts(plan),
+        "shape": _plan_shape(plan),
+    }
+
+
+# -----------------------
+# Baselines
+# -----------------------
+def load_baseline(path=BENCHMARK_BASELINE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BENCHMARK_BASELINE):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"✅ Baseline written to {path}")
+
+
+def compare_to_baseline(result, base, tolerance=BENCHMARK_TOLERANCE):
+    """List of regressions of one statement's result against its baseline entry."""
+    if not base:
+        return []
+    regressions = []
+    if result["shape"] != base["shape"]:
+        regressions.append("plan changed")
+    slowdown = result["execution_ms"] - base["execution_ms"]
+    if slowdown > MIN_REGRESSION_MS and result["execution_ms"] > base["execution_ms"] * (1 + tolerance):
+        regressions.append(f"execution {base['execution_ms']:.1f} -> {result['execution_ms']:.1f} ms")
+    blocks = result["shared_hit_blocks"] + result["shared_read_blocks"]
+    base_blocks = base["shared_hit_blocks"] + base["shared_read_blocks"]
+    if blocks > base_blocks * (1 + tolerance):
+        regressions.append(f"buffers {base_blocks} -> {blocks}")
+    return regressions
+
+
+# -----------------------
+# Main
+# -----------------------
+def run_benchmark(scales=None, statements=None, repeat=DEFAULT_REPEAT, reuse=False):
+    """Time each gold statement at each scale; returns {"<statement>@<scale>": result}."""
+    scales = scales or DEFAULT_SCALES
+    statements = statements or list(GOLD_STATEMENTS)
+    results = {}
+    for scale in scales:
+        schema = bench_schema(scale)
+        with db.begin("gold") as conn:
+            if not (reuse and _schema_exists(conn, schema)):
+                load_synthetic_silver(conn, scale)
+        with db.begin("gold") as conn:
+            for name in statements:
+                results[f"{name}@{scale}"] = explain_statement(conn, _retarget(GOLD_STATEMENTS[name], schema), repeat)
+    return results
+
+
+def report(results, baseline):
+    rows = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        rows.append({
+            "statement": key,
+            "execution_ms": result["execution_ms"],
+            "baseline_ms": base["execution_ms"] if base else None,
+            "planning_ms": result["planning_ms"],
+            "shared_blocks": result["shared_hit_blocks"] + result["shared_read_blocks"],
+            "temp_blocks": result["temp_blocks"],
+            "scans": ", ".join(f"{table}x{n}" for table, n in sorted(result["scans"].items())),
+            "regressions": "; ".join(compare_to_baseline(result, base)) or ("-" if base else "no baseline"),
+        })
+    print(pd.DataFrame(rows).to_string(index=False))
+    return [row for row in rows if row["regressions"] not in ("-", "no baseline")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the gold SQL on synthetic silver data.")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help=f"scale factors; 1 = {SCALE_ROWS['rides']} rides")
+    parser.add_argument("--statements", nargs="+", choices=list(GOLD_STATEMENTS))
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--reuse", action="store_true", help="keep bench schemas that already exist")
+    parser.add_argument("--save-baseline", action="store_true", help="record these results as the new baseline")
+    parser.add_argument("--drop", action="store_true", help="drop the bench schemas afterwards")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.scales, args.statements, args.repeat, args.reuse)
+    baseline = load_baseline()
+    regressions = report(results, baseline)
+
+    if args.save_baseline:
+        save_baseline({**baseline, **results})
+    if args.drop:
+        with db.begin("gold") as conn:
+            for scale in args.scales:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {bench_schema(scale)} CASCADE"))
+
+    if regressions and not args.save_baseline:
+        print(f"⚠️ {len(regressions)} gold statement(s) regressed against {BENCHMARK_BASELINE}")
+        return 1
+    print("✅ No gold plan regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
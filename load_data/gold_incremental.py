@@ -0,0 +1,593 @@
+import os
+import time
+from datetime import date, datetime, timedelta
+from functools import partial
+
+from sqlalchemy import text
+
+from src import db, telemetry
+from load_data.users_aggregate import GOLD_USER_AGGREGATE_SQL, USER_AGGREGATE_SELECT
+from load_data.captain_aggregate import CAPTAIN_AGGREGATE_SQL, CAPTAIN_AGGREGATE_SELECT
+from load_data.reconciliation import run_concurrently
+from load_data.gold_views import refresh_gold_views, relation_kind
+
+# "incremental" upserts only affected users/captains; "full" rebuilds gold from all of silver;
+# "matview" keeps gold as materialized views refreshed concurrently (see gold_views)
+GOLD_MODE = os.getenv("GOLD_MODE", "incremental")
+# An incremental run turns into a verified full rebuild when the last one is older than this
+GOLD_FULL_REBUILD_DAYS = int(os.getenv("GOLD_FULL_REBUILD_DAYS", "7"))
+
+# Width of the booking_frequency window in GOLD_USER_AGGREGATE_SQL
+BOOKING_WINDOW_DAYS = 30
+
+# Per-key reconciliation groups keys by the first hex digits of md5(key):
+# 3 digits = 4096 buckets; 0 compares every key row by row
+RECONCILE_BUCKET_DIGITS = int(os.getenv("RECONCILE_BUCKET_DIGITS", "3"))
+
+# -----------------------
+# Aggregates maintained here
+# -----------------------
+# affected: temp table of keys to recompute, filled from the digest diff
+AGGREGATES = {
+    "user_aggregate": {
+        "key": "user_id",
+        "entity_table": "silver.users",
+        "select": USER_AGGREGATE_SELECT,
+        "full_sql": GOLD_USER_AGGREGATE_SQL,
+        "affected": "affected_users",
+        "ride_filter": "WHERE ride_id IN (SELECT r.ride_id FROM silver.rides r WHERE r.user_id IN (SELECT key FROM affected_users))",
+        "key_filter": "WHERE u.user_id IN (SELECT key FROM affected_users)",
+    },
+    "captain_aggregate": {
+        "key": "captain_id",
+        "entity_table": "silver.captains",
+        "select": CAPTAIN_AGGREGATE_SELECT,
+        "full_sql": CAPTAIN_AGGREGATE_SQL,
+        "affected": "affected_captains",
+        "ride_filter": "WHERE r.captain_id IN (SELECT key FROM affected_captains)",
+        "key_filter": "WHERE c.captain_id IN (SELECT key FROM affected_captains)",
+    },
+}
+
+# -----------------------
+# Change-detection state
+# -----------------------
+# One digest per ride (covering its payments and feedback), per user and per
+# captain, as of the last gold refresh.
+STATE_TABLES_SQL = """
+CREATE SCHEMA IF NOT EXISTS gold;
+CREATE TABLE IF NOT EXISTS gold.ride_digest (
+    ride_id VARCHAR PRIMARY KEY,
+    user_id VARCHAR,
+    captain_id VARCHAR,
+    ride_date DATE,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gold.user_digest (
+    user_id VARCHAR PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gold.captain_digest (
+    captain_id VARCHAR PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ride_digest_ride_date_idx ON gold.ride_digest (ride_date);
+CREATE TABLE IF NOT EXISTS gold.silver_digest (
+    table_name TEXT NOT NULL,
+    month DATE,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gold.aggregate_refresh_log (
+    refreshed_at TIMESTAMP NOT NULL DEFAULT now(),
+    mode TEXT NOT NULL,
+    window_date DATE NOT NULL,
+    affected_users INT,
+    affected_captains INT,
+    mismatched_rows INT,
+    seconds NUMERIC(10,3)
+);
+ALTER TABLE gold.aggregate_refresh_log
+    ADD COLUMN IF NOT EXISTS changed_months INT,
+    ADD COLUMN IF NOT EXISTS digested_rides INT,
+    ADD COLUMN IF NOT EXISTS changed_rides INT;
+"""
+
+# Only rides in changed months, and users/captains when their table changed,
+# are digested; {*_months} are month_filter() conditions, {users}/{captains}
+# "true" or "false". Payments and feedback carry their ride's ride_date.
+CURRENT_DIGESTS_SQL = """
+CREATE TEMP TABLE cur_ride_digest ON COMMIT DROP AS
+SELECT r.ride_id, r.user_id, r.captain_id, r.ride_date,
+       md5(r::text || '|' || COALESCE(p.payment_rows, '') || '|' || COALESCE(f.feedback_rows, '')) AS digest
+FROM silver.rides r
+LEFT JOIN (
+    SELECT p.ride_id, string_agg(p::text, ',' ORDER BY p.payment_id) AS payment_rows
+    FROM silver.payments p
+    WHERE {payment_months}
+    GROUP BY p.ride_id
+) p ON p.ride_id = r.ride_id
+LEFT JOIN (
+    SELECT f.ride_id, string_agg(f::text, ',' ORDER BY f.feedback_id) AS feedback_rows
+    FROM silver.feedback f
+    WHERE {feedback_months}
+    GROUP BY f.ride_id
+) f ON f.ride_id = r.ride_id
+WHERE {ride_months};
+
+CREATE TEMP TABLE cur_user_digest ON COMMIT DROP AS
+SELECT u.user_id, md5(u::text) AS digest FROM silver.users u WHERE {users};
+
+CREATE TEMP TABLE cur_captain_digest ON COMMIT DROP AS
+SELECT c.captain_id, md5(c::text) AS digest FROM silver.captains c WHERE {captains};
+"""
+
+# Rides added, removed or changed (their own row, payments or feedback) since
+# the last refresh; the stored digests are limited to what was re-digested
+CHANGED_ROWS_SQL = """
+CREATE TEMP TABLE changed_rides ON COMMIT DROP AS
+SELECT COALESCE(n.ride_id, o.ride_id) AS ride_id,
+       o.user_id AS old_user_id, o.captain_id AS old_captain_id,
+       n.user_id AS new_user_id, n.captain_id AS new_captain_id
+FROM (SELECT * FROM gold.ride_digest WHERE {digest_months}) o
+FULL JOIN cur_ride_digest n ON n.ride_id = o.ride_id
+WHERE o.digest IS DISTINCT FROM n.digest;
+
+CREATE TEMP TABLE changed_users ON COMMIT DROP AS
+SELECT COALESCE(n.user_id, o.user_id) AS user_id
+FROM (SELECT * FROM gold.user_digest WHERE {users}) o
+FULL JOIN cur_user_digest n ON n.user_id = o.user_id
+WHERE o.digest IS DISTINCT FROM n.digest;
+
+CREATE TEMP TABLE changed_captains ON COMMIT DROP AS
+SELECT COALESCE(n.captain_id, o.captain_id) AS captain_id
+FROM (SELECT * FROM gold.captain_digest WHERE {captains}) o
+FULL JOIN cur_captain_digest n ON n.captain_id = o.captain_id
+WHERE o.digest IS DISTINCT FROM n.digest;
+"""
+
+# Users also change when one of their rides leaves the booking_frequency
+# window between the last refresh date and today; unchanged rides are found
+# in gold.ride_digest, which still holds the previous refresh's rows
+AFFECTED_KEYS_SQL = """
+CREATE TEMP TABLE affected_users ON COMMIT DROP AS
+SELECT key FROM (
+    SELECT old_user_id AS key FROM changed_rides
+    UNION SELECT new_user_id FROM changed_rides
+    UNION SELECT user_id FROM changed_users
+    UNION SELECT user_id FROM gold.ride_digest
+    WHERE ride_date >= CAST(:last_window_date AS DATE) - :window_days
+      AND ride_date < CURRENT_DATE - :window_days
+) k
+WHERE key IS NOT NULL;
+
+CREATE TEMP TABLE affected_captains ON COMMIT DROP AS
+SELECT key FROM (
+    SELECT old_captain_id AS key FROM changed_rides
+    UNION SELECT new_captain_id FROM changed_rides
+    UNION SELECT captain_id FROM changed_captains
+) k
+WHERE key IS NOT NULL;
+"""
+
+# Only the changed digests are written back
+APPLY_DIGESTS_SQL = """
+DELETE FROM gold.ride_digest WHERE ride_id IN (SELECT ride_id FROM changed_rides);
+INSERT INTO gold.ride_digest
+SELECT n.* FROM cur_ride_digest n JOIN changed_rides c ON c.ride_id = n.ride_id;
+
+DELETE FROM gold.user_digest WHERE user_id IN (SELECT user_id FROM changed_users);
+INSERT INTO gold.user_digest
+SELECT n.* FROM cur_user_digest n JOIN changed_users c ON c.user_id = n.user_id;
+
+DELETE FROM gold.captain_digest WHERE captain_id IN (SELECT captain_id FROM changed_captains);
+INSERT INTO gold.captain_digest
+SELECT n.* FROM cur_captain_digest n JOIN changed_captains c ON c.captain_id = n.captain_id;
+"""
+
+RESET_DIGESTS_SQL = """
+TRUNCATE gold.ride_digest, gold.user_digest, gold.captain_digest;
+INSERT INTO gold.ride_digest SELECT * FROM cur_ride_digest;
+INSERT INTO gold.user_digest SELECT * FROM cur_user_digest;
+INSERT INTO gold.captain_digest SELECT * FROM cur_captain_digest;
+"""
+
+# Silver's recorded digests (see transform_data.DIGEST_TABLE): month digests
+# of rides, payments and feedback, one digest each for users and captains
+SILVER_DIGESTS_SQL = """
+SELECT table_name, month, digest FROM silver.table_digests
+"""
+
+
+# -----------------------
+# Helpers
+# -----------------------
+def _execute(conn, step, sql, params=None):
+    """Run one gold SQL step inside a gold.sql span."""
+    with telemetry.span("gold.sql", step=step):
+        return conn.execute(text(sql), params or {})
+
+
+def _scalar(conn, sql, **params):
+    return conn.execute(text(sql), params).scalar()
+
+
+def _columns(conn, table):
+    # pg_attribute rather than information_schema, which leaves out materialized views
+    rows = conn.execute(text(
+        "SELECT attname FROM pg_attribute "
+        "WHERE attrelid = to_regclass(:table) AND attnum > 0 AND NOT attisdropped ORDER BY attnum"
+    ), {"table": f"gold.{table}"})
+    return [row[0] for row in rows]
+
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def month_filter(column, months):
+    """SQL condition keeping rows of the given months (None: every row).
+
+    Runs of consecutive months become one range on column, so the planner
+    prunes the monthly partitions of silver instead of scanning them all.
+    """
+    if months is None:
+        return "true"
+    ranges = []
+    for month in sorted(months):
+        if ranges and ranges[-1][1] == month:
+            ranges[-1][1] = _next_month(month)
+        else:
+            ranges.append([month, _next_month(month)])
+    if not ranges:
+        return "false"
+    return "(" + " OR ".join(f"({column} >= DATE '{start}' AND {column} < DATE '{end}')" for start, end in ranges) + ")"
+
+
+def _silver_digests(conn):
+    """{(table, month): digest} recorded by the silver load; None when silver predates them."""
+    if conn.execute(text("SELECT to_regclass('silver.table_digests')")).scalar() is None:
+        return None
+    return {(table, month): digest for table, month, digest in conn.execute(text(SILVER_DIGESTS_SQL))}
+
+
+def silver_changes(conn, digests):
+    """What changed in silver since gold last read it: (months, users changed, captains changed).
+
+    Compares silver's recorded digests with the copy gold.silver_digest took
+    at the last refresh. months is None (every month) when either side is missing.
+    """
+    seen = {(table, month): digest for table, month, digest in conn.execute(
+        text("SELECT table_name, month, digest FROM gold.silver_digest"))}
+    if digests is None or not seen:
+        return None, True, True
+    changed = {part for part in digests.keys() | seen.keys() if digests.get(part) != seen.get(part)}
+    months = {month for _, month in changed if month is not None}
+    return months, ("users", None) in changed, ("captains", None) in changed
+
+
+def _save_silver_digests(conn, digests):
+    conn.execute(text("DELETE FROM gold.silver_digest"))
+    if digests:
+        conn.execute(text("INSERT INTO gold.silver_digest (table_name, month, digest) VALUES (:table, :month, :digest)"), [
+            {"table": table, "month": month, "digest": digest} for (table, month), digest in digests.items()
+        ])
+
+
+def _digest_scope(months, users, captains):
+    return {
+        "ride_months": month_filter("r.ride_date", months),
+        "payment_months": month_filter("p.ride_date", months),
+        "feedback_months": month_filter("f.ride_date", months),
+        "digest_months": month_filter("ride_date", months),
+        "users": "true" if users else "false",
+        "captains": "true" if captains else "false",
+    }
+
+
+def _last_refresh(conn, mode=None):
+    filter_sql = "WHERE mode = :mode" if mode else ""
+    return conn.execute(text(
+        f"SELECT refreshed_at, window_date FROM gold.aggregate_refresh_log {filter_sql} "
+        "ORDER BY refreshed_at DESC LIMIT 1"
+    ), {"mode": mode}).first()
+
+
+def _gold_ready(conn):
+    for name in AGGREGATES:
+        # Materialized views (GOLD_MODE=matview) cannot be upserted into
+        if relation_kind(conn, name) != "r":
+            return False
+    return _scalar(conn, "SELECT count(*) FROM gold.ride_digest") > 0 and _last_refresh(conn) is not None
+
+
+def _log_refresh(conn, mode, started, affected_users=None, affected_captains=None, mismatched_rows=None,
+                 changed_months=None, digested_rides=None, changed_rides=None):
+    conn.execute(text(
+        "INSERT INTO gold.aggregate_refresh_log "
+        "(mode, window_date, affected_users, affected_captains, mismatched_rows, seconds, "
+        "changed_months, digested_rides, changed_rides) "
+        "VALUES (:mode, CURRENT_DATE, :users, :captains, :mismatched, :seconds, :months, :digested, :changed)"
+    ), {
+        "mode": mode, "users": affected_users, "captains": affected_captains,
+        "mismatched": mismatched_rows, "seconds": round(time.perf_counter() - started, 3),
+        "months": changed_months, "digested": digested_rides, "changed": changed_rides,
+    })
+
+
+# -----------------------
+# Incremental refresh
+# -----------------------
+def upsert_aggregate(conn, name):
+    """Recompute the affected keys of one aggregate and upsert them; keys gone from silver are deleted."""
+    spec = AGGREGATES[name]
+    key = spec["key"]
+    columns = _columns(conn, name)
+    select_sql = spec["select"].format(ride_filter=spec["ride_filter"], key_filter=spec["key_filter"])
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in columns if col != key)
+
+    with telemetry.span("gold.sql", step="upsert", aggregate=name) as span:
+        conn.execute(text(
+            f"DELETE FROM gold.{name} WHERE {key} IN (SELECT key FROM {spec['affected']}) "
+            f"AND {key} NOT IN (SELECT {key} FROM {spec['entity_table']})"
+        ))
+        upserted = conn.execute(text(
+            f"INSERT INTO gold.{name} ({', '.join(columns)}) {select_sql} "
+            f"ON CONFLICT ({key}) DO UPDATE SET {updates}"
+        )).rowcount
+        span.count(rows_out=upserted)
+
+
+def refresh_incremental():
+    """Upsert only the users/captains whose silver rows changed since the last refresh.
+
+    Runs in one transaction. Silver's recorded digests say which months (and
+    whether users or captains) changed since gold last read them; only those
+    rides, payments and feedback are digested per row and diffed against
+    gold.*_digest, so the work follows the size of the change. The affected
+    keys are recomputed and upserted, and the changed digests written back.
+    """
+    started = time.perf_counter()
+    with db.begin("gold") as conn:
+        conn.execute(text(STATE_TABLES_SQL))
+        last = _last_refresh(conn)
+        digests = _silver_digests(conn)
+        months, users_changed, captains_changed = silver_changes(conn, digests)
+        scope = _digest_scope(months, users_changed, captains_changed)
+        with telemetry.span("gold.sql", step="current_digests") as span:
+            conn.execute(text(CURRENT_DIGESTS_SQL.format(**scope)))
+            digested_rides = _scalar(conn, "SELECT count(*) FROM cur_ride_digest")
+            span.count(rows_out=digested_rides)
+        _execute(conn, "changed_rows", CHANGED_ROWS_SQL.format(**scope))
+        changed_rides = _scalar(conn, "SELECT count(*) FROM changed_rides")
+        _execute(conn, "affected_keys", AFFECTED_KEYS_SQL, {
+            "last_window_date": last.window_date if last else date.today(),
+            "window_days": BOOKING_WINDOW_DAYS,
+        })
+        affected_users = _scalar(conn, "SELECT count(*) FROM affected_users")
+        affected_captains = _scalar(conn, "SELECT count(*) FROM affected_captains")
+
+        for name in AGGREGATES:
+            upsert_aggregate(conn, name)
+
+        _execute(conn, "apply_digests", APPLY_DIGESTS_SQL)
+        _save_silver_digests(conn, digests)
+        changed_months = None if months is None else len(months)
+        _log_refresh(
+            conn, "incremental", started, affected_users, affected_captains,
+            changed_months=changed_months, digested_rides=digested_rides, changed_rides=changed_rides,
+        )
+
+    print(
+        f"✅ Gold aggregates refreshed incrementally: "
+        f"{'all months' if months is None else f'{len(months)} changed months'}, {digested_rides} rides digested, "
+        f"{changed_rides} changed; {affected_users} users, {affected_captains} captains "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return {
+        "mode": "incremental", "affected_users": affected_users, "affected_captains": affected_captains,
+        "changed_months": changed_months, "digested_rides": digested_rides, "changed_rides": changed_rides,
+    }
+
+
+# -----------------------
+# Full rebuild + verification
+# -----------------------
+def count_mismatches(conn, name):
+    """Rows that differ between gold.<name> and a fresh full build (None if the columns differ)."""
+    spec = AGGREGATES[name]
+    columns = _columns(conn, name)
+    conn.execute(text(
+        f"CREATE TEMP TABLE fresh_{name} ON COMMIT DROP AS "
+        f"{spec['select'].format(ride_filter='', key_filter='')}"
+    ))
+    fresh_columns = [row[0] for row in conn.execute(text(f"SELECT * FROM fresh_{name} LIMIT 0")).cursor.description]
+    if fresh_columns != columns:
+        return None
+    return _scalar(conn, f"""
+        SELECT count(*) FROM (
+            (SELECT * FROM gold.{name} EXCEPT ALL SELECT * FROM fresh_{name})
+            UNION ALL
+            (SELECT * FROM fresh_{name} EXCEPT ALL SELECT * FROM gold.{name})
+        ) d
+    """)
+
+
+def verify_gold_aggregates():
+    """Compare the maintained gold tables with a fresh full build, without changing them."""
+    with db.begin("reconcile") as conn:
+        return {name: count_mismatches(conn, name) for name in AGGREGATES if _columns(conn, name)}
+
+
+# -----------------------
+# Per-key reconciliation
+# -----------------------
+# Rows are digested as md5(ROW(<gold columns>)::text); a bucket digest is the
+# row count plus the sum of the row digests, so it does not depend on row order.
+BUCKET_DIGEST = "COUNT(*) || ':' || SUM(('x' || left(digest, 15))::bit(60)::bigint)"
+
+
+def _row_digest(alias, columns):
+    return f"md5(ROW({', '.join(f'{alias}.{col}' for col in columns)})::text)"
+
+
+def _differing_buckets(conn, name, columns, digits):
+    spec = AGGREGATES[name]
+    key = spec["key"]
+    rows = conn.execute(text(f"""
+        WITH expected AS (
+            SELECT left(md5(e.{key}), :digits) AS bucket, {_row_digest('e', columns)} AS digest
+            FROM ({spec['select'].format(ride_filter='', key_filter='')}) e
+        ),
+        actual AS (
+            SELECT left(md5(g.{key}), :digits) AS bucket, {_row_digest('g', columns)} AS digest
+            FROM gold.{name} g
+        ),
+        expected_buckets AS (SELECT bucket, {BUCKET_DIGEST} AS digest FROM expected GROUP BY bucket),
+        actual_buckets AS (SELECT bucket, {BUCKET_DIGEST} AS digest FROM actual GROUP BY bucket)
+        SELECT COALESCE(e.bucket, a.bucket)
+        FROM expected_buckets e
+        FULL JOIN actual_buckets a ON a.bucket = e.bucket
+        WHERE e.digest IS DISTINCT FROM a.digest
+    """), {"digits": digits})
+    return [row[0] for row in rows]
+
+
+def _differing_keys(conn, name, columns, buckets, digits):
+    """Row-level comparison restricted to the keys of the given buckets."""
+    spec = AGGREGATES[name]
+    key, affected = spec["key"], spec["affected"]
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {affected} ON COMMIT DROP AS
+        SELECT key FROM (
+            SELECT {key} AS key FROM {spec['entity_table']}
+            UNION SELECT {key} FROM gold.{name}
+        ) k
+        WHERE left(md5(key), :digits) = ANY(:buckets)
+    """), {"digits": digits, "buckets": buckets})
+
+    changed_columns = ", ".join(
+        f"CASE WHEN e.{col} IS DISTINCT FROM g.{col} THEN '{col}' END" for col in columns if col != key
+    )
+    select_sql = spec["select"].format(ride_filter=spec["ride_filter"], key_filter=spec["key_filter"])
+    import pandas as pd  # only key reconciliation needs pandas; a gold refresh does not
+    return pd.read_sql(text(f"""
+        SELECT COALESCE(e.{key}, g.{key}) AS key,
+               CASE WHEN g.{key} IS NULL THEN 'missing_in_gold'
+                    WHEN e.{key} IS NULL THEN 'not_in_silver'
+                    ELSE 'different' END AS status,
+               CASE WHEN e.{key} IS NOT NULL AND g.{key} IS NOT NULL
+                    THEN array_to_string(ARRAY_REMOVE(ARRAY[{changed_columns}], NULL), ', ') END AS columns
+        FROM ({select_sql}) e
+        FULL JOIN (SELECT * FROM gold.{name} WHERE {key} IN (SELECT key FROM {affected})) g
+            ON g.{key} = e.{key}
+        WHERE {_row_digest('e', columns)} IS DISTINCT FROM {_row_digest('g', columns)}
+        ORDER BY 1
+    """), conn)
+
+
+def reconcile_keys(name, digits=None):
+    """Keys whose gold.<name> row differs from what silver gives now.
+
+    A first pass compares per-bucket digests of the expected rows (computed
+    from silver) and of gold; only keys in differing buckets are then
+    recomputed and compared row by row. Returns a DataFrame of key, status
+    (different, missing_in_gold, not_in_silver) and the differing columns.
+    """
+    digits = RECONCILE_BUCKET_DIGITS if digits is None else digits
+    with telemetry.span("reconcile.keys", aggregate=name) as span, db.begin("reconcile") as conn:
+        columns = _columns(conn, name)
+        if not columns:
+            raise RuntimeError(f"gold.{name} does not exist")
+        buckets = _differing_buckets(conn, name, columns, digits)
+        if buckets:
+            keys = _differing_keys(conn, name, columns, buckets, digits)
+        else:
+            import pandas as pd
+            keys = pd.DataFrame(columns=["key", "status", "columns"])
+        span.count(rejects=len(keys))
+
+    print(
+        f"{'⚠️' if len(keys) else '✅'} gold.{name}: {len(buckets)} of {16 ** digits} buckets differ, "
+        f"{len(keys)} keys differ ({span.wall_seconds:.2f}s)"
+    )
+    return keys
+
+
+def reconcile_all_keys(digits=None):
+    """reconcile_keys for every aggregate, side by side on separate connections."""
+    return run_concurrently({name: partial(reconcile_keys, name, digits) for name in AGGREGATES})
+
+
+def rebuild_full():
+    """Rebuild both aggregates from all of silver and reset the digest state.
+
+    When gold already exists it is first compared with the fresh build, so
+    drift in the incremental path shows up as mismatched_rows in the log.
+    """
+    started = time.perf_counter()
+    mismatched_rows = None
+    with db.begin("gold") as conn:
+        conn.execute(text(STATE_TABLES_SQL))
+        if all(_columns(conn, name) for name in AGGREGATES):
+            counts = []
+            for name in AGGREGATES:
+                with telemetry.span("gold.sql", step="count_mismatches", aggregate=name) as span:
+                    counts.append(count_mismatches(conn, name))
+                    # Drifted rows are the span's rejects
+                    span.count(rejects=counts[-1])
+            if None not in counts:
+                mismatched_rows = sum(counts)
+
+        for name, spec in AGGREGATES.items():
+            # Coming from GOLD_MODE=matview, the aggregate is still a materialized view
+            if relation_kind(conn, name) == "m":
+                conn.execute(text(f"DROP MATERIALIZED VIEW gold.{name} CASCADE"))
+            with telemetry.span("gold.sql", step="full_build", aggregate=name) as span:
+                conn.execute(text(spec["full_sql"]))
+                span.count(rows_out=_scalar(conn, f"SELECT count(*) FROM gold.{name}"))
+
+        digests = _silver_digests(conn)
+        _execute(conn, "current_digests", CURRENT_DIGESTS_SQL.format(**_digest_scope(None, True, True)))
+        _execute(conn, "reset_digests", RESET_DIGESTS_SQL)
+        _save_silver_digests(conn, digests)
+        _log_refresh(conn, "full", started, mismatched_rows=mismatched_rows)
+
+    if mismatched_rows:
+        print(f"⚠️ Incremental gold had drifted: {mismatched_rows} rows differed from the full rebuild")
+    print(f"✅ Gold aggregates fully rebuilt in {time.perf_counter() - started:.2f}s")
+    return {"mode": "full", "mismatched_rows": mismatched_rows}
+
+
+def refresh_gold_aggregates(mode=None):
+    """Refresh gold.user_aggregate and gold.captain_aggregate.
+
+    mode defaults to GOLD_MODE. Incremental runs fall back to a full rebuild
+    when gold or its digest state is missing, and when the last full rebuild
+    is older than GOLD_FULL_REBUILD_DAYS. "matview" hands gold (the dashboard
+    star schema included) over to gold_views, which refreshes it without
+    readers ever seeing a missing table.
+    """
+    mode = mode or GOLD_MODE
+    if mode not in ("incremental", "full", "matview"):
+        raise ValueError(f"Unknown GOLD_MODE '{mode}'")
+
+    if mode == "matview":
+        return {"mode": "matview", "views": refresh_gold_views()}
+
+    if mode == "incremental":
+        with db.begin("gold") as conn:
+            conn.execute(text(STATE_TABLES_SQL))
+            ready = _gold_ready(conn)
+            last_full = _last_refresh(conn, "full")
+        stale = last_full is None or datetime.now() - last_full.refreshed_at > timedelta(days=GOLD_FULL_REBUILD_DAYS)
+        if ready and not stale:
+            return refresh_incremental()
+
+    return rebuild_full()
+
+
+# -----------------------
+# Run standalone
+# -----------------------
+if __name__ == "__main__":
+    print(refresh_gold_aggregates())
@@ -0,0 +1,274 @@
+import os
+import re
+import time
+
+from sqlalchemy import text
+
+from src import db, telemetry
+from load_data.users_aggregate import USER_AGGREGATE_SELECT
+from load_data.captain_aggregate import CAPTAIN_AGGREGATE_SELECT
+from load_data.reconciliation import run_concurrently
+from src.dashboard import (
+    DASHBOARD_VIEW_SELECT, DIM_CAPTAIN_SELECT, DIM_USER_SELECT, DROP_KEYWORDS, FACT_RIDE_SELECT,
+)
+
+# Replacing a view (first build, or a changed definition) gives up instead
+# of queueing behind long-running readers
+VIEW_SWAP_LOCK_TIMEOUT = os.getenv("VIEW_SWAP_LOCK_TIMEOUT", "10s")
+
+# The materialized views read silver through the views transform_data keeps
+# in SILVER_VIEW_SCHEMA and repoints at every shadow swap, so they stay bound
+# to the live tables and are refreshed concurrently instead of rebuilt
+SILVER_VIEW_SCHEMA = "silver_views"
+SILVER_VIEW_TABLES = ["users", "captains", "rides", "payments", "feedback"]
+
+
+def _on_silver_views(select):
+    return re.sub(r"\bsilver\.", f"{SILVER_VIEW_SCHEMA}.", select)
+
+
+# -----------------------
+# Gold objects managed as materialized views
+# -----------------------
+# unique: columns of the unique index REFRESH ... CONCURRENTLY needs
+# indexes: further (non-unique) indexes, one per column
+# depends_on: other gold views read by this one; they are refreshed first
+# kind "view": a plain view, recreated in the same transaction whenever one
+#   of the materialized views it reads is replaced
+GOLD_VIEWS = {
+    "user_aggregate": {
+        "select": _on_silver_views(USER_AGGREGATE_SELECT.format(ride_filter="", key_filter="")),
+        "unique": ["user_id"],
+        "depends_on": [],
+    },
+    "captain_aggregate": {
+        "select": _on_silver_views(CAPTAIN_AGGREGATE_SELECT.format(ride_filter="", key_filter="")),
+        "unique": ["captain_id"],
+        "depends_on": [],
+    },
+    # Dashboard star schema (src/dashboard.py); matviews take no foreign keys
+    # and concurrent refreshes do not keep fact_ride in ride_date order
+    "dim_user": {
+        "select": _on_silver_views(DIM_USER_SELECT),
+        "unique": ["user_id"],
+        "depends_on": [],
+    },
+    "dim_captain": {
+        "select": _on_silver_views(DIM_CAPTAIN_SELECT),
+        "unique": ["captain_id"],
+        "depends_on": [],
+    },
+    "fact_ride": {
+        "select": _on_silver_views(FACT_RIDE_SELECT),
+        "unique": ["ride_id"],
+        "indexes": ["ride_date"],
+        "depends_on": [],
+    },
+    "dashboard_data": {
+        "kind": "view",
+        "select": DASHBOARD_VIEW_SELECT,
+        "depends_on": ["dim_user", "dim_captain", "fact_ride"],
+    },
+}
+
+VIEW_REFRESH_LOG_SQL = """
+CREATE SCHEMA IF NOT EXISTS gold;
+CREATE TABLE IF NOT EXISTS gold.view_refresh_log (
+    refreshed_at TIMESTAMP NOT NULL DEFAULT now(),
+    view_name TEXT NOT NULL,
+    action TEXT NOT NULL,
+    seconds NUMERIC(10,3) NOT NULL
+);
+"""
+
+# Schemas of the relations a gold view reads
+VIEW_SOURCES_SQL = """
+SELECT DISTINCT n.nspname
+FROM pg_rewrite rw
+JOIN pg_depend d ON d.classid = 'pg_rewrite'::regclass AND d.objid = rw.oid
+JOIN pg_class c ON c.oid = d.refobjid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE rw.ev_class = to_regclass(:view) AND d.refobjid <> rw.ev_class
+"""
+
+
+# -----------------------
+# Helpers
+# -----------------------
+def relation_kind(conn, name):
+    """'m' for a materialized view, 'v' for a view, 'r' for a table, None when gold.<name> does not exist."""
+    return conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": f"gold.{name}"}).scalar()
+
+
+def refresh_levels(names=None):
+    """Views grouped into levels: each level only reads views of earlier levels."""
+    pending = set(names or GOLD_VIEWS)
+    # Dependants of a refreshed view have to be refreshed too
+    for name in GOLD_VIEWS:
+        if any(dep in pending for dep in GOLD_VIEWS[name]["depends_on"]):
+            pending.add(name)
+    levels, done = [], set()
+    while pending:
+        level = [name for name in GOLD_VIEWS if name in pending and all(
+            dep in done or dep not in pending for dep in GOLD_VIEWS[name]["depends_on"]
+        )]
+        if not level:
+            raise ValueError(f"Cyclic gold view dependencies: {sorted(pending)}")
+        levels.append(level)
+        done.update(level)
+        pending.difference_update(level)
+    return levels
+
+
+def _needs_rebuild(conn, name):
+    # Missing, still a table, or built before the views read silver_views
+    # (bound to silver tables, which a schema swap moves to silver_prev)
+    if relation_kind(conn, name) != "m":
+        return True
+    sources = {row[0] for row in conn.execute(text(VIEW_SOURCES_SQL), {"view": f"gold.{name}"})}
+    return not sources <= {SILVER_VIEW_SCHEMA, "gold"}
+
+
+def _create_silver_views(conn):
+    # Only missing ones: existing views are repointed by the silver swap alone
+    conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SILVER_VIEW_SCHEMA}"))
+    for table in SILVER_VIEW_TABLES:
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": f"{SILVER_VIEW_SCHEMA}.{table}"}).scalar() is None:
+            conn.execute(text(f"CREATE VIEW {SILVER_VIEW_SCHEMA}.{table} AS SELECT * FROM silver.{table}"))
+
+
+def _drop(conn, name):
+    kind = relation_kind(conn, name)
+    if kind is not None:
+        conn.execute(text(f"DROP {DROP_KEYWORDS[kind]} gold.{name} CASCADE"))
+    return kind
+
+
+def _indexes(name):
+    """{index name: (unique, columns)} of a materialized view."""
+    spec = GOLD_VIEWS[name]
+    indexes = {f"{name}_key": (True, spec["unique"])}
+    for column in spec.get("indexes", []):
+        indexes[f"{name}_{column}_idx"] = (False, [column])
+    return indexes
+
+
+def _create_plain_view(conn, name):
+    """(Re)create a kind "view" entry once everything it reads exists; returns None until then."""
+    if any(relation_kind(conn, dep) is None for dep in GOLD_VIEWS[name]["depends_on"]):
+        return None
+    kind = _drop(conn, name)
+    conn.execute(text(f"CREATE VIEW gold.{name} AS {GOLD_VIEWS[name]['select']}"))
+    return "created" if kind is None else "replaced"
+
+
+def _begin_swap(conn):
+    # Swaps are short but may both recreate the same plain view, so they run one at a time
+    conn.execute(text("SELECT set_config('lock_timeout', :timeout, true)"), {"timeout": VIEW_SWAP_LOCK_TIMEOUT})
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('gold_views'))"))
+
+
+def _log(conn, name, action, started):
+    conn.execute(text(
+        "INSERT INTO gold.view_refresh_log (view_name, action, seconds) VALUES (:name, :action, :seconds)"
+    ), {"name": name, "action": action, "seconds": round(time.perf_counter() - started, 3)})
+
+
+# -----------------------
+# Build + refresh
+# -----------------------
+def create_view(name):
+    """Build gold.<name> as a new materialized view next to the old object, then swap it in.
+
+    Readers keep using the old object while the new one is populated; the
+    swap itself is a short drop + rename transaction.
+    """
+    spec = GOLD_VIEWS[name]
+    started = time.perf_counter()
+    indexes = _indexes(name)
+    with db.begin("gold") as conn:
+        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS gold.{name}_next"))
+        conn.execute(text(f"CREATE MATERIALIZED VIEW gold.{name}_next AS {spec['select']}"))
+        for index, (unique, columns) in indexes.items():
+            conn.execute(text(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX {index}_next ON gold.{name}_next ({', '.join(columns)})"
+            ))
+
+    with db.begin("gold") as conn:
+        _begin_swap(conn)
+        # Readers lock a plain view before the views it reads, so it is locked first here too
+        dependants = [
+            dependant for dependant, dep_spec in GOLD_VIEWS.items()
+            if dep_spec.get("kind") == "view" and name in dep_spec["depends_on"]
+        ]
+        for dependant in dependants:
+            if relation_kind(conn, dependant) is not None:
+                conn.execute(text(f"LOCK TABLE gold.{dependant} IN ACCESS EXCLUSIVE MODE"))
+        kind = _drop(conn, name)
+        conn.execute(text(f"ALTER MATERIALIZED VIEW gold.{name}_next RENAME TO {name}"))
+        for index in indexes:
+            conn.execute(text(f"ALTER INDEX gold.{index}_next RENAME TO {index}"))
+        # Plain views reading the old object went with it (CASCADE); bring them back before commit
+        for dependant in dependants:
+            _create_plain_view(conn, dependant)
+        action = "created" if kind is None else "replaced"
+        _log(conn, name, action, started)
+    return action, time.perf_counter() - started
+
+
+def refresh_view(name):
+    """REFRESH ... CONCURRENTLY gold.<name>, or (re)create it when it cannot be refreshed in place."""
+    started = time.perf_counter()
+    if GOLD_VIEWS[name].get("kind") == "view":
+        # A plain view reads live data; it only needs (re)creating when it is missing or not yet a view
+        with db.begin("gold") as conn:
+            if relation_kind(conn, name) == "v":
+                return "kept", time.perf_counter() - started
+            _begin_swap(conn)
+            action = _create_plain_view(conn, name)
+            if action is None:
+                raise RuntimeError(f"gold.{name} reads {GOLD_VIEWS[name]['depends_on']}, which do not all exist")
+            _log(conn, name, action, started)
+        return action, time.perf_counter() - started
+
+    with db.begin("gold") as conn:
+        rebuild = _needs_rebuild(conn, name)
+    if rebuild:
+        return create_view(name)
+
+    with db.begin("gold") as conn:
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY gold.{name}"))
+        _log(conn, name, "refreshed", started)
+    return "refreshed", time.perf_counter() - started
+
+
+def _traced_refresh(name):
+    with telemetry.span("gold.sql", step="refresh_view", view=name):
+        return refresh_view(name)
+
+
+def refresh_gold_views(names=None):
+    """Refresh the gold materialized views in dependency order; returns {view: (action, seconds)}.
+
+    Views of one level are refreshed concurrently, each on its own connection;
+    plain views come in a later level than the materialized views they read.
+    """
+    with db.begin("gold") as conn:
+        conn.execute(text(VIEW_REFRESH_LOG_SQL))
+        _create_silver_views(conn)
+
+    started = time.perf_counter()
+    results = {}
+    for level in refresh_levels(names):
+        results.update(run_concurrently({name: lambda name=name: _traced_refresh(name) for name in level}))
+    for name, (action, seconds) in results.items():
+        print(f"  gold.{name}: {action} in {seconds:.2f}s")
+    print(f"✅ Gold views refreshed in {time.perf_counter() - started:.2f}s")
+    return results
+
+
+# -----------------------
+# Run standalone
+# -----------------------
+if __name__ == "__main__":
+    refresh_gold_views()
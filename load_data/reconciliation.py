@@ -0,0 +1,76 @@
+import numbers
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+from src import db, telemetry
+
+# Absolute difference under which a numeric metric counts as reconciled
+TOLERANCE = 0.01
+
+
+# -----------------------
+# Query helpers
+# -----------------------
+def read_row(query, **attrs):
+    """Run a one-row query on its own pooled connection; returns (row, seconds).
+
+    attrs label the query's reconcile.query span.
+    """
+    # pandas is imported here rather than at module level: the gold stage
+    # imports this module for run_concurrently and should not pay for it
+    import pandas as pd
+
+    with telemetry.span("reconcile.query", **attrs) as span:
+        with db.connect("reconcile") as conn:
+            row = pd.read_sql(text(query), conn).iloc[0]
+    return row, span.wall_seconds
+
+
+def run_concurrently(jobs):
+    """Run {name: callable} in threads; returns {name: result} in the order of jobs."""
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = {name: pool.submit(telemetry.wrap(job)) for name, job in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+# -----------------------
+# Totals comparison
+# -----------------------
+def _compare(silver_val, gold_val):
+    if isinstance(silver_val, numbers.Number) and isinstance(gold_val, numbers.Number):
+        diff = silver_val - gold_val
+        return diff, "OK" if abs(diff) < TOLERANCE else "MISMATCH"
+    return None, "OK" if silver_val == gold_val else "MISMATCH"
+
+
+def reconcile_totals(metrics, silver_query, gold_query, name=None):
+    """Compare one-row silver and gold totals metric by metric.
+
+    Both queries run at the same time on separate connections; their timings
+    are reported on every row as "Silver Query (s)" / "Gold Query (s)".
+    name (the gold table) labels the telemetry spans.
+    """
+    with telemetry.span("reconcile.totals", aggregate=name) as span:
+        results = run_concurrently({
+            "silver": lambda: read_row(silver_query, aggregate=name, side="silver"),
+            "gold": lambda: read_row(gold_query, aggregate=name, side="gold"),
+        })
+        (silver_row, silver_seconds), (gold_row, gold_seconds) = results["silver"], results["gold"]
+
+        rows = []
+        for metric in metrics:
+            diff, status = _compare(silver_row[metric], gold_row[metric])
+            rows.append({
+                "Metric": metric,
+                "Silver": silver_row[metric],
+                "Gold": gold_row[metric],
+                "Difference": diff,
+                "Status": status,
+                "Silver Query (s)": round(silver_seconds, 3),
+                "Gold Query (s)": round(gold_seconds, 3),
+            })
+        # Mismatched metrics are the span's rejects
+        span.count(rows_in=len(rows), rows_out=len(rows), rejects=sum(row["Status"] != "OK" for row in rows))
+    import pandas as pd
+    return pd.DataFrame(rows)
@@ -1,99 +1,165 @@
 import os
-import psycopg2
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
 
-load_dotenv()
+from src import db
 
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
+# "matview" keeps the dashboard star schema as materialized views (see load_data/gold_views.py)
+GOLD_MODE = os.getenv("GOLD_MODE", "incremental")
 
-connection_str = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(connection_str)
+# -----------------------
+# Dashboard star schema
+# -----------------------
+# One fact row per ride with keys into the user and captain dimensions;
+# gold.dashboard_data is a thin view joining them back together for BI tools.
+# Everything grows linearly with rides.
+DIM_USER_SELECT = """
+SELECT user_id, name, gender, age, signup_date, city
+FROM silver.users
+"""
+
+DIM_CAPTAIN_SELECT = """
+SELECT captain_id, name, age, experience_years, city, rating
+FROM silver.captains
+"""
+
+# A ride can have several feedback rows (and, in principle, payments); both
+# are rolled up to the ride so the fact stays at ride grain
+FACT_RIDE_SELECT = """
+WITH ride_payments AS (
+    SELECT ride_id,
+           COUNT(*) AS payment_count,
+           MODE() WITHIN GROUP (ORDER BY payment_method) AS payment_method,
+           MODE() WITHIN GROUP (ORDER BY payment_status) AS payment_status,
+           SUM(fare) AS fare,
+           SUM(discount_amount) AS discount_amount,
+           SUM(final_amount) AS final_amount
+    FROM silver.payments
+    GROUP BY ride_id
+),
+ride_feedback AS (
+    SELECT ride_id,
+           COUNT(*) AS feedback_count,
+           ROUND(AVG(user_rating), 2) AS user_rating,
+           ROUND(AVG(captain_rating), 2) AS captain_rating,
+           MODE() WITHIN GROUP (ORDER BY issue_category) AS issue_category
+    FROM silver.feedback
+    GROUP BY ride_id
+)
+SELECT r.ride_id,
+       r.user_id,
+       r.captain_id,
+       r.ride_date,
+       r.pickup_loc,
+       r.drop_loc,
+       r.distance_km,
+       r.duration_min,
+       r.ride_status,
+       COALESCE(p.payment_count, 0) AS payment_count,
+       p.payment_method,
+       p.payment_status,
+       p.fare,
+       p.discount_amount,
+       p.final_amount,
+       COALESCE(f.feedback_count, 0) AS feedback_count,
+       f.user_rating,
+       f.captain_rating,
+       f.issue_category
+FROM silver.rides r
+LEFT JOIN ride_payments p ON p.ride_id = r.ride_id
+LEFT JOIN ride_feedback f ON f.ride_id = r.ride_id
+"""
+
+DASHBOARD_VIEW_SELECT = """
+SELECT f.ride_id,
+       f.ride_date,
+       f.user_id,
+       u.name AS user_name,
+       u.gender,
+       u.age AS user_age,
+       u.signup_date,
+       u.city AS user_city,
+       f.captain_id,
+       c.name AS captain_name,
+       c.age AS captain_age,
+       c.city AS captain_city,
+       c.rating AS captain_overall_rating,
+       f.pickup_loc,
+       f.drop_loc,
+       f.distance_km,
+       f.duration_min,
+       f.ride_status,
+       f.payment_count,
+       f.payment_method,
+       f.payment_status,
+       f.fare,
+       f.discount_amount,
+       f.final_amount,
+       f.feedback_count,
+       f.user_rating,
+       f.captain_rating AS feedback_captain_rating,
+       f.issue_category
+FROM gold.fact_ride f
+JOIN gold.dim_user u ON u.user_id = f.user_id
+JOIN gold.dim_captain c ON c.captain_id = f.captain_id
+"""
+
+STAR_SCHEMA_SQL = f"""
+CREATE TABLE gold.dim_user AS {DIM_USER_SELECT};
+ALTER TABLE gold.dim_user ADD PRIMARY KEY (user_id);
+
+CREATE TABLE gold.dim_captain AS {DIM_CAPTAIN_SELECT};
+ALTER TABLE gold.dim_captain ADD PRIMARY KEY (captain_id);
+
+-- Written in ride_date order, so the table starts out clustered on it
+CREATE TABLE gold.fact_ride AS {FACT_RIDE_SELECT} ORDER BY r.ride_date;
+ALTER TABLE gold.fact_ride ADD PRIMARY KEY (ride_id);
+ALTER TABLE gold.fact_ride ADD FOREIGN KEY (user_id) REFERENCES gold.dim_user (user_id);
+ALTER TABLE gold.fact_ride ADD FOREIGN KEY (captain_id) REFERENCES gold.dim_captain (captain_id);
+CREATE INDEX fact_ride_ride_date_idx ON gold.fact_ride (ride_date);
+ALTER TABLE gold.fact_ride CLUSTER ON fact_ride_ride_date_idx;
+
+CREATE VIEW gold.dashboard_data AS {DASHBOARD_VIEW_SELECT};
+
+ANALYZE gold.dim_user;
+ANALYZE gold.dim_captain;
+ANALYZE gold.fact_ride;
+"""
+
+# Dropped dependants first; the view goes before the tables it reads
+DASHBOARD_OBJECTS = ["dashboard_data", "fact_ride", "dim_user", "dim_captain"]
+
+DROP_KEYWORDS = {"r": "TABLE", "m": "MATERIALIZED VIEW", "v": "VIEW"}
+
+def drop_gold_relation(cur, name):
+    """Drop gold.<name> whether it is a table, materialized view or view."""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s);", (f"gold.{name}",))
+    row = cur.fetchone()
+    if row:
+        cur.execute(f"DROP {DROP_KEYWORDS[row[0]]} gold.{name} CASCADE;")
 
 def drop_and_create_gold_schema(conn):
     with conn.cursor() as cur:
         cur.execute("CREATE SCHEMA IF NOT EXISTS gold;")
     conn.commit()
 
-def drop_and_create_dashboard_table(conn):
+def drop_and_create_dashboard_tables(conn):
+    # One transaction: readers of gold.dashboard_data wait for the new build instead of failing
     with conn.cursor() as cur:
-        cur.execute("DROP TABLE IF EXISTS gold.dashboard_data CASCADE;")
-        cur.execute("""
-            CREATE TABLE gold.dashboard_data AS
-            WITH user_rides AS (
-                SELECT u.user_id,
-                       u.name AS user_name,
-                       u.gender,
-                       u.age AS user_age,
-                       u.signup_date,
-                       u.city AS user_city,
-                       r.ride_id,
-                       r.captain_id,
-                       r.ride_date,
-                       r.pickup_loc,
-                       r.drop_loc,
-                       r.distance_km,
-                       r.duration_min,
-                       r.ride_status
-                FROM silver.users u
-                LEFT JOIN silver.rides r ON u.user_id = r.user_id
-            ),
-            captain_rides AS (
-                SELECT c.captain_id,
-                       c.name AS captain_name,
-                       c.age AS captain_age,
-                       c.city AS captain_city,
-                       c.rating AS captain_rating,
-                       r.ride_id
-                FROM silver.captains c
-                LEFT JOIN silver.rides r ON c.captain_id = r.captain_id
-            ),
-            rides_with_payments AS (
-                SELECT r.*,
-                       p.payment_id,
-                       p.payment_method,
-                       p.fare,
-                       p.discount_percent,
-                       p.discount_amount,
-                       p.final_amount,
-                       p.payment_status
-                FROM user_rides r
-                LEFT JOIN silver.payments p ON r.ride_id = p.ride_id
-            ),
-            rides_with_feedback AS (
-                SELECT rwp.*,
-                       f.feedback_id,
-                       f.user_rating,
-                       f.captain_rating AS feedback_captain_rating,
-                       f.issue_category,
-                       f.comments
-                FROM rides_with_payments rwp
-                LEFT JOIN silver.feedback f ON rwp.ride_id = f.ride_id
-            )
-            SELECT rwf.*,
-                   cr.captain_name,
-                   cr.captain_age,
-                   cr.captain_city,
-                   cr.captain_rating AS captain_overall_rating
-            FROM rides_with_feedback rwf
-            FULL OUTER JOIN captain_rides cr
-                ON rwf.captain_id = cr.captain_id
-            ORDER BY rwf.user_id NULLS LAST, cr.captain_id NULLS LAST;
-        """)
+        for name in DASHBOARD_OBJECTS:
+            drop_gold_relation(cur, name)
+        cur.execute(STAR_SCHEMA_SQL)
     conn.commit()
 
 def main():
-    conn = psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT
-    )
+    if GOLD_MODE == "matview":
+        from load_data.gold_views import refresh_gold_views
+        refresh_gold_views(["dim_user", "dim_captain", "fact_ride"])
+        return
+
+    conn = db.raw_connection("gold")
     drop_and_create_gold_schema(conn)
-    drop_and_create_dashboard_table(conn)
+    drop_and_create_dashboard_tables(conn)
     conn.close()
-    print("Gold dashboard_data table created and populated.")
+    print("Gold dashboard star schema (fact_ride, dim_user, dim_captain, dashboard_data view) created and populated.")
 
 if __name__ == "__main__":
     main()
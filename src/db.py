@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+# -----------------------
+# Load environment variables
+# -----------------------
+_ = load_dotenv()
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_NAME = os.getenv("DB_NAME")
+
+connection_str = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# One pool per process, shared by every stage; size it for the widest fan-out
+# (TRANSFORM_WORKERS DDL threads, concurrent reconciliation/gold view queries)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections older than this are replaced at checkout instead of being reused
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# -----------------------
+# Per-stage session settings
+# -----------------------
+# Applied when a stage checks a connection out. A pooled connection keeps them
+# until a different stage takes it, so repeated checkouts by one stage cost
+# nothing extra. application_name is set to etl:<stage> as well, which shows
+# the stage holding each connection in pg_stat_activity.
+STAGE_SETTINGS = {
+    "bronze": {},
+    "silver": {"work_mem": "64MB", "maintenance_work_mem": "256MB"},
+    "gold": {"work_mem": "128MB"},
+    "reconcile": {"work_mem": "64MB"},
+    "push": {},
+}
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+_metrics_lock = threading.Lock()
+
+
+def _empty_metrics():
+    return {
+        "connects": 0,
+        "checkouts": 0,
+        "wait_seconds": 0.0,
+        "max_wait_seconds": 0.0,
+        "held_seconds": 0.0,
+        "max_held_seconds": 0.0,
+        "stages": {},
+    }
+
+
+_metrics = _empty_metrics()
+
+
+# -----------------------
+# Pool metrics
+# -----------------------
+def _stage_metrics(stage):
+    return _metrics["stages"].setdefault(stage or "-", {"checkouts": 0, "wait_seconds": 0.0, "held_seconds": 0.0})
+
+
+def _on_connect(dbapi_connection, connection_record):
+    with _metrics_lock:
+        _metrics["connects"] += 1
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checked_out_at"] = time.perf_counter()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    checked_out_at = connection_record.info.pop("checked_out_at", None)
+    if checked_out_at is None:
+        return
+    held = time.perf_counter() - checked_out_at
+    with _metrics_lock:
+        _metrics["held_seconds"] += held
+        _metrics["max_held_seconds"] = max(_metrics["max_held_seconds"], held)
+        _stage_metrics(connection_record.info.get("stage"))["held_seconds"] += held
+
+
+def _record_wait(stage, waited):
+    # Time to get a connection out of the pool: queueing behind other
+    # checkouts, plus the connect (and pre-ping) when one has to be opened
+    with _metrics_lock:
+        _metrics["checkouts"] += 1
+        _metrics["wait_seconds"] += waited
+        _metrics["max_wait_seconds"] = max(_metrics["max_wait_seconds"], waited)
+        stage_metrics = _stage_metrics(stage)
+        stage_metrics["checkouts"] += 1
+        stage_metrics["wait_seconds"] += waited
+
+
+def pool_metrics():
+    """Snapshot of this process's pool: checkout/connect counts, wait and hold times, per-stage totals."""
+    with _metrics_lock:
+        snapshot = {**_metrics, "stages": {stage: dict(values) for stage, values in _metrics["stages"].items()}}
+    if _engine is not None:
+        pool = _engine.pool
+        snapshot.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return snapshot
+
+
+def describe_pool_metrics():
+    metrics = pool_metrics()
+    stages = ", ".join(
+        f"{stage} {values['checkouts']}x/{values['wait_seconds']:.2f}s wait"
+        for stage, values in sorted(metrics["stages"].items())
+    )
+    return (
+        f"DB pool: {metrics['connects']} connections opened, {metrics['checkouts']} checkouts, "
+        f"{metrics['wait_seconds']:.2f}s waiting (max {metrics['max_wait_seconds']:.2f}s), "
+        f"{metrics['held_seconds']:.2f}s held (max {metrics['max_held_seconds']:.2f}s)"
+        + (f" [{stages}]" if stages else "")
+    )
+
+
+# -----------------------
+# Engine + connections
+# -----------------------
+def get_engine():
+    """The process-wide engine, created on first use."""
+    global _engine, _engine_pid, _metrics
+    with _engine_lock:
+        if _engine is None:
+            from sqlalchemy import create_engine, event
+
+            _engine = create_engine(
+                connection_str,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=True,
+            )
+            event.listen(_engine, "connect", _on_connect)
+            event.listen(_engine, "checkout", _on_checkout)
+            event.listen(_engine, "checkin", _on_checkin)
+            _engine_pid = os.getpid()
+        elif _engine_pid != os.getpid():
+            # Forked worker (the silver process pool): never touch the parent's
+            # connections, start an empty pool of its own
+            _engine.dispose(close=False)
+            _engine_pid = os.getpid()
+            with _metrics_lock:
+                _metrics = _empty_metrics()
+    return _engine
+
+
+def _check_stage(stage):
+    if stage is not None and stage not in STAGE_SETTINGS:
+        raise ValueError(f"Unknown stage '{stage}'")
+
+
+def _apply_stage(dbapi_connection, info, stage):
+    if info.get("stage") == stage:
+        return
+    with dbapi_connection.cursor() as cur:
+        if info.get("stage") is not None:
+            cur.execute("RESET ALL")
+        if stage is not None:
+            settings = {"application_name": f"etl:{stage}", **STAGE_SETTINGS[stage]}
+            cur.execute(
+                "SELECT " + ", ".join("set_config(%s, %s, false)" for _ in settings),
+                [part for item in settings.items() for part in item],
+            )
+    dbapi_connection.commit()
+    info["stage"] = stage
+
+
+def raw_connection(stage=None):
+    """A psycopg2 connection from the shared pool; close() hands it back."""
+    _check_stage(stage)
+    start = time.perf_counter()
+    conn = get_engine().raw_connection()
+    _record_wait(stage, time.perf_counter() - start)
+    try:
+        _apply_stage(conn.dbapi_connection, conn.info, stage)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+@contextmanager
+def connect(stage=None):
+    """Like engine.connect(), with the stage's session settings applied."""
+    _check_stage(stage)
+    start = time.perf_counter()
+    with get_engine().connect() as conn:
+        _record_wait(stage, time.perf_counter() - start)
+        fairy = conn.connection
+        _apply_stage(fairy.dbapi_connection, fairy.info, stage)
+        yield conn
+
+
+@contextmanager
+def begin(stage=None):
+    """Like engine.begin(), with the stage's session settings applied."""
+    with connect(stage) as conn, conn.begin():
+        yield conn
@@ -1,106 +1,338 @@
+import argparse
+import importlib
+import os
 import sys
+import time
 import traceback
 from datetime import datetime
-import importlib
-import os
-import pandas as pd
+
+# Lets `python src/etl.py` resolve the src/load_data/transform packages like `python -m src.etl`
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import telemetry
 
 # Use logs/etl_log.txt for logging
 LOG_FILE = os.path.join(os.path.dirname(__file__), '../logs/etl_log.txt')
+REPORT_DIR = os.path.join(os.path.dirname(__file__), '../test')
+
+# Opened once and line-buffered, rather than reopened for every message
+_log_file = None
 
 def log_message(message, level="INFO"):
+    global _log_file
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     log_line = f"[{timestamp}] {level} - {message}"
     print(log_line)
-    with open(LOG_FILE, "a") as f:
-        f.write(log_line + "\n")
+    if _log_file is None:
+        _log_file = open(LOG_FILE, "a", buffering=1)
+    _log_file.write(log_line + "\n")
+
+# Pipeline stages in run order; --stages picks a subset
+STAGES = ["extract", "bronze", "silver", "gold", "reconcile", "push"]
+
+# Silver tables each gold aggregate is built from
+GOLD_DEPENDENCIES = {
+    "user_aggregate": {"users", "rides", "payments", "feedback"},
+    "captain_aggregate": {"captains", "rides", "payments", "feedback"},
+}
+
+# "totals" compares silver and gold totals per metric; "keys" lists the users/captains
+# whose gold row differs from silver (hash-bucketed, in the database); "both" does both
+RECONCILE_MODE = os.getenv("RECONCILE_MODE", "totals")
+
+# Set ETL_FORCE_FULL=1 to ignore the run manifest and reprocess every tab
+FORCE_FULL = os.getenv("ETL_FORCE_FULL", "0") == "1"
 
-def run_etl():
+class StopRun(Exception):
+    """Raised by a stage when there is nothing left for the later stages to do."""
+
+class RunFailed(Exception):
+    """Raised by a stage whose failure fails the whole run (exit status 1)."""
+
+# -----------------------
+# Lazy imports
+# -----------------------
+# Stage modules (and the Google client, pandas and SQLAlchemy behind them) are
+# imported by the stage that needs them, so a gold-only or reconcile-only run
+# does not pay for extraction. {module: (seconds, modules loaded)} for --import-profile.
+IMPORT_TIMES = {}
+
+def load_module(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    loaded_before = len(sys.modules)
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES[name] = (time.perf_counter() - start, len(sys.modules) - loaded_before)
+    return module
+
+def log_import_profile():
+    total = sum(seconds for seconds, _ in IMPORT_TIMES.values())
+    log_message(f"⏱️ Imports took {total:.2f}s across {len(IMPORT_TIMES)} stage modules")
+    for name, (seconds, modules) in sorted(IMPORT_TIMES.items(), key=lambda item: -item[1][0]):
+        log_message(f"   {name}: {seconds:.3f}s ({modules} modules)")
+
+# -----------------------
+# Stages
+# -----------------------
+# Each stage reads and extends `run`, the state shared by the stages of one run.
+def extract_stage(run):
+    log_message("🔄 Running Extraction...")
+    extraction = load_module("src.extraction")
+    manifest_store = load_module("src.manifest")
+    manifest = manifest_store.load_manifest()
+
+    modified_time = None
     try:
-        log_message("🚀 ETL Pipeline Started")
+        modified_time = extraction.get_spreadsheet_modified_time()
+    except Exception as e:
+        log_message(f"⚠️ Could not read spreadsheet modifiedTime, falling back to content hashes: {e}", level="WARNING")
+    if not FORCE_FULL and modified_time and modified_time == manifest.get("modified_time"):
+        raise StopRun(f"⏭️ Spreadsheet unchanged since last run (modifiedTime {modified_time}), nothing to do")
 
-        # --- Extraction + Bronze Load ---
-        log_message("🔄 Running Extraction + Bronze Dataset Load...")
-        extraction = importlib.import_module("src.extraction")
-        try:
-            extraction.export_sheets_to_csv()
-            for sheet_name, csv_file in extraction.SHEETS.items():
-                log_message(f"✅ Sheet '{sheet_name}' exported to CSV: {os.path.join(extraction.CSV_DIR, csv_file)}")
-        except Exception as e:
-            log_message(f"❌ Failed to export sheets: {e}", level="ERROR")
-            log_message(traceback.format_exc(), level="ERROR")
-            sys.exit(1)
-
-        schema_name = "bronze"
-        with extraction.engine.connect() as conn:
-            conn.execute(extraction.text(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"'))
-            for table_name, create_query in extraction.create_table_queries.items():
-                try:
-                    conn.execute(extraction.text(create_query.format(schema=schema_name)))
-                    log_message(f"✅ Table '{table_name}' created or exists in schema '{schema_name}'")
-                except Exception as e:
-                    log_message(f"❌ Failed to create table '{table_name}': {e}", level="ERROR")
-            conn.commit()
-
-        for table_name, csv_file in extraction.SHEETS.items():
+    try:
+        extract_start = time.perf_counter()
+        all_values, latencies = extraction.fetch_all_sheets()
+        extract_elapsed = time.perf_counter() - extract_start
+        for sheet_name in extraction.SHEETS:
+            log_message(f"✅ Sheet '{sheet_name}' fetched in {latencies.get(sheet_name, 0):.2f}s")
+        log_message(
+            f"⏱️ Extraction ({extraction.EXTRACT_MODE}) took {extract_elapsed:.2f}s, "
+            f"slowest tab {max(latencies.values(), default=0):.2f}s"
+        )
+    except Exception as e:
+        raise RunFailed(f"Failed to export sheets: {e}") from e
+
+    fingerprints = {
+        sheet_name: manifest_store.fingerprint_values(values)
+        for sheet_name, values in all_values.items() if values
+    }
+    changed = fingerprints.keys() if FORCE_FULL else manifest_store.changed_tabs(fingerprints, manifest)
+    changed = [sheet_name for sheet_name in extraction.SHEETS if sheet_name in changed]
+    unchanged = [sheet_name for sheet_name in fingerprints if sheet_name not in changed]
+    if unchanged:
+        log_message(f"⏭️ Unchanged sheets skipped: {', '.join(unchanged)}")
+
+    run.update(
+        manifest=manifest, modified_time=modified_time, all_values=all_values,
+        fingerprints=fingerprints, changed=changed, unchanged=unchanged,
+    )
+
+def bronze_stage(run):
+    log_message("🔄 Running Bronze Dataset Load...")
+    db = load_module("src.db")
+    extraction = load_module("src.extraction")
+
+    schema_name = "bronze"
+    with db.connect("bronze") as conn:
+        conn.execute(extraction.text(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"'))
+        for table_name, create_query in extraction.create_table_queries.items():
             try:
-                extraction.load_csv_to_db_raw(schema_name, table_name, csv_file)
-                log_message(f"✅ CSV '{csv_file}' loaded into table '{table_name}'")
+                conn.execute(extraction.text(create_query.format(schema=schema_name)))
+                log_message(f"✅ Table '{table_name}' created or exists in schema '{schema_name}'")
             except Exception as e:
-                log_message(f"❌ Failed to load CSV '{csv_file}' into table '{table_name}': {e}", level="ERROR")
-
-        log_message("✅ Extraction + Bronze Load Completed Successfully")
+                log_message(f"❌ Failed to create table '{table_name}': {e}", level="ERROR")
+        conn.commit()
 
-        # --- transform / Silver Load ---
-        log_message("🔄 Running transform + Silver/Audit Load...")
-        transform_data = importlib.import_module("src.transform_data")
+    # Rows are streamed from the Sheets response straight into COPY; the CSV
+    # in bronze_inputs is written alongside as a snapshot for the cleaners.
+    loaded = []
+    for table_name, csv_file in extraction.SHEETS.items():
+        values = run["all_values"].get(table_name)
+        if not values:
+            log_message(f"⚠️ Sheet '{table_name}' returned no data, skipping bronze load", level="WARNING")
+            continue
+        snapshot = csv_file if extraction.BRONZE_CSV_SNAPSHOT else None
+        if table_name not in run["changed"]:
+            # Only restore a missing snapshot; bronze already holds these rows
+            if snapshot and not os.path.exists(os.path.join(extraction.CSV_DIR, csv_file)):
+                extraction.write_sheet_csv(values, csv_file)
+            continue
         try:
-            transform_data.main_pipeline()
-            log_message("✅ transform + Silver/Audit Load Completed Successfully")
+            row_count = extraction.copy_rows_to_bronze(schema_name, table_name, values, snapshot)
+            loaded.append(table_name)
+            log_message(f"✅ {row_count} rows streamed into table '{schema_name}.{table_name}'")
+            if snapshot:
+                log_message(f"✅ Sheet '{table_name}' snapshot written to {os.path.join(extraction.CSV_DIR, csv_file)}")
         except Exception as e:
-            log_message(f"❌ transform pipeline failed: {e}", level="ERROR")
-            log_message(traceback.format_exc(), level="ERROR")
-            sys.exit(1)
+            log_message(f"❌ Failed to load sheet '{table_name}' into table '{table_name}': {e}", level="ERROR")
 
-        # --- Gold Aggregates + Reconciliation ---
-        log_message("🔄 Running Gold Aggregates for Users and Captains...")
+    log_message("✅ Extraction + Bronze Load Completed Successfully")
+    run["loaded"] = loaded
+    if not loaded:
+        run["complete"] = True
+        raise StopRun("⏭️ No sheet changed since the last run, skipping silver, gold and push")
 
-        user_aggregate = importlib.import_module("load_data.users_aggregate")
-        captain_aggregate = importlib.import_module("load_data.captain_aggregate")
-        push_to_sheets = importlib.import_module("push_gold_to_sheets")  # New import for sheets push
+def silver_stage(run):
+    log_message("🔄 Running transform + Silver/Audit Load...")
+    transform_data = load_module("src.transform_data")
+    # Without a bronze stage in this run every table is rebuilt from the bronze CSVs
+    tables = None if FORCE_FULL or "loaded" not in run else run["loaded"]
+    try:
+        rebuilt = transform_data.main_pipeline(tables=tables)
+        log_message(f"✅ transform + Silver/Audit Load Completed Successfully (rebuilt: {', '.join(rebuilt)})")
+    except Exception as e:
+        raise RunFailed(f"transform pipeline failed: {e}") from e
+    run["rebuilt"] = rebuilt
 
-        try:
-            user_aggregate.create_or_replace_gold_user_aggregate()
-            captain_aggregate.create_or_replace_captain_aggregate()
+def gold_stage(run):
+    log_message("🔄 Running Gold Aggregates for Users and Captains...")
+    # Without a silver stage in this run, gold is refreshed regardless; the
+    # incremental mode finds out itself what changed
+    if "rebuilt" in run and not any(deps & set(run["rebuilt"]) for deps in GOLD_DEPENDENCIES.values()):
+        log_message("⏭️ No silver table behind the gold aggregates was rebuilt, gold left as is")
+        return
+    gold_incremental = load_module("load_data.gold_incremental")
+    # Both aggregates are refreshed together from one diff of silver
+    gold_start = time.perf_counter()
+    gold_result = gold_incremental.refresh_gold_aggregates()
+    log_message(f"✅ Gold aggregates refreshed ({gold_result['mode']}) in {time.perf_counter() - gold_start:.2f}s")
+
+def reconcile_stage(run):
+    log_message("🔄 Running Reconciliation...")
+    pd = load_module("pandas")
+    if RECONCILE_MODE in ("totals", "both"):
+        user_aggregate = load_module("load_data.users_aggregate")
+        captain_aggregate = load_module("load_data.captain_aggregate")
+        reconciliation = load_module("load_data.reconciliation")
+        # User and captain reconciliation run side by side on their own connections
+        reports = reconciliation.run_concurrently({
+            "User": user_aggregate.reconcile_silver_gold,
+            "Captain": captain_aggregate.reconcile_captain_aggregates,
+        })
+        for entity, report in reports.items():
+            report["Entity"] = entity
+            log_message(
+                f"⏱️ {entity} reconciliation queries: silver {report['Silver Query (s)'].iloc[0]:.2f}s, "
+                f"gold {report['Gold Query (s)'].iloc[0]:.2f}s"
+            )
+        merged_report = pd.concat(reports.values(), ignore_index=True)
+        merged_report_file = os.path.join(REPORT_DIR, "reconciliation_report.csv")
+        merged_report.to_csv(merged_report_file, index=False)
+        log_message(f"✅ Merged reconciliation report saved as {merged_report_file}")
+
+    if RECONCILE_MODE in ("keys", "both"):
+        gold_incremental = load_module("load_data.gold_incremental")
+        key_reports = gold_incremental.reconcile_all_keys()
+        for name, keys in key_reports.items():
+            keys.insert(0, "Aggregate", name)
+            level = "WARNING" if len(keys) else "INFO"
+            log_message(f"{'⚠️' if len(keys) else '✅'} {name}: {len(keys)} keys differ from silver", level=level)
+        key_report_file = os.path.join(REPORT_DIR, "reconciliation_keys.csv")
+        pd.concat(key_reports.values(), ignore_index=True).to_csv(key_report_file, index=False)
+        log_message(f"✅ Per-key reconciliation saved as {key_report_file}")
+
+def push_stage(run):
+    push_to_sheets = load_module("src.push_gold_to_sheets")
+    try:
+        push_to_sheets.push_gold_aggregates_to_sheets()
+        log_message("✅ Gold aggregates pushed to Google Sheets successfully.")
+        run["complete"] = True
+    except Exception as e:
+        log_message(f"❌ Failed to push gold aggregates to Google Sheets: {e}", level="ERROR")
+        log_message(traceback.format_exc(), level="ERROR")
 
-            user_report = user_aggregate.reconcile_silver_gold()
-            captain_report = captain_aggregate.reconcile_captain_aggregates()
+STAGE_FUNCTIONS = {
+    "extract": extract_stage,
+    "bronze": bronze_stage,
+    "silver": silver_stage,
+    "gold": gold_stage,
+    "reconcile": reconcile_stage,
+    "push": push_stage,
+}
+
+# -----------------------
+# Run
+# -----------------------
+def record_manifest(run):
+    manifest_store = load_module("src.manifest")
+    manifest, fingerprints = run["manifest"], run["fingerprints"]
+    processed = run["unchanged"] + run.get("loaded", [])
+    for table_name in processed:
+        manifest["tabs"][table_name] = {"fingerprint": fingerprints[table_name]}
+    manifest["modified_time"] = run["modified_time"] if len(processed) == len(fingerprints) else None
+    manifest_store.save_manifest(manifest)
+
+def log_telemetry():
+    records = telemetry.run_records()
+    log_message(f"⏱️ Run {telemetry.RUN_ID}: {len(records)} spans written to {telemetry.TELEMETRY_FILE}")
+    for line in telemetry.summary_table(records):
+        log_message(f"   {line}")
+    if telemetry.PROMETHEUS_TEXTFILE:
+        try:
+            telemetry.write_prometheus(records)
+        except OSError as e:
+            log_message(f"⚠️ Could not write Prometheus textfile: {e}", level="WARNING")
 
-            user_report["Entity"] = "User"
-            captain_report["Entity"] = "Captain"
-            merged_report = pd.concat([user_report, captain_report], ignore_index=True)
-            merged_report_file = "../test/reconciliation_report.csv"
-            merged_report.to_csv(merged_report_file, index=False)
-            log_message(f"✅ Merged reconciliation report saved as {merged_report_file}")
+def log_run_diagnostics(import_profile=False):
+    if "src.db" in sys.modules:
+        log_message(f"⏱️ {sys.modules['src.db'].describe_pool_metrics()}")
+    if import_profile:
+        log_import_profile()
+    log_telemetry()
 
-            # Push gold aggregates to Google Sheets
+def run_etl(stages=None, import_profile=False):
+    """Run the given stages (default: all of STAGES) in pipeline order."""
+    stages = [stage for stage in STAGES if stage in (stages or STAGES)]
+    run = {}
+    telemetry.start_run()
+    try:
+        log_message(f"🚀 ETL Pipeline Started (stages: {', '.join(stages)})")
+        for stage in stages:
+            stop = None
             try:
-                push_to_sheets.push_gold_aggregates_to_sheets()
-                log_message("✅ Gold aggregates pushed to Google Sheets successfully.")
+                with telemetry.span("etl.stage", stage=stage) as stage_span:
+                    try:
+                        STAGE_FUNCTIONS[stage](run)
+                    except StopRun as e:
+                        stage_span.status, stop = "stopped", e
+            except RunFailed:
+                raise
             except Exception as e:
-                log_message(f"❌ Failed to push gold aggregates to Google Sheets: {e}", level="ERROR")
+                # A failed gold or reconciliation stage is logged and the stages after it are skipped
+                log_message(f"❌ Stage '{stage}' failed: {e}", level="ERROR")
                 log_message(traceback.format_exc(), level="ERROR")
+                break
+            if stop:
+                log_message(str(stop))
+                break
 
-        except Exception as e:
-            log_message(f"❌ Failed to generate merged reconciliation report: {e}", level="ERROR")
-            log_message(traceback.format_exc(), level="ERROR")
-
+        # Only a full run that got every changed tab through to the push is
+        # recorded, so failed or skipped stages are retried next time
+        if run.get("complete") and stages == STAGES:
+            record_manifest(run)
         log_message("✅ ETL Pipeline Finished Successfully")
 
     except Exception as e:
         log_message(f"❌ ETL Pipeline Failed: {str(e)}", level="ERROR")
         log_message(traceback.format_exc(), level="ERROR")
         sys.exit(1)
+    finally:
+        # Failed runs get their pool metrics and span summary too
+        log_run_diagnostics(import_profile)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the ETL pipeline, or some of its stages.")
+    parser.add_argument(
+        "--stages", default=",".join(STAGES),
+        help=f"comma-separated stages to run, in any order (default: {','.join(STAGES)})",
+    )
+    parser.add_argument(
+        "--import-profile", action="store_true",
+        help="log how long each stage module took to import",
+    )
+    args = parser.parse_args(argv)
+    args.stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown or not args.stages:
+        parser.error(f"unknown stages {unknown}; choose from {', '.join(STAGES)}")
+    if "bronze" in args.stages and "extract" not in args.stages:
+        parser.error("bronze loads the sheet values fetched by extract; run them together")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    run_etl(args.stages, import_profile=args.import_profile)
 
 if __name__ == "__main__":
-    run_etl()
+    main()
@@ -1,11 +1,20 @@
 # extraction.py
+import csv
+import io
 import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 import pandas as pd
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import AuthorizedSession
 from googleapiclient.discovery import build
-from sqlalchemy import create_engine, text
+from psycopg2 import sql
+from requests.adapters import HTTPAdapter
+from sqlalchemy import text
 from dotenv import load_dotenv
 
+from src import db, telemetry
+
 # ---------------- LOAD ENV ----------------
 _ = load_dotenv()
 
@@ -13,21 +22,24 @@ _ = load_dotenv()
 SPREADSHEET_ID = os.getenv("GOOGLE_SHEETS_SPREADSHEET_ID")
 SERVICE_ACCOUNT_FILE = os.getenv("SERVICE_ACCOUNT_FILE")
 
-# Postgres creds
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
+# Extraction mode: "sequential", "batch" (one values.batchGet) or "concurrent" (worker pool)
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "concurrent")
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "5"))
 
-# Local CSV staging dir
-CSV_DIR = "../bronze_inputs"
-os.makedirs(CSV_DIR, exist_ok=True)
+SHEETS_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets.readonly",
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+]
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+
+# Keep a CSV copy of each tab in CSV_DIR while streaming into bronze. The silver
+# cleaners read these files, so it stays on unless they are pointed elsewhere.
+BRONZE_CSV_SNAPSHOT = os.getenv("BRONZE_CSV_SNAPSHOT", "1") == "1"
 
-# SQLAlchemy engine
-engine = create_engine(
-    f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
+# Local CSV staging dir (relative to this file, so any working directory will do)
+CSV_DIR = os.path.join(os.path.dirname(__file__), '../bronze_inputs')
+os.makedirs(CSV_DIR, exist_ok=True)
 
 # ---------------- TABLES ----------------
 SHEETS = {
@@ -91,21 +103,116 @@ create_table_queries = {
         );""",
 }
 
+# ---------------- SHEETS CLIENTS ----------------
+# Credentials, the discovery-based service and the HTTP session are built once
+# per process and reused by every extraction call.
+_credentials = None
+_service = None
+_session = None
+
+
+def get_credentials():
+    global _credentials
+    if _credentials is None:
+        if not SPREADSHEET_ID or not SERVICE_ACCOUNT_FILE:
+            raise ValueError("Missing SPREADSHEET_ID or SERVICE_ACCOUNT_FILE in .env")
+        _credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SHEETS_SCOPES)
+    return _credentials
+
+
+def get_sheets_service():
+    global _service
+    if _service is None:
+        # static_discovery uses the discovery document bundled with the client
+        # library instead of fetching it over the network on every build
+        _service = build(
+            "sheets", "v4", credentials=get_credentials(),
+            static_discovery=True, cache_discovery=False,
+        )
+    return _service
+
+
+def get_authorized_session():
+    global _session
+    if _session is None:
+        _session = AuthorizedSession(get_credentials())
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=EXTRACT_WORKERS)
+        _session.mount("https://", adapter)
+    return _session
+
+
 # ---------------- EXTRACTION ----------------
-def export_sheets_to_csv():
-    if not SPREADSHEET_ID or not SERVICE_ACCOUNT_FILE:
-        raise ValueError("Missing SPREADSHEET_ID or SERVICE_ACCOUNT_FILE in .env")
+def fetch_sheet_values(sheet_name):
+    # Plain REST call on the shared session; unlike the discovery service's
+    # httplib2 transport, the requests session is safe to share across threads.
+    url = f"{SHEETS_API_URL}/{SPREADSHEET_ID}/values/{quote(sheet_name, safe='')}"
+    response = get_authorized_session().get(url, timeout=120)
+    response.raise_for_status()
+    return response.json().get("values", [])
 
-    creds = Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"]
+
+def get_spreadsheet_modified_time():
+    # One cheap Drive metadata call; lets a run skip fetching entirely when the
+    # spreadsheet has not been edited since the last successful run.
+    response = get_authorized_session().get(
+        f"{DRIVE_FILES_URL}/{SPREADSHEET_ID}",
+        params={"fields": "modifiedTime", "supportsAllDrives": "true"},
+        timeout=30,
     )
-    service = build("sheets", "v4", credentials=creds)
+    response.raise_for_status()
+    return response.json().get("modifiedTime")
+
+
+def _fetch_timed(sheet_name):
+    with telemetry.span("extract.tab", tab=sheet_name) as span:
+        values = fetch_sheet_values(sheet_name)
+        span.count(rows_out=max(len(values) - 1, 0))
+    return sheet_name, values, span.wall_seconds
+
+
+def fetch_all_sheets(mode=None):
+    """Fetch every tab in SHEETS; returns ({sheet: values}, {sheet: seconds})."""
+    mode = mode or EXTRACT_MODE
+    sheet_names = list(SHEETS)
+    results, latencies = {}, {}
+
+    if mode == "batch":
+        with telemetry.span("extract.batch", tabs=len(sheet_names)) as span:
+            response = get_sheets_service().spreadsheets().values().batchGet(
+                spreadsheetId=SPREADSHEET_ID, ranges=sheet_names
+            ).execute()
+            # valueRanges come back in request order; all tabs share the one round-trip
+            for sheet_name, value_range in zip(sheet_names, response.get("valueRanges", [])):
+                results[sheet_name] = value_range.get("values", [])
+                span.count(rows_out=max(len(results[sheet_name]) - 1, 0))
+        for sheet_name in results:
+            latencies[sheet_name] = span.wall_seconds
+    elif mode == "concurrent":
+        with ThreadPoolExecutor(max_workers=min(EXTRACT_WORKERS, len(sheet_names))) as pool:
+            for sheet_name, values, elapsed in pool.map(telemetry.wrap(_fetch_timed), sheet_names):
+                results[sheet_name] = values
+                latencies[sheet_name] = elapsed
+    elif mode == "sequential":
+        service = get_sheets_service()
+        for sheet_name in sheet_names:
+            with telemetry.span("extract.tab", tab=sheet_name) as span:
+                result = service.spreadsheets().values().get(
+                    spreadsheetId=SPREADSHEET_ID, range=sheet_name
+                ).execute()
+                results[sheet_name] = result.get("values", [])
+                span.count(rows_out=max(len(results[sheet_name]) - 1, 0))
+            latencies[sheet_name] = span.wall_seconds
+    else:
+        raise ValueError(f"Unknown EXTRACT_MODE '{mode}'")
+
+    return results, latencies
+
+
+def export_sheets_to_csv(mode=None):
+    all_values, latencies = fetch_all_sheets(mode)
 
     for sheet_name, csv_file in SHEETS.items():
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID, range=sheet_name
-        ).execute()
-        values = result.get("values", [])
+        values = all_values.get(sheet_name, [])
 
         if not values:
             # No data found, skip this sheet
@@ -115,6 +222,8 @@ def export_sheets_to_csv():
         output_path = os.path.join(CSV_DIR, csv_file)
         df.to_csv(output_path, index=False)
 
+    return latencies
+
 
 # -----------`----- LOAD TO BRONZE ----------------
 def load_csv_to_db_raw(schema_name, table_name, file_name):
@@ -124,15 +233,134 @@ def load_csv_to_db_raw(schema_name, table_name, file_name):
         return
 
     df = pd.read_csv(path).astype(str)
-    df.to_sql(table_name, engine, schema=schema_name, if_exists="append", index=False)
+    with db.begin("bronze") as conn:
+        df.to_sql(table_name, conn, schema=schema_name, if_exists="append", index=False)
 
 
-def load_all(schema_name="bronze"):
-    with engine.connect() as conn:
+class SheetRowStream:
+    """Read-only file object that renders Sheets rows as CSV text for COPY.
+
+    Rows are pulled from the iterator only as psycopg2 asks for more data, and
+    are optionally teed into a CSV snapshot file.
+    """
+
+    BATCH_ROWS = 1000
+
+    def __init__(self, header, rows, snapshot=None):
+        self._width = len(header)
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._pending = ""
+        self._done = False
+        self._snapshot = snapshot
+        self.row_count = 0
+        if snapshot is not None:
+            csv.writer(snapshot, lineterminator="\n").writerow(header)
+
+    def _fill(self):
+        for _ in range(self.BATCH_ROWS):
+            row = next(self._rows, None)
+            if row is None:
+                self._done = True
+                break
+            # The Sheets API drops trailing empty cells, so pad ragged rows
+            if len(row) != self._width:
+                row = (list(row) + [""] * self._width)[:self._width]
+            self._writer.writerow(row)
+            self.row_count += 1
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        if self._snapshot is not None:
+            self._snapshot.write(text)
+        self._pending += text
+
+    def read(self, size=-1):
+        while not self._done and (size is None or size < 0 or len(self._pending) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def copy_rows_to_bronze(schema_name, table_name, values, csv_file=None):
+    """COPY a tab's values (header row first) into schema.table; returns the row count.
+
+    Empty cells are loaded as NULL. When csv_file is given the same rows are
+    written to CSV_DIR as a side output, replacing the file only on success.
+    """
+    header, rows = values[0], values[1:]
+    copy_sql = sql.SQL("COPY {}.{} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(schema_name),
+        sql.Identifier(table_name),
+        sql.SQL(", ").join(sql.Identifier(col) for col in header),
+    )
+
+    snapshot_path = os.path.join(CSV_DIR, csv_file) if csv_file else None
+    snapshot = open(snapshot_path + ".tmp", "w", newline="") if snapshot_path else None
+    with telemetry.span("bronze.load", table=table_name) as span:
+        conn = None
+        try:
+            conn = db.raw_connection("bronze")
+            stream = SheetRowStream(header, rows, snapshot)
+            with conn.cursor() as cur:
+                cur.copy_expert(copy_sql, stream)
+            conn.commit()
+        except Exception:
+            if conn is not None:
+                conn.rollback()
+            if snapshot is not None:
+                # Leave no partial snapshot behind; the previous one stays in place
+                snapshot.close()
+                os.remove(snapshot_path + ".tmp")
+            raise
+        finally:
+            if conn is not None:
+                conn.close()
+            if snapshot is not None:
+                snapshot.close()
+        span.count(rows_in=len(rows), rows_out=stream.row_count)
+
+    if snapshot_path:
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+    return stream.row_count
+
+
+def write_sheet_csv(values, csv_file):
+    with open(os.path.join(CSV_DIR, csv_file), "w", newline="") as f:
+        SheetRowStream(values[0], values[1:], snapshot=f).read()
+
+
+def create_bronze_tables(schema_name="bronze"):
+    with db.connect("bronze") as conn:
         conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"'))
         for t, query in create_table_queries.items():
             conn.execute(text(query.format(schema=schema_name)))
         conn.commit()
 
+
+def stream_sheets_to_bronze(schema_name="bronze", mode=None, csv_snapshot=None):
+    """Fetch every tab and COPY it straight into bronze without a CSV round-trip."""
+    if csv_snapshot is None:
+        csv_snapshot = BRONZE_CSV_SNAPSHOT
+    all_values, latencies = fetch_all_sheets(mode)
+    create_bronze_tables(schema_name)
+
+    row_counts = {}
+    for table, csv_file in SHEETS.items():
+        values = all_values.get(table)
+        if not values:
+            continue
+        row_counts[table] = copy_rows_to_bronze(
+            schema_name, table, values, csv_file if csv_snapshot else None
+        )
+    return row_counts, latencies
+
+
+def load_all(schema_name="bronze"):
+    create_bronze_tables(schema_name)
+
     for table, file in SHEETS.items():
         load_csv_to_db_raw(schema_name, table, file)
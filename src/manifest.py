@@ -0,0 +1,39 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+
+# Fingerprints of the last successfully processed sheets, used to skip unchanged tabs
+MANIFEST_FILE = os.path.join(os.path.dirname(__file__), '../logs/run_manifest.json')
+
+
+def fingerprint_values(values):
+    """Content hash of a tab's values as returned by the Sheets API."""
+    payload = json.dumps(values, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(path=MANIFEST_FILE):
+    if not os.path.exists(path):
+        return {"modified_time": None, "tabs": {}}
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest.setdefault("tabs", {})
+    return manifest
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    manifest["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def changed_tabs(fingerprints, manifest):
+    """Tabs whose fingerprint differs from the one recorded in the manifest."""
+    recorded = manifest.get("tabs", {})
+    return [
+        tab for tab, fingerprint in fingerprints.items()
+        if recorded.get(tab, {}).get("fingerprint") != fingerprint
+    ]
@@ -1,62 +1,431 @@
 import os
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 import pandas as pd
-from sqlalchemy import create_engine
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-import gspread
-from gspread_dataframe import set_with_dataframe
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import AuthorizedSession
+
+from src import db, telemetry
 
 # Load environment variables
 _ = load_dotenv()
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
-
 TARGET_SHEET_ID = os.getenv("TARGET_SHEET_ID")
 SERVICE_ACCOUNT_FILE = os.getenv("SERVICE_ACCOUNT_FILE")  # Path to JSON creds file
 
-# Setup the database engine
-connection_str = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(connection_str)
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+# Can be pointed at a local Sheets emulator (the token endpoint comes from the creds file)
+SHEETS_API_URL = os.getenv("SHEETS_API_URL", "https://sheets.googleapis.com/v4/spreadsheets")
+
+# "diff" only writes the rows that changed since the last push; "full" clears and rewrites each tab
+SHEETS_PUSH_MODE = os.getenv("SHEETS_PUSH_MODE", "diff")
+
+# Write quota: Sheets allows 60 write requests per minute per user by default.
+# Every API call goes through one token bucket refilled at this rate.
+SHEETS_REQUESTS_PER_MINUTE = float(os.getenv("SHEETS_REQUESTS_PER_MINUTE", "60"))
+# 429 and 5xx responses are retried with exponential backoff (or Retry-After)
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+SHEETS_BACKOFF_SECONDS = float(os.getenv("SHEETS_BACKOFF_SECONDS", "1"))
+# Google recommends keeping request payloads under 2 MB; larger writes are split into row chunks
+SHEETS_MAX_REQUEST_BYTES = int(os.getenv("SHEETS_MAX_REQUEST_BYTES", "2000000"))
+# Worksheets pushed at the same time
+SHEETS_PUSH_WORKERS = int(os.getenv("SHEETS_PUSH_WORKERS", "2"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+# Range string and JSON punctuation around each block of rows in a request
+BLOCK_OVERHEAD_BYTES = 64
+# The values.batchUpdate envelope around the blocks
+REQUEST_OVERHEAD_BYTES = 64
+
+# What was last pushed to each worksheet, keyed by the gold table's key column
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), '../logs/sheets_snapshots')
+
+# Gold table -> (worksheet, key column)
+PUSH_TARGETS = {
+    "user_aggregate": ("users_data", "user_id"),
+    "captain_aggregate": ("captains_data", "captain_id"),
+}
+
+# ---------------- SHEETS CLIENT ----------------
+class TokenBucket:
+    """Hands out one token per request, refilled at `rate` per second up to `capacity`.
+
+    Tokens are reserved under the lock and waited for outside it, so callers
+    on several threads are spaced out instead of all retrying at once.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+# One authorized session and rate limiter per process, shared by every worksheet push
+_session = None
+_limiter = TokenBucket(
+    SHEETS_REQUESTS_PER_MINUTE / 60,
+    max(1.0, SHEETS_REQUESTS_PER_MINUTE / 6),  # bursts of up to ten seconds' worth
+)
+
+
+def get_authorized_session():
+    global _session
+    if _session is None:
+        if not TARGET_SHEET_ID or not SERVICE_ACCOUNT_FILE:
+            raise ValueError("Missing TARGET_SHEET_ID or SERVICE_ACCOUNT_FILE in .env")
+        creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SHEETS_SCOPES)
+        _session = AuthorizedSession(creds)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SHEETS_PUSH_WORKERS)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
 
-# Setup Google Sheets API client
-def gsheet_client():
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=scopes)
-    client = gspread.authorize(creds)
-    return client
+def _retry_delay(response, attempt):
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        return float(retry_after)
+    # Full jitter keeps concurrent pushes from retrying in lockstep
+    return random.uniform(0, SHEETS_BACKOFF_SECONDS * 2 ** attempt)
 
+
+def sheets_request(method, path="", **kwargs):
+    session = get_authorized_session()
+    for attempt in range(SHEETS_MAX_RETRIES + 1):
+        _limiter.acquire()
+        try:
+            response = session.request(method, f"{SHEETS_API_URL}/{TARGET_SHEET_ID}{path}", timeout=120, **kwargs)
+        except TRANSPORT_ERRORS as e:
+            # Value writes target fixed ranges, so resending one that did land is harmless
+            if attempt == SHEETS_MAX_RETRIES:
+                raise
+            response, reason = None, type(e).__name__
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == SHEETS_MAX_RETRIES:
+                break
+            reason = f"returned {response.status_code}"
+        delay = _retry_delay(response, attempt)
+        print(f"⚠️ Sheets API {reason}, retrying in {delay:.1f}s ({attempt + 1}/{SHEETS_MAX_RETRIES})")
+        time.sleep(delay)
+    response.raise_for_status()
+    return response.json() if response.content else {}
+
+
+def get_worksheets():
+    """{title: sheet properties} for every tab of the target spreadsheet."""
+    response = sheets_request("GET", params={"fields": "sheets.properties(sheetId,title,gridProperties)"})
+    return {sheet["properties"]["title"]: sheet["properties"] for sheet in response.get("sheets", [])}
+
+
+def resize_worksheet(worksheets, title, rows, cols, shrink=False):
+    """Create the tab, or resize its grid, so that rows x cols fit; returns its sheetId.
+
+    The grid only grows unless shrink is set, in which case it is cut to
+    exactly rows x cols. Either way this is at most one request, made
+    before any values are written.
+    """
+    properties = worksheets.get(title)
+    if properties is None:
+        response = sheets_request("POST", ":batchUpdate", json={"requests": [{"addSheet": {"properties": {
+            "title": title, "gridProperties": {"rowCount": rows, "columnCount": cols},
+        }}}]})
+        properties = response["replies"][0]["addSheet"]["properties"]
+        worksheets[title] = properties
+        return properties["sheetId"]
+
+    grid = properties.setdefault("gridProperties", {})
+    if shrink:
+        size = {"rowCount": rows, "columnCount": cols}
+    else:
+        size = {"rowCount": max(grid.get("rowCount", 0), rows), "columnCount": max(grid.get("columnCount", 0), cols)}
+    if size != {"rowCount": grid.get("rowCount"), "columnCount": grid.get("columnCount")}:
+        grid.update(size)
+        sheets_request("POST", ":batchUpdate", json={"requests": [{"updateSheetProperties": {
+            "properties": {"sheetId": properties["sheetId"], "gridProperties": grid},
+            "fields": "gridProperties(rowCount,columnCount)",
+        }}]})
+    return properties["sheetId"]
+
+
+def chunk_blocks(blocks, max_bytes=None):
+    """Split (first sheet row, rows) blocks into request-sized lists of blocks.
+
+    Each chunk's JSON payload stays under max_bytes; a block that does not
+    fit is cut at a row boundary and carried on in the next chunk.
+    """
+    max_bytes = max_bytes or SHEETS_MAX_REQUEST_BYTES
+    chunks, chunk, size = [], [], REQUEST_OVERHEAD_BYTES
+    for first_row, rows in blocks:
+        start = 0
+        size += BLOCK_OVERHEAD_BYTES
+        for offset, row in enumerate(rows):
+            row_size = len(json.dumps(row)) + 2
+            if size + row_size > max_bytes and (chunk or offset > start):
+                if offset > start:
+                    chunk.append((first_row + start, rows[start:offset]))
+                chunks.append(chunk)
+                chunk, size, start = [], REQUEST_OVERHEAD_BYTES + BLOCK_OVERHEAD_BYTES, offset
+            size += row_size
+        if rows:
+            chunk.append((first_row + start, rows[start:]))
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def write_rows(title, width, blocks):
+    """Write (first sheet row, rows) blocks in request-sized values.batchUpdate calls; returns the number of calls."""
+    chunks = chunk_blocks(blocks)
+    for chunk in chunks:
+        sheets_request("POST", "/values:batchUpdate", json={"valueInputOption": "USER_ENTERED", "data": [
+            {"range": a1_range(title, first_row, first_row + len(rows) - 1, width), "values": rows}
+            for first_row, rows in chunk
+        ]})
+    return len(chunks)
+
+
+# ---------------- ROWS ----------------
 def read_gold_table(table_name):
     query = f"SELECT * FROM gold.{table_name};"
-    with engine.connect() as conn:
+    with db.connect("push") as conn:
         df = pd.read_sql(query, conn)
     return df
 
-def push_df_to_gsheet(df, worksheet_name):
-    client = gsheet_client()
-    sh = client.open_by_key(TARGET_SHEET_ID)
-    try:
-        worksheet = sh.worksheet(worksheet_name)
-        worksheet.clear()
-    except gspread.WorksheetNotFound:
-        worksheet = sh.add_worksheet(title=worksheet_name, rows="1000", cols="50")
-
-    set_with_dataframe(worksheet, df)
-    print(f"Pushed data to worksheet '{worksheet_name}' successfully.")
-
-def push_gold_aggregates_to_sheets():
-    # Read gold tables
-    users_df = read_gold_table("user_aggregate")
-    captains_df = read_gold_table("captain_aggregate")
-
-    # Push to respective sheets
-    push_df_to_gsheet(users_df, "users_data")
-    push_df_to_gsheet(captains_df, "captains_data")
+
+def _cell(value):
+    # Cells as they are sent to (and remembered from) the Sheets API
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def frame_rows(df):
+    return [[_cell(value) for value in row] for row in df.itertuples(index=False, name=None)]
+
+
+def _column_letter(number):
+    letters = ""
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def a1_range(title, first_row, last_row, width):
+    escaped = title.replace("'", "''")
+    return f"'{escaped}'!A{first_row}:{_column_letter(width)}{last_row}"
+
+
+def plan_row_writes(old_keys, old_rows, keys, rows):
+    """Lay the new rows over the sheet's current rows, moving as few as possible.
+
+    Returns (keys in sheet order, {row position: values}) where positions
+    start at 0 below the header. Removed rows are reused by added ones first;
+    any left over are filled with rows taken off the end, and the rows freed
+    at the end are written as blanks.
+    """
+    new = dict(zip(keys, rows))
+    old = dict(zip(old_keys, old_rows))
+    layout = [key if key in new else None for key in old_keys]
+    holes = deque(position for position, key in enumerate(layout) if key is None)
+    for key in keys:
+        if key not in old:
+            if holes:
+                layout[holes.popleft()] = key
+            else:
+                layout.append(key)
+    while holes:
+        while layout and layout[-1] is None:
+            layout.pop()
+        position = holes.popleft()
+        if position >= len(layout):
+            break
+        layout[position] = layout.pop()
+    while layout and layout[-1] is None:
+        layout.pop()
+
+    writes = {}
+    for position, key in enumerate(layout):
+        old_key = old_keys[position] if position < len(old_keys) else None
+        if old_key != key or old[old_key] != new[key]:
+            writes[position] = new[key]
+    width = len(rows[0]) if rows else len(old_rows[0]) if old_rows else 0
+    for position in range(len(layout), len(old_keys)):
+        writes[position] = [""] * width
+    return layout, writes
+
+
+def row_blocks(writes):
+    """Merge written rows into (first sheet row, rows) blocks, one per run of consecutive rows."""
+    blocks, run = [], []
+    for position in sorted(writes):
+        if run and position != run[-1] + 1:
+            blocks.append(_block(run, writes))
+            run = []
+        run.append(position)
+    if run:
+        blocks.append(_block(run, writes))
+    return blocks
+
+
+def _block(positions, writes):
+    # Sheet rows are 1-based and row 1 is the header
+    return positions[0] + 2, [writes[position] for position in positions]
+
+
+# ---------------- SNAPSHOTS ----------------
+def _snapshot_path(worksheet_name):
+    return os.path.join(SNAPSHOT_DIR, f"{worksheet_name}.json")
+
+
+def load_snapshot(worksheet_name):
+    path = _snapshot_path(worksheet_name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_snapshot(worksheet_name, snapshot):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = _snapshot_path(worksheet_name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def discard_snapshot(worksheet_name):
+    # A push that fails halfway leaves the tab matching neither snapshot; the next one rewrites it
+    path = _snapshot_path(worksheet_name)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# ---------------- PUSH ----------------
+def push_df_to_gsheet(df, worksheet_name, key_column, worksheets=None, mode=None):
+    """Push df to a worksheet; returns {"mode", "rows_written", "changed", "added", "removed", "requests", "seconds", "rows_per_second"}.
+
+    In diff mode only the rows that differ from the last pushed snapshot are
+    written. The tab is rewritten in full when there is no usable snapshot:
+    first push, different spreadsheet or tab, or different columns. Either
+    way the grid is resized once up front and the values go out in
+    request-sized chunks.
+    """
+    mode = mode or SHEETS_PUSH_MODE
+    if mode not in ("diff", "full"):
+        raise ValueError(f"Unknown SHEETS_PUSH_MODE '{mode}'")
+    if df[key_column].duplicated().any():
+        raise ValueError(f"Duplicate {key_column} values in the data pushed to '{worksheet_name}'")
+
+    start = time.perf_counter()
+    worksheets = get_worksheets() if worksheets is None else worksheets
+    header = [str(column) for column in df.columns]
+    keys = [str(key) for key in df[key_column]]
+    rows = frame_rows(df)
+    new = dict(zip(keys, rows))
+    width = len(header)
+
+    snapshot = load_snapshot(worksheet_name) if mode == "diff" else None
+    properties = worksheets.get(worksheet_name)
+    if snapshot and not (
+        properties
+        and snapshot["spreadsheet_id"] == TARGET_SHEET_ID
+        and snapshot["sheet_id"] == properties["sheetId"]
+        and snapshot["header"] == header
+    ):
+        snapshot = None
+
+    if snapshot is None:
+        discard_snapshot(worksheet_name)
+        # The grid is cut to the table's size, so no stale rows or columns survive
+        sheet_id = resize_worksheet(worksheets, worksheet_name, len(rows) + 1, width, shrink=True)
+        if properties is not None:
+            # A range of just the tab title clears the whole tab
+            tab = "'" + worksheet_name.replace("'", "''") + "'"
+            sheets_request("POST", f"/values/{quote(tab, safe='')}:clear")
+        requests_sent = write_rows(worksheet_name, width, [(1, [header] + rows)])
+        layout = keys
+        stats = {"mode": "full", "rows_written": len(rows), "changed": 0, "added": len(rows), "removed": 0}
+    else:
+        old_keys, old_rows = snapshot["keys"], snapshot["rows"]
+        layout, writes = plan_row_writes(old_keys, old_rows, keys, rows)
+        sheet_id = resize_worksheet(worksheets, worksheet_name, len(layout) + 1, width)
+        if writes:
+            discard_snapshot(worksheet_name)
+        requests_sent = write_rows(worksheet_name, width, row_blocks(writes))
+        old = dict(zip(old_keys, old_rows))
+        stats = {
+            "mode": "diff",
+            "rows_written": len(writes),
+            "changed": sum(1 for key in keys if key in old and old[key] != new[key]),
+            "added": sum(1 for key in keys if key not in old),
+            "removed": sum(1 for key in old_keys if key not in new),
+        }
+
+    save_snapshot(worksheet_name, {
+        "spreadsheet_id": TARGET_SHEET_ID,
+        "sheet_id": sheet_id,
+        "header": header,
+        "keys": layout,
+        "rows": [new[key] for key in layout],
+    })
+    stats["requests"] = requests_sent
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_second"] = stats["rows_written"] / stats["seconds"] if stats["seconds"] else 0.0
+    print(
+        f"✅ Pushed '{worksheet_name}' ({stats['mode']}): {stats['rows_written']} of {len(rows)} rows written "
+        f"({stats['changed']} changed, {stats['added']} added, {stats['removed']} removed) "
+        f"in {requests_sent} requests, {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s)"
+    )
+    return stats
+
+
+def _push_gold_table(table_name, worksheets, mode):
+    worksheet_name, key_column = PUSH_TARGETS[table_name]
+    with telemetry.span("push.sheet", worksheet=worksheet_name) as span:
+        df = read_gold_table(table_name)
+        stats = push_df_to_gsheet(df, worksheet_name, key_column, worksheets=worksheets, mode=mode)
+        span.count(rows_in=len(df), rows_out=stats["rows_written"])
+    return worksheet_name, stats
+
+
+def push_gold_aggregates_to_sheets(mode=None):
+    """Push every gold table in PUSH_TARGETS, SHEETS_PUSH_WORKERS worksheets at a time."""
+    start = time.perf_counter()
+    # Tab metadata is fetched once and shared by every worksheet (each push only touches its own tab)
+    worksheets = get_worksheets()
+    with ThreadPoolExecutor(max_workers=max(1, min(SHEETS_PUSH_WORKERS, len(PUSH_TARGETS)))) as pool:
+        push = telemetry.wrap(lambda table_name: _push_gold_table(table_name, worksheets, mode))
+        results = dict(pool.map(push, PUSH_TARGETS))
+    elapsed = time.perf_counter() - start
+    rows_written = sum(stats["rows_written"] for stats in results.values())
+    print(f"✅ Sheets push: {rows_written} rows in {elapsed:.2f}s ({rows_written / elapsed if elapsed else 0:.0f} rows/s)")
+    return results
 
 if __name__ == "__main__":
     push_gold_aggregates_to_sheets()
@@ -0,0 +1,376 @@
+import atexit
+import itertools
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# -----------------------
+# Settings
+# -----------------------
+_ = load_dotenv()
+# One JSON object per finished span, appended in batches
+TELEMETRY_FILE = os.getenv(
+    "ETL_TELEMETRY_FILE", os.path.join(os.path.dirname(__file__), '../logs/etl_spans.jsonl')
+)
+# When set, each run's span totals are also written there in the Prometheus
+# text format (for node_exporter's textfile collector)
+PROMETHEUS_TEXTFILE = os.getenv("ETL_PROMETHEUS_TEXTFILE")
+# tracemalloc gives per-span Python heap peaks, at a noticeable cost; off by default
+TRACEMALLOC = os.getenv("ETL_TRACEMALLOC", "0") == "1"
+# Buffered records are written once this many pile up, and whenever a process's
+# outermost span closes
+FLUSH_LINES = 200
+
+RUN_ID = None
+_run_offset = 0
+
+_lock = threading.Lock()
+_buffer = []
+_local = threading.local()
+_ids = itertools.count(1)
+_measuring = set()
+
+
+def _reset_after_fork():
+    # A forked worker starts with no open spans and must not write the parent's
+    # buffer again; its top-level spans are children of the span that forked it
+    global _lock, _local, _ids, _measuring
+    forked_in = current()
+    _lock = threading.Lock()
+    _buffer.clear()
+    _local = threading.local()
+    _local.parent_id = forked_in.id if forked_in else None
+    _ids = itertools.count(1)
+    _measuring = set()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux: the process's high-water mark so far
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _reset_traced_peak():
+    # The peak is process-wide: hand it to every span being measured before resetting it
+    peak = tracemalloc.get_traced_memory()[1]
+    for span in _measuring:
+        span.traced_peak = max(span.traced_peak, peak)
+    tracemalloc.reset_peak()
+
+
+# -----------------------
+# Spans
+# -----------------------
+class Span:
+    """Wall/CPU time, row counts and memory of one pipeline step.
+
+    A span can be measured several times (see measure_iter) and is written out
+    by record(). CPU time is process-wide, so spans running side by side in
+    threads each see the other's CPU as well. peak_rss is the process's
+    high-water mark when the span ends; rss_growth is how far the span raised it.
+    """
+
+    def __init__(self, name, **attrs):
+        stack = _stack()
+        self.name = name
+        self.attrs = {key: str(value) for key, value in attrs.items()}
+        self.id = f"{os.getpid()}-{next(_ids)}"
+        # Outside any span of its own, a worker thread's spans hang off the span that started it (see wrap)
+        self.parent_id = stack[-1].id if stack else getattr(_local, "parent_id", None)
+        self.started_at = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows_in = None
+        self.rows_out = None
+        self.rejects = None
+        self.traced_peak = 0
+        self.status = "ok"
+        self.error = None
+        self._rss_start = None
+
+    def count(self, rows_in=None, rows_out=None, rejects=None):
+        """Add to the span's row counts."""
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + rows_in
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + rows_out
+        if rejects is not None:
+            self.rejects = (self.rejects or 0) + rejects
+
+    @contextmanager
+    def measure(self):
+        """Time the enclosed block as part of this span; it is the current span meanwhile."""
+        if self.started_at is None:
+            self.started_at = datetime.now().isoformat(timespec="milliseconds")
+            self._rss_start = _peak_rss_bytes()
+        stack = _stack()
+        stack.append(self)
+        traced = tracemalloc.is_tracing()
+        if traced:
+            with _lock:
+                _reset_traced_peak()
+                _measuring.add(self)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield self
+        except BaseException as e:
+            self.status = "error"
+            self.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.wall_seconds += time.perf_counter() - wall
+            self.cpu_seconds += time.process_time() - cpu
+            if traced:
+                with _lock:
+                    self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[1])
+                    _measuring.discard(self)
+            stack.pop()
+
+    def to_record(self):
+        peak_rss = _peak_rss_bytes()
+        rows = self.rows_out if self.rows_out is not None else self.rows_in
+        record = {
+            "run_id": RUN_ID,
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "span": self.name,
+            "attrs": self.attrs,
+            "started_at": self.started_at,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rejects": self.rejects,
+            "rows_per_second": round(rows / self.wall_seconds, 1) if rows and self.wall_seconds else None,
+            "peak_rss_bytes": peak_rss,
+            "rss_growth_bytes": peak_rss - (self._rss_start or peak_rss),
+            "status": self.status,
+            "error": self.error,
+        }
+        if self.traced_peak:
+            record["tracemalloc_peak_bytes"] = self.traced_peak
+        return record
+
+
+def current():
+    """The innermost span being measured in this thread, or None."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def wrap(fn):
+    """fn, made to open its spans as children of the current span when run in another thread.
+
+        pool.submit(telemetry.wrap(job))
+    """
+    parent = current()
+    parent_id = parent.id if parent else getattr(_local, "parent_id", None)
+
+    def run(*args, **kwargs):
+        previous = getattr(_local, "parent_id", None)
+        _local.parent_id = parent_id
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.parent_id = previous
+
+    return run
+
+
+def count(rows_in=None, rows_out=None, rejects=None):
+    """Add row counts to the current span; a no-op outside any span."""
+    span = current()
+    if span is not None:
+        span.count(rows_in=rows_in, rows_out=rows_out, rejects=rejects)
+
+
+def record(span):
+    """Queue a finished span; the buffer is written out when full or when no span is left open."""
+    line = json.dumps(span.to_record(), default=str) + "\n"
+    with _lock:
+        _buffer.append(line)
+        full = len(_buffer) >= FLUSH_LINES
+    if full or not _stack():
+        flush()
+
+
+@contextmanager
+def span(name, **attrs):
+    """Measure the enclosed block as one span named `name`; attrs become its labels.
+
+        with telemetry.span("silver.clean", table="rides") as s:
+            ...
+            s.count(rows_out=len(df))
+    """
+    step = Span(name, **attrs)
+    try:
+        with step.measure():
+            yield step
+    finally:
+        record(step)
+
+
+def measure_iter(span, iterable):
+    """Yield from iterable, measuring only the time spent producing each item as part of span."""
+    iterator = iter(iterable)
+    while True:
+        with span.measure():
+            item = next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
+
+
+# -----------------------
+# Writer
+# -----------------------
+def flush():
+    with _lock:
+        lines = _buffer[:]
+        _buffer.clear()
+    if not lines:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(TELEMETRY_FILE)), exist_ok=True)
+    # One write per batch, so batches from pool processes never interleave mid-line
+    with open(TELEMETRY_FILE, "a") as f:
+        f.write("".join(lines))
+
+
+def start_run():
+    """Start a new run id for the spans recorded from here on; returns it."""
+    global RUN_ID, _run_offset
+    flush()
+    RUN_ID = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    _run_offset = os.path.getsize(TELEMETRY_FILE) if os.path.exists(TELEMETRY_FILE) else 0
+    if TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return RUN_ID
+
+
+def run_records(run_id=None):
+    """Every span recorded for the run so far, pool processes included."""
+    run_id = run_id or RUN_ID
+    flush()
+    if not os.path.exists(TELEMETRY_FILE):
+        return []
+    with open(TELEMETRY_FILE) as f:
+        f.seek(_run_offset if run_id == RUN_ID else 0)
+        records = [json.loads(line) for line in f if line.strip()]
+    return [record for record in records if record["run_id"] == run_id]
+
+
+atexit.register(flush)
+
+
+# -----------------------
+# Reports
+# -----------------------
+def _labels(record):
+    return tuple(sorted(record["attrs"].items()))
+
+
+def _add(total, value):
+    return value if total is None else total + (value or 0)
+
+
+def summarize(records):
+    """Totals per (span, labels), in the order the spans first finished."""
+    totals = {}
+    for record in records:
+        total = totals.setdefault((record["span"], _labels(record)), {
+            "count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+            "rows_in": None, "rows_out": None, "rejects": None,
+            "peak_rss_bytes": 0, "tracemalloc_peak_bytes": None, "errors": 0,
+        })
+        total["count"] += 1
+        total["wall_seconds"] += record["wall_seconds"]
+        total["cpu_seconds"] += record["cpu_seconds"]
+        for field in ("rows_in", "rows_out", "rejects"):
+            if record[field] is not None:
+                total[field] = _add(total[field], record[field])
+        total["peak_rss_bytes"] = max(total["peak_rss_bytes"], record["peak_rss_bytes"])
+        if "tracemalloc_peak_bytes" in record:
+            total["tracemalloc_peak_bytes"] = max(total["tracemalloc_peak_bytes"] or 0, record["tracemalloc_peak_bytes"])
+        total["errors"] += record["status"] == "error"
+    return totals
+
+
+def _cell(value, spec=",.0f"):
+    return "-" if value is None else format(value, spec)
+
+
+def summary_table(records):
+    """Per-run summary as text lines: one row per span name and labels."""
+    header = (
+        f"{'span':<18} {'labels':<40} {'n':>3} {'wall s':>8} {'cpu s':>8} "
+        f"{'rows in':>10} {'rows out':>10} {'rejects':>8} {'rows/s':>9} {'rss MB':>7}"
+    )
+    lines = [header, "-" * len(header)]
+    for (name, labels), total in summarize(records).items():
+        label_text = ",".join(f"{key}={value}" for key, value in labels)
+        rows = total["rows_out"] if total["rows_out"] is not None else total["rows_in"]
+        lines.append(
+            f"{name:<18} {label_text:<40.40} {total['count']:>3} {total['wall_seconds']:>8.2f} "
+            f"{total['cpu_seconds']:>8.2f} {_cell(total['rows_in']):>10} {_cell(total['rows_out']):>10} "
+            f"{_cell(total['rejects']):>8} "
+            f"{_cell(rows / total['wall_seconds'] if rows and total['wall_seconds'] else None):>9} "
+            f"{total['peak_rss_bytes'] / 2**20:>7.0f}"
+            + (" ❌" if total["errors"] else "")
+        )
+    return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+PROMETHEUS_METRICS = [
+    ("etl_span_wall_seconds", "wall_seconds", "Wall-clock seconds spent in the span"),
+    ("etl_span_cpu_seconds", "cpu_seconds", "Process CPU seconds spent in the span"),
+    ("etl_span_rows_in", "rows_in", "Rows read by the span"),
+    ("etl_span_rows_out", "rows_out", "Rows written by the span"),
+    ("etl_span_rejects", "rejects", "Rows rejected by the span"),
+    ("etl_span_peak_rss_bytes", "peak_rss_bytes", "Process peak RSS when the span ended"),
+    ("etl_span_tracemalloc_peak_bytes", "tracemalloc_peak_bytes", "Peak traced Python heap during the span"),
+    ("etl_span_errors", "errors", "Failed spans"),
+]
+
+
+def write_prometheus(records, path=None):
+    """Write the run's span totals as Prometheus gauges; replaces the file atomically."""
+    path = path or PROMETHEUS_TEXTFILE
+    totals = summarize(records)
+    lines = []
+    for metric, field, help_text in PROMETHEUS_METRICS:
+        samples = [(key, total[field]) for key, total in totals.items() if total[field] is not None]
+        if not samples:
+            continue
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for (name, labels), value in samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in (("span", name),) + labels)
+            lines.append(f"{metric}{{{label_text}}} {value}")
+    lines += [
+        "# HELP etl_run_last_timestamp_seconds When the last run's telemetry was written",
+        "# TYPE etl_run_last_timestamp_seconds gauge",
+        f"etl_run_last_timestamp_seconds {time.time():.0f}",
+    ]
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
@@ -1,30 +1,263 @@
+import io
 import os
 import sys
-import psycopg2
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
 from psycopg2 import sql
-from dotenv import load_dotenv
 import pandas as pd
-from sqlalchemy import create_engine
 
 # Add transform to sys.path for module imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../transform')))
 
-from transform.clean_users import clean_users_data
-from transform.clean_captains import clean_captains_data
-from transform.clean_rides import clean_rides_data
-from transform.clean_payments import clean_payments_data
-from transform.clean_feedback import clean_feedback_data
+from transform.clean_users import clean_users_data, iter_clean_users_data
+from transform.clean_captains import clean_captains_data, iter_clean_captains_data
+from transform.clean_rides import clean_rides_data, iter_clean_rides_data
+from transform.clean_payments import clean_payments_data, iter_clean_payments_data
+from transform.clean_feedback import clean_feedback_data, iter_clean_feedback_data
+from src import db, telemetry
 
-_ = load_dotenv()
+# Bronze CSV snapshots written by extraction
+BRONZE_DIR = os.path.join(os.path.dirname(__file__), '../bronze_inputs')
 
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
+# Rows per chunk for the streaming cleaners; unset/0 cleans each file in memory
+CLEAN_CHUNKSIZE = int(os.getenv("CLEAN_CHUNKSIZE", "0")) or None
 
-connection_str = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(connection_str)
+# "parallel" runs independent clean+load steps in a process pool; "sequential" runs them in load order
+TRANSFORM_MODE = os.getenv("TRANSFORM_MODE", "parallel")
+TRANSFORM_WORKERS = int(os.getenv("TRANSFORM_WORKERS", "4"))
+
+# "deferred" bulk-loads silver into bare tables and builds keys, indexes and
+# foreign keys afterwards; "immediate" creates them before loading
+SILVER_LOAD_MODE = os.getenv("SILVER_LOAD_MODE", "deferred")
+
+# "shadow" builds silver/audit in SHADOW_SCHEMAS and swaps them in once validated;
+# "in_place" drops and reloads the live schemas
+SILVER_BUILD_MODE = os.getenv("SILVER_BUILD_MODE", "shadow")
+# A shadow build is refused if a table lost more than this fraction of its live rows
+SHADOW_MAX_SHRINK = float(os.getenv("SHADOW_MAX_SHRINK", "0.5"))
+# The swap gives up instead of queueing behind long-running readers
+SWAP_LOCK_TIMEOUT = os.getenv("SWAP_LOCK_TIMEOUT", "10s")
+
+# (silver, audit) schema pairs; the replaced generation is kept as *_prev
+LIVE_SCHEMAS = ('silver', 'audit')
+SHADOW_SCHEMAS = ('silver_next', 'audit_next')
+PREVIOUS_SCHEMAS = ('silver_prev', 'audit_prev')
+# One plain view per silver table, repointed at the live tables by every swap
+# and rollback. Gold materialized views read silver through these, so a swap
+# does not leave them bound to silver_prev (see load_data/gold_views.py).
+SILVER_VIEW_SCHEMA = 'silver_views'
+
+# Marker used for NULL in the COPY stream so that empty strings stay empty strings
+COPY_NULL = "\\N"
+
+# Load order; each table depends only on the tables listed for it
+SILVER_TABLES = ['users', 'captains', 'rides', 'payments', 'feedback']
+SILVER_DEPENDENCIES = {
+    'users': [],
+    'captains': [],
+    'rides': ['users', 'captains'],
+    'payments': ['rides'],
+    'feedback': ['rides'],
+}
+
+# (in-memory cleaner, streaming cleaner) per table
+CLEANERS = {
+    'users': (clean_users_data, iter_clean_users_data),
+    'captains': (clean_captains_data, iter_clean_captains_data),
+    'rides': (clean_rides_data, iter_clean_rides_data),
+    'payments': (clean_payments_data, iter_clean_payments_data),
+    'feedback': (clean_feedback_data, iter_clean_feedback_data),
+}
+
+# Keys later tables validate against
+KEY_COLUMNS = {'users': 'user_id', 'captains': 'captain_id', 'rides': 'ride_id'}
+
+# Column definitions only; keys, indexes, checks and foreign keys are added
+# separately (see SILVER_PRIMARY_KEYS .. SILVER_FOREIGN_KEYS below), monthly
+# partitions as rows arrive (see SILVER_PARTITIONS)
+create_table_queries_silver = {
+    'users': """
+        CREATE TABLE {schema}.users (
+            user_id VARCHAR NOT NULL,
+            name TEXT NOT NULL,
+            gender VARCHAR(10),
+            age INT,
+            signup_date DATE NOT NULL,
+            city TEXT
+        );
+    """,
+    'captains': """
+        CREATE TABLE {schema}.captains (
+            captain_id VARCHAR NOT NULL,
+            name TEXT NOT NULL,
+            age INT,
+            experience_years INT,
+            city TEXT,
+            rating DECIMAL(3,2)
+        );
+    """,
+    'rides': """
+        CREATE TABLE {schema}.rides (
+            ride_id VARCHAR NOT NULL,
+            user_id VARCHAR NOT NULL,
+            captain_id VARCHAR NOT NULL,
+            ride_date DATE NOT NULL,
+            pickup_loc TEXT,
+            drop_loc TEXT,
+            distance_km DECIMAL(7,2),
+            duration_min INT,
+            ride_status VARCHAR(20)
+        ) PARTITION BY RANGE (ride_date);
+    """,
+    'payments': """
+        CREATE TABLE {schema}.payments (
+            payment_id VARCHAR NOT NULL,
+            ride_id VARCHAR NOT NULL,
+            payment_method VARCHAR(50),
+            fare DECIMAL(10,2),
+            discount_percent DECIMAL(5,2),
+            discount_amount DECIMAL(10,2),
+            final_amount DECIMAL(10,2),
+            payment_status VARCHAR(20),
+            ride_date DATE NOT NULL
+        ) PARTITION BY RANGE (ride_date);
+    """,
+    'feedback': """
+        CREATE TABLE {schema}.feedback (
+            feedback_id VARCHAR NOT NULL,
+            ride_id VARCHAR NOT NULL,
+            user_rating DECIMAL(2,1),
+            captain_rating DECIMAL(2,1),
+            issue_category TEXT,
+            comments TEXT,
+            ride_date DATE NOT NULL
+        ) PARTITION BY RANGE (ride_date);
+    """
+}
+
+# Constraint and index names follow Postgres' defaults (users_pkey,
+# users_age_check, rides_user_id_fkey, rides_user_id_idx)
+SILVER_PRIMARY_KEYS = {
+    'users': 'user_id',
+    'captains': 'captain_id',
+    'rides': 'ride_id',
+    'payments': 'payment_id',
+    'feedback': 'feedback_id',
+}
+
+SILVER_CHECKS = {
+    'users': {'age': "age > 0"},
+    'captains': {
+        'age': "age > 0",
+        'experience_years': "experience_years >= 0",
+        'rating': "rating >= 0 AND rating <= 5",
+    },
+    'rides': {
+        'distance_km': "distance_km >= 0",
+        'duration_min': "duration_min >= 0",
+    },
+    'payments': {
+        'fare': "fare >= 0",
+        'discount_percent': "discount_percent >= 0 AND discount_percent <= 100",
+        'discount_amount': "discount_amount >= 0",
+        'final_amount': "final_amount >= 0",
+    },
+    'feedback': {
+        'user_rating': "user_rating >= 0 AND user_rating <= 5",
+        'captain_rating': "captain_rating >= 0 AND captain_rating <= 5",
+    },
+}
+
+# Join columns of the gold queries
+SILVER_INDEXES = {
+    'rides': ['user_id', 'captain_id'],
+    'payments': ['ride_id'],
+    'feedback': ['ride_id'],
+}
+
+# table: {column: referenced table}; the referenced column is that table's primary key
+SILVER_FOREIGN_KEYS = {
+    'rides': {'user_id': 'users', 'captain_id': 'captains'},
+    'payments': {'ride_id': 'rides'},
+    'feedback': {'ride_id': 'rides'},
+}
+
+# Tables range-partitioned by month on this column (rides_p202401, ...). The
+# partition column is part of their primary key, and foreign keys between
+# two of them include it, so payments and feedback are co-partitioned with rides.
+SILVER_PARTITIONS = {'rides': 'ride_date', 'payments': 'ride_date', 'feedback': 'ride_date'}
+# Partition columns the cleaners do not produce: table: (parent, join column);
+# they are looked up in the parent while loading
+SILVER_PARTITION_PARENTS = {'payments': ('rides', 'ride_id'), 'feedback': ('rides', 'ride_id')}
+
+create_table_queries_audit = {
+    'users': """
+        CREATE TABLE {schema}.users (
+            user_id VARCHAR,
+            name TEXT,
+            gender VARCHAR(10),
+            age INT,
+            signup_date TEXT,
+            city TEXT,
+            reason TEXT NOT NULL,
+            run_ts TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """,
+    'captains': """
+        CREATE TABLE {schema}.captains (
+            captain_id VARCHAR,
+            name TEXT,
+            age INT,
+            experience_years INT,
+            city TEXT,
+            rating DECIMAL(3,2),
+            reason TEXT NOT NULL,
+            run_ts TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """,
+    'rides': """
+        CREATE TABLE {schema}.rides (
+            ride_id VARCHAR,
+            user_id VARCHAR,
+            captain_id VARCHAR,
+            ride_date TEXT,
+            pickup_loc TEXT,
+            drop_loc TEXT,
+            distance_km DECIMAL(7,2),
+            duration_min INT,
+            ride_status VARCHAR(20),
+            reason TEXT NOT NULL,
+            run_ts TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """,
+    'payments': """
+        CREATE TABLE {schema}.payments (
+            payment_id VARCHAR,
+            ride_id VARCHAR,
+            payment_method VARCHAR(50),
+            fare DECIMAL(10,2),
+            discount_percent DECIMAL(5,2),
+            discount_amount DECIMAL(10,2),
+            final_amount DECIMAL(10,2),
+            payment_status VARCHAR(20),
+            reason TEXT NOT NULL,
+            run_ts TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """,
+    'feedback': """
+        CREATE TABLE {schema}.feedback (
+            feedback_id VARCHAR,
+            ride_id VARCHAR,
+            user_rating DECIMAL(2,1),
+            captain_rating DECIMAL(2,1),
+            issue_category TEXT,
+            comments TEXT,
+            reason TEXT NOT NULL,
+            run_ts TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """
+}
 
 def drop_and_create_schema(conn, schema_name):
     with conn.cursor() as cur:
@@ -35,201 +268,844 @@ def drop_and_create_schema(conn, schema_name):
 def create_tables(conn, schema_name, table_creation_sqls):
     with conn.cursor() as cur:
         for create_sql in table_creation_sqls.values():
-            cur.execute(create_sql)
+            cur.execute(create_sql.format(schema=schema_name))
     conn.commit()
 
-def clear_table(conn, schema, table):
+def _copy_ready(df: pd.DataFrame) -> pd.DataFrame:
+    # Float columns holding whole numbers (ints that picked up NaN) must be
+    # written as "28", not "28.0", or COPY rejects them for INT columns.
+    out = df
+    for col in df.columns:
+        if pd.api.types.is_float_dtype(df[col]):
+            values = df[col].dropna()
+            if (values % 1 == 0).all():
+                if out is df:
+                    out = df.copy()
+                out[col] = df[col].astype("Int64")
+    return out
+
+def _target(schema, table):
+    return sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(table))
+
+def _truncate(cur, schema, table):
+    # CASCADE because a parent cannot be truncated while a child FK
+    # references it; children are (re)loaded after their parents.
+    cur.execute(sql.SQL("TRUNCATE TABLE {} CASCADE").format(_target(schema, table)))
+
+def _copy_frame(cur, df: pd.DataFrame, target):
+    buffer = io.StringIO()
+    _copy_ready(df).to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+    copy_sql = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL {})").format(
+        target,
+        sql.SQL(", ").join(sql.Identifier(col) for col in df.columns),
+        sql.Literal(COPY_NULL),
+    )
+    cur.copy_expert(copy_sql, buffer)
+
+def _report_load(rows, schema, table, elapsed):
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"Loaded {rows} rows into {schema}.{table} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+
+def copy_dataframe_to_postgres(df: pd.DataFrame, schema: str, table: str, conn, truncate=True):
+    """Bulk-load df into schema.table with COPY FROM STDIN in a single transaction.
+
+    The frame is serialised into an in-memory CSV buffer; columns are matched by
+    name, so table columns missing from df take their defaults.
+    """
+    start = time.perf_counter()
+    with telemetry.span("silver.load", schema=schema, table=table) as span:
+        try:
+            with conn.cursor() as cur:
+                if truncate:
+                    _truncate(cur, schema, table)
+                _copy_frame(cur, df, _target(schema, table))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        span.count(rows_in=len(df), rows_out=len(df))
+
+    _report_load(len(df), schema, table, time.perf_counter() - start)
+    return len(df)
+
+def copy_chunks_to_postgres(chunks, table: str, conn, truncate=True, schemas=LIVE_SCHEMAS):
+    """Load streamed (clean, rejects) chunks into <silver>.<table> and <audit>.<table>.
+
+    Both tables are truncated once and filled chunk by chunk inside a single
+    transaction, so only one chunk is held in memory at a time. A partitioned
+    silver table is never truncated: its rows are staged and, in the live
+    schema, only the months that differ from what it holds are rewritten.
+    """
+    silver_schema, audit_schema = schemas
+    partitioned = table in SILVER_PARTITIONS
+    # A shadow table starts out empty, so rows that carry their partition
+    # column are copied straight into it rather than staged
+    direct = partitioned and silver_schema != LIVE_SCHEMAS[0] and table not in SILVER_PARTITION_PARENTS
+    months_created = set()
+    start = time.perf_counter()
+    clean_rows = reject_rows = 0
+    # Only the database work is timed: producing the chunks is the cleaner's span
+    silver_load = telemetry.Span("silver.load", schema=silver_schema, table=table)
+    audit_load = telemetry.Span("audit.load", schema=audit_schema, table=table)
+    try:
+        with conn.cursor() as cur:
+            if truncate:
+                if not partitioned:
+                    with silver_load.measure():
+                        _truncate(cur, silver_schema, table)
+                with audit_load.measure():
+                    _truncate(cur, audit_schema, table)
+            with silver_load.measure():
+                staged = partitioned and not direct
+                clean_target = create_stage(cur, silver_schema, table) if staged else _target(silver_schema, table)
+            for df_clean, df_rejects in chunks:
+                if not df_clean.empty:
+                    with silver_load.measure():
+                        if direct:
+                            new_months = _frame_months(df_clean, SILVER_PARTITIONS[table]) - months_created
+                            create_partitions(cur, silver_schema, table, sorted(new_months))
+                            months_created |= new_months
+                        _copy_frame(cur, df_clean, clean_target)
+                if not df_rejects.empty:
+                    with audit_load.measure():
+                        _copy_frame(cur, df_rejects, _target(audit_schema, table))
+                clean_rows += len(df_clean)
+                reject_rows += len(df_rejects)
+            with silver_load.measure():
+                if partitioned:
+                    months_changed, months = replace_changed_partitions(
+                        cur, silver_schema, table, clean_target if staged else None)
+                else:
+                    record_digests(cur, silver_schema, table, {None: _table_digest(cur, clean_target)})
+        with silver_load.measure():
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    silver_load.count(rows_in=clean_rows, rows_out=clean_rows)
+    audit_load.count(rows_in=reject_rows, rows_out=reject_rows)
+    telemetry.record(silver_load)
+    telemetry.record(audit_load)
+    elapsed = time.perf_counter() - start
+    _report_load(clean_rows, silver_schema, table, elapsed)
+    if partitioned and silver_schema == LIVE_SCHEMAS[0]:
+        print(f"  {silver_schema}.{table}: rewrote {months_changed} of {months} monthly partitions")
+    elif partitioned:
+        print(f"  {silver_schema}.{table}: {months_changed} of {months} months differ from live (a shadow build writes them all)")
+    _report_load(reject_rows, audit_schema, table, elapsed)
+    return clean_rows, reject_rows
+
+def load_dataframe_to_postgres(df: pd.DataFrame, schema: str, table: str, conn, truncate=True):
+    return copy_dataframe_to_postgres(df, schema, table, conn, truncate=truncate)
+
+def clean_and_load(conn, table, *valid_key_sets, chunksize=None, run_ts=None, truncate=True, schemas=LIVE_SCHEMAS):
+    """Clean one bronze CSV into the (silver, audit) schemas; returns the set of loaded keys (or None).
+
+    With chunksize the streaming cleaner is used and rows are loaded as they are
+    cleaned; otherwise the whole file is cleaned in memory first. run_ts stamps
+    every audit row of the run. truncate=False appends to tables emptied beforehand.
+    """
+    bronze_file_path = os.path.join(BRONZE_DIR, f"{table}.csv")
+    clean_fn, stream_fn = CLEANERS[table]
+    key_column = KEY_COLUMNS.get(table)
+
+    with telemetry.span("silver.table", table=table) as table_span:
+        # The cleaner adds the bronze rows it reads to this span (RulePlan.finalize)
+        clean_span = telemetry.Span("silver.clean", table=table)
+        if chunksize:
+            keys = set()
+
+            def chunks():
+                cleaned = stream_fn(bronze_file_path, *valid_key_sets, run_ts=run_ts, chunksize=chunksize)
+                for df_clean, df_rejects in telemetry.measure_iter(clean_span, cleaned):
+                    if key_column:
+                        keys.update(df_clean[key_column])
+                    yield df_clean, df_rejects
+
+            clean_rows, reject_rows = copy_chunks_to_postgres(chunks(), table, conn, truncate=truncate, schemas=schemas)
+        else:
+            with clean_span.measure():
+                df_clean, df_rejects = clean_fn(bronze_file_path, *valid_key_sets, run_ts=run_ts)
+            keys = set(df_clean[key_column]) if key_column else None
+            # Same path as one streamed chunk, so partitioned tables are staged as well
+            clean_rows, reject_rows = copy_chunks_to_postgres(
+                [(df_clean, df_rejects)], table, conn, truncate=truncate, schemas=schemas
+            )
+        clean_span.count(rows_out=clean_rows, rejects=reject_rows)
+        telemetry.record(clean_span)
+        table_span.count(rows_in=clean_span.rows_in, rows_out=clean_rows, rejects=reject_rows)
+    return keys if key_column else None
+
+def downstream_tables(changed):
+    """Return the changed tables plus every silver table that depends on them, in load order."""
+    affected = set(changed)
+    for table in SILVER_TABLES:
+        if any(dep in affected for dep in SILVER_DEPENDENCIES[table]):
+            affected.add(table)
+    return [t for t in SILVER_TABLES if t in affected]
+
+def silver_partitioned(conn, schema='silver'):
+    """False while schema still holds silver tables from before they were partitioned."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT count(*) FROM pg_class WHERE relnamespace = %s::regnamespace AND relname = ANY(%s) AND relkind = 'p'",
+            (schema, list(SILVER_PARTITIONS)),
+        )
+        return cur.fetchone()[0] == len(SILVER_PARTITIONS)
+
+def silver_tables_exist(conn, schemas=LIVE_SCHEMAS):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT count(*) FROM information_schema.tables "
+            "WHERE table_schema = ANY(%s) AND table_name = ANY(%s)",
+            (list(schemas), SILVER_TABLES),
+        )
+        return cur.fetchone()[0] == 2 * len(SILVER_TABLES)
+
+def read_key_set(conn, table, key_column):
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("SELECT {} FROM silver.{}").format(sql.Identifier(key_column), sql.Identifier(table)))
+        return {row[0] for row in cur.fetchall()}
+
+def connect():
+    # Pooled; close() returns the connection to the shared pool
+    return db.raw_connection("silver")
+
+def truncate_tables(conn, tables, schemas=LIVE_SCHEMAS, keep=()):
+    """Empty silver and audit for the given tables in one statement; silver tables in keep are left alone."""
+    silver_schema = schemas[0]
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("TRUNCATE TABLE {} CASCADE").format(
+            sql.SQL(", ").join(
+                _target(schema, table) for schema in schemas for table in tables
+                if not (schema == silver_schema and table in keep)
+            )
+        ))
+        # Emptied partitioned tables must not be compared against their old digests
+        cur.execute(sql.SQL("DELETE FROM {} WHERE table_name = ANY(%s)").format(_target(silver_schema, DIGEST_TABLE)),
+                    ([table for table in tables if table not in keep],))
+    conn.commit()
+
+# ---------------- SILVER PARTITIONS ----------------
+# Month digests: row count plus the sum of the first 60 bits of md5(row) per
+# month, so two months compare equal only when they hold the same rows
+MONTH_DIGESTS_SQL = """
+    SELECT date_trunc('month', {column})::date AS month,
+           count(*) || ':' || sum(('x' || left(md5(t::text), 15))::bit(60)::bigint) AS digest
+    FROM {relation} t
+    GROUP BY 1
+"""
+TABLE_DIGEST_SQL = """
+    SELECT count(*) || ':' || COALESCE(sum(('x' || left(md5(t::text), 15))::bit(60)::bigint), 0)
+    FROM {relation} t
+"""
+
+# Month digests of each partitioned table as of its last load, kept with the
+# generation they describe, so a load compares against them instead of
+# re-reading the live table. Unpartitioned tables get one digest with a NULL
+# month. Gold diffs these to find the months and tables it has to re-read
+# (see load_data/gold_incremental.py).
+DIGEST_TABLE = 'table_digests'
+DIGEST_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {schema}.table_digests (
+        table_name TEXT NOT NULL,
+        month DATE,
+        digest TEXT NOT NULL
+    );
+"""
+
+def create_digest_table(conn, schema_name):
     with conn.cursor() as cur:
-        cur.execute(sql.SQL(f"DELETE FROM {schema}.{table}"))
+        cur.execute(DIGEST_TABLE_SQL.format(schema=schema_name))
     conn.commit()
 
-def load_dataframe_to_postgres(df: pd.DataFrame, schema: str, table: str, conn):
-    clear_table(conn, schema, table)
-    df.to_sql(table, engine, schema=schema, if_exists='append', index=False)
-    print(f"Loaded {len(df)} rows into {schema}.{table}")
-
-def main_pipeline():
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS,
-        host=DB_HOST,
-        port=DB_PORT
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def create_partitions(cur, schema, table, months):
+    """Create the monthly partitions of schema.table for months (first days of months) that are missing."""
+    for month in months:
+        cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+            _target(schema, partition_name(table, month)), _target(schema, table),
+            sql.Literal(month), sql.Literal(_next_month(month)),
+        ))
+
+def _frame_months(df, column):
+    # Cleaned dates are 'YYYY-MM-DD' strings
+    return {datetime.strptime(month, "%Y-%m").date() for month in df[column].str[:7].unique()}
+
+def _partition_months(cur, schema, table):
+    """Months schema.table has partitions for, read from the catalog."""
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+        (f"{schema}.{table}",),
     )
+    # Named <table>_pYYYYMM by partition_name
+    return [datetime.strptime(row[0][len(table) + 2:], "%Y%m").date() for row in cur.fetchall()]
+
+def _months(cur, relation, column):
+    cur.execute(sql.SQL("SELECT DISTINCT date_trunc('month', {})::date FROM {}").format(sql.Identifier(column), relation))
+    return [row[0] for row in cur.fetchall()]
+
+def _month_digests(cur, relation, column):
+    cur.execute(sql.SQL(MONTH_DIGESTS_SQL).format(column=sql.Identifier(column), relation=relation))
+    return dict(cur.fetchall())
+
+def _relkind(cur, schema, relation):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (f"{schema}.{relation}",))
+    row = cur.fetchone()
+    return row[0] if row else None
 
-    # Drop and recreate schemas
-    drop_and_create_schema(conn, 'silver')
-    drop_and_create_schema(conn, 'audit')
-
-    create_table_queries_silver = {
-        'users': """
-            CREATE TABLE silver.users (
-                user_id VARCHAR PRIMARY KEY,
-                name TEXT NOT NULL,
-                gender VARCHAR(10),
-                age INT CHECK (age > 0),
-                signup_date DATE NOT NULL,
-                city TEXT
-            );
-        """,
-        'captains': """
-            CREATE TABLE silver.captains (
-                captain_id VARCHAR PRIMARY KEY,
-                name TEXT NOT NULL,
-                age INT CHECK (age > 0),
-                experience_years INT CHECK (experience_years >= 0),
-                city TEXT,
-                rating DECIMAL(3,2) CHECK (rating >= 0 AND rating <= 5)
-            );
-        """,
-        'rides': """
-            CREATE TABLE silver.rides (
-                ride_id VARCHAR PRIMARY KEY,
-                user_id VARCHAR NOT NULL,
-                captain_id VARCHAR NOT NULL,
-                ride_date DATE NOT NULL,
-                pickup_loc TEXT,
-                drop_loc TEXT,
-                distance_km DECIMAL(7,2) CHECK (distance_km >= 0),
-                duration_min INT CHECK (duration_min >= 0),
-                ride_status VARCHAR(20),
-                FOREIGN KEY (user_id) REFERENCES silver.users(user_id),
-                FOREIGN KEY (captain_id) REFERENCES silver.captains(captain_id)
-            );
-        """,
-        'payments': """
-            CREATE TABLE silver.payments (
-                payment_id VARCHAR PRIMARY KEY,
-                ride_id VARCHAR NOT NULL,
-                payment_method VARCHAR(50),
-                fare DECIMAL(10,2) CHECK (fare >= 0),
-                discount_percent DECIMAL(5,2) CHECK (discount_percent >= 0 AND discount_percent <= 100),
-                discount_amount DECIMAL(10,2) CHECK (discount_amount >= 0),
-                final_amount DECIMAL(10,2) CHECK (final_amount >= 0),
-                payment_status VARCHAR(20),
-                FOREIGN KEY (ride_id) REFERENCES silver.rides(ride_id)
-            );
-        """,
-        'feedback': """
-            CREATE TABLE silver.feedback (
-                feedback_id VARCHAR PRIMARY KEY,
-                ride_id VARCHAR NOT NULL,
-                user_rating DECIMAL(2,1) CHECK (user_rating >= 0 AND user_rating <= 5),
-                captain_rating DECIMAL(2,1) CHECK (captain_rating >= 0 AND captain_rating <= 5),
-                issue_category TEXT,
-                comments TEXT,
-                FOREIGN KEY (ride_id) REFERENCES silver.rides(ride_id)
-            );
-        """
-    }
-
-    create_table_queries_audit = {
-        'users': """
-            CREATE TABLE audit.users (
-                user_id VARCHAR,
-                name TEXT,
-                gender VARCHAR(10),
-                age INT,
-                signup_date TEXT,
-                city TEXT,
-                reason TEXT NOT NULL,
-                run_ts TIMESTAMP NOT NULL DEFAULT now()
-            );
-        """,
-        'captains': """
-            CREATE TABLE audit.captains (
-                captain_id VARCHAR,
-                name TEXT,
-                age INT,
-                experience_years INT,
-                city TEXT,
-                rating DECIMAL(3,2),
-                reason TEXT NOT NULL,
-                run_ts TIMESTAMP NOT NULL DEFAULT now()
-            );
-        """,
-        'rides': """
-            CREATE TABLE audit.rides (
-                ride_id VARCHAR,
-                user_id VARCHAR,
-                captain_id VARCHAR,
-                ride_date TEXT,
-                pickup_loc TEXT,
-                drop_loc TEXT,
-                distance_km DECIMAL(7,2),
-                duration_min INT,
-                ride_status VARCHAR(20),
-                reason TEXT NOT NULL,
-                run_ts TIMESTAMP NOT NULL DEFAULT now()
-            );
-        """,
-        'payments': """
-            CREATE TABLE audit.payments (
-                payment_id VARCHAR,
-                ride_id VARCHAR,
-                payment_method VARCHAR(50),
-                fare DECIMAL(10,2),
-                discount_percent DECIMAL(5,2),
-                discount_amount DECIMAL(10,2),
-                final_amount DECIMAL(10,2),
-                payment_status VARCHAR(20),
-                reason TEXT NOT NULL,
-                run_ts TIMESTAMP NOT NULL DEFAULT now()
-            );
-        """,
-        'feedback': """
-            CREATE TABLE audit.feedback (
-                feedback_id VARCHAR,
-                ride_id VARCHAR,
-                user_rating DECIMAL(2,1),
-                captain_rating DECIMAL(2,1),
-                issue_category TEXT,
-                comments TEXT,
-                reason TEXT NOT NULL,
-                run_ts TIMESTAMP NOT NULL DEFAULT now()
-            );
-        """
-    }
-
-    # Create all tables
-    create_tables(conn, 'silver', create_table_queries_silver)
-    create_tables(conn, 'audit', create_table_queries_audit)
-
-    df_users_clean, df_users_rejects = clean_users_data(os.path.join("../bronze_inputs", "users.csv"))
-    load_dataframe_to_postgres(df_users_clean, 'silver', 'users', conn)
-    load_dataframe_to_postgres(df_users_rejects, 'audit', 'users', conn)
-
-    df_captains_clean, df_captains_rejects = clean_captains_data(os.path.join("../bronze_inputs", "captains.csv"))
-    load_dataframe_to_postgres(df_captains_clean, 'silver', 'captains', conn)
-    load_dataframe_to_postgres(df_captains_rejects, 'audit', 'captains', conn)
-
-    valid_user_ids = set(df_users_clean['user_id'])
-    valid_captain_ids = set(df_captains_clean['captain_id'])
-
-    df_rides_clean, df_rides_rejects = clean_rides_data(
-        os.path.join("../bronze_inputs", "rides.csv"),
-        valid_user_ids,
-        valid_captain_ids,
+def recorded_digests(cur, schema, table):
+    """{month: digest} of schema.table as of its last load.
+
+    Falls back to digesting the table itself when its schema predates the
+    recorded digests; {} when there is no partitioned table to compare with.
+    """
+    if _relkind(cur, schema, DIGEST_TABLE) is not None:
+        cur.execute(sql.SQL("SELECT month, digest FROM {} WHERE table_name = %s").format(
+            _target(schema, DIGEST_TABLE)), (table,))
+        digests = dict(cur.fetchall())
+        if digests:
+            return digests
+    if _relkind(cur, schema, table) != 'p':
+        return {}
+    return _month_digests(cur, _target(schema, table), SILVER_PARTITIONS[table])
+
+def _table_digest(cur, relation):
+    cur.execute(sql.SQL(TABLE_DIGEST_SQL).format(relation=relation))
+    return cur.fetchone()[0]
+
+def record_digests(cur, schema, table, digests):
+    cur.execute(sql.SQL("DELETE FROM {} WHERE table_name = %s").format(_target(schema, DIGEST_TABLE)), (table,))
+    cur.executemany(
+        sql.SQL("INSERT INTO {} (table_name, month, digest) VALUES (%s, %s, %s)").format(_target(schema, DIGEST_TABLE)),
+        [(table, month, digest) for month, digest in digests.items()],
     )
-    load_dataframe_to_postgres(df_rides_clean, 'silver', 'rides', conn)
-    load_dataframe_to_postgres(df_rides_rejects, 'audit', 'rides', conn)
 
-    valid_ride_ids = set(df_rides_clean['ride_id'])
-    df_payments_clean, df_payments_rejects = clean_payments_data(
-        os.path.join("../bronze_inputs", "payments.csv"),
-        valid_ride_ids,
+def create_stage(cur, schema, table):
+    """Temporary table, shaped like schema.table, that a load COPYs its rows into; dropped at commit."""
+    stage = _target("pg_temp", f"{table}_stage")
+    cur.execute(sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT * FROM {} WITH NO DATA").format(
+        stage, _target(schema, table)))
+    return stage
+
+def _filled_select(cur, schema, table, stage):
+    # Rows arrive without the partition column; take it from the parent they reference
+    parent, column = SILVER_PARTITION_PARENTS[table]
+    partition_column = SILVER_PARTITIONS[table]
+    cur.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(stage))
+    select = sql.SQL(", ").join(
+        sql.SQL("p.{}").format(sql.Identifier(col.name)) if col.name == partition_column
+        else sql.SQL("s.{}").format(sql.Identifier(col.name))
+        for col in cur.description
     )
-    load_dataframe_to_postgres(df_payments_clean, 'silver', 'payments', conn)
-    load_dataframe_to_postgres(df_payments_rejects, 'audit', 'payments', conn)
+    return sql.SQL("SELECT {} FROM {} s JOIN {} p ON p.{} = s.{}").format(
+        select, stage, _target(schema, parent), sql.Identifier(column), sql.Identifier(column))
+
+def _fill_partition_column(cur, schema, table, stage):
+    filled = _target("pg_temp", f"{table}_filled")
+    cur.execute(sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS {}").format(
+        filled, _filled_select(cur, schema, table, stage)))
+    return filled
+
+def replace_changed_partitions(cur, schema, table, stage):
+    """Make schema.table hold exactly the staged rows and record their month digests.
+
+    In the live schema only the months whose digest differs from the recorded
+    one are truncated and refilled, new months get a partition and months no
+    longer staged lose theirs. A shadow schema starts out empty, so every
+    month is written there; stage is None when the rows were copied into
+    schema.table directly, and payments/feedback go from the stage straight
+    into it. Returns (months that differ from live silver, months staged).
+    """
+    column = SILVER_PARTITIONS[table]
+    live = recorded_digests(cur, LIVE_SCHEMAS[0], table)
 
-    df_feedback_clean, df_feedback_rejects = clean_feedback_data(
-        os.path.join("../bronze_inputs", "feedback.csv"),
-        valid_ride_ids
+    if schema != LIVE_SCHEMAS[0]:
+        if stage is not None:
+            # Parents are loaded first; a child only has rows in its parent's months
+            parent = SILVER_PARTITION_PARENTS[table][0]
+            create_partitions(cur, schema, table, _partition_months(cur, schema, parent))
+            cur.execute(sql.SQL("INSERT INTO {} {}").format(
+                _target(schema, table), _filled_select(cur, schema, table, stage)))
+        staged = _month_digests(cur, _target(schema, table), column)
+    else:
+        if table in SILVER_PARTITION_PARENTS:
+            stage = _fill_partition_column(cur, schema, table, stage)
+        staged = _month_digests(cur, stage, column)
+        rewrite = sorted(month for month, digest in staged.items() if live.get(month) != digest)
+        for month in rewrite:
+            if month in live:
+                cur.execute(sql.SQL("TRUNCATE TABLE {}").format(_target(schema, partition_name(table, month))))
+        for month in live.keys() - staged.keys():
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(_target(schema, partition_name(table, month))))
+        create_partitions(cur, schema, table, [month for month in rewrite if month not in live])
+        if rewrite:
+            cur.execute(sql.SQL("INSERT INTO {} SELECT * FROM {} WHERE date_trunc('month', {})::date = ANY(%s)").format(
+                _target(schema, table), stage, sql.Identifier(column)), (rewrite,))
+
+    record_digests(cur, schema, table, staged)
+    changed = {month for month, digest in staged.items() if live.get(month) != digest} | (live.keys() - staged.keys())
+    return len(changed), len(staged)
+
+# ---------------- SILVER CONSTRAINTS ----------------
+def _name(table, column, suffix):
+    return sql.Identifier(f"{table}_{column}_{suffix}")
+
+def _columns(columns):
+    return sql.SQL(", ").join(sql.Identifier(column) for column in columns)
+
+def key_columns(table):
+    """Primary key columns of a silver table; partitioned tables add their partition column."""
+    partition_column = SILVER_PARTITIONS.get(table)
+    return [SILVER_PRIMARY_KEYS[table]] + ([partition_column] if partition_column else [])
+
+def _foreign_key_columns(table, column, parent):
+    # Between two tables partitioned on the same column the key includes it
+    partition_column = SILVER_PARTITIONS.get(table)
+    if partition_column and SILVER_PARTITIONS.get(parent) == partition_column:
+        return [column, partition_column]
+    return [column]
+
+def constraint_phases(tables, schema='silver'):
+    """DDL adding the keys, checks, join indexes and foreign keys of tables, as a list of phases.
+
+    Statements within a phase may run concurrently; each phase needs the one
+    before it (foreign keys need the referenced primary keys).
+    """
+    tables = [t for t in SILVER_TABLES if t in tables]
+    keys = []
+    for table in tables:
+        clauses = [sql.SQL("ADD CONSTRAINT {} PRIMARY KEY ({})").format(
+            sql.Identifier(f"{table}_pkey"), _columns(key_columns(table)))]
+        clauses += [
+            sql.SQL("ADD CONSTRAINT {} CHECK ({})").format(_name(table, column, "check"), sql.SQL(check))
+            for column, check in SILVER_CHECKS.get(table, {}).items()
+        ]
+        keys.append(sql.SQL("ALTER TABLE {} {}").format(_target(schema, table), sql.SQL(", ").join(clauses)))
+
+    indexes = [
+        sql.SQL("CREATE INDEX {} ON {} ({})").format(_name(table, column, "idx"), _target(schema, table), sql.Identifier(column))
+        for table in tables for column in SILVER_INDEXES.get(table, [])
+    ]
+
+    # One statement per child table: two FKs on the same table would only queue on its lock
+    foreign_keys = [
+        sql.SQL("ALTER TABLE {} {}").format(_target(schema, table), sql.SQL(", ").join(
+            sql.SQL("ADD CONSTRAINT {} FOREIGN KEY ({}) REFERENCES {} ({})").format(
+                _name(table, column, "fkey"), _columns(_foreign_key_columns(table, column, parent)),
+                _target(schema, parent), _columns(key_columns(parent)),
+            )
+            for column, parent in SILVER_FOREIGN_KEYS[table].items()
+        ))
+        for table in tables if table in SILVER_FOREIGN_KEYS
+    ]
+    return [phase for phase in (keys, indexes, foreign_keys) if phase]
+
+def drop_constraints(conn, tables, schema='silver'):
+    """Drop what constraint_phases builds for tables, so they can be bulk-loaded bare again."""
+    tables = [t for t in SILVER_TABLES if t in tables]
+    with conn.cursor() as cur:
+        # Foreign keys first: they depend on the referenced primary key
+        for table in tables:
+            for column in SILVER_FOREIGN_KEYS.get(table, {}):
+                cur.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT IF EXISTS {}").format(
+                    _target(schema, table), _name(table, column, "fkey")))
+        for table in tables:
+            for column in SILVER_INDEXES.get(table, []):
+                cur.execute(sql.SQL("DROP INDEX IF EXISTS {}.{}").format(sql.Identifier(schema), _name(table, column, "idx")))
+            for column in SILVER_CHECKS.get(table, {}):
+                cur.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT IF EXISTS {}").format(
+                    _target(schema, table), _name(table, column, "check")))
+            cur.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT IF EXISTS {}").format(
+                _target(schema, table), sql.Identifier(f"{table}_pkey")))
+    conn.commit()
+
+def _execute_ddl(statement):
+    # Own connection per statement, so statements of a phase run in parallel
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _run_concurrently(statements, workers=TRANSFORM_WORKERS):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_execute_ddl, statements))
+
+def build_constraints(tables, schema='silver', workers=TRANSFORM_WORKERS):
+    """Add primary keys and checks, then the join indexes, then foreign keys of tables."""
+    start = time.perf_counter()
+    for statements in constraint_phases(tables, schema):
+        _run_concurrently(statements, workers)
+    print(f"✅ Built keys, indexes and foreign keys for {len(tables)} {schema} tables in {time.perf_counter() - start:.2f}s")
+
+def analyze_tables(tables, schema='silver', workers=TRANSFORM_WORKERS):
+    _run_concurrently([sql.SQL("ANALYZE {}").format(_target(schema, table)) for table in tables], workers)
+
+# ---------------- SILVER STAGE SCHEDULING ----------------
+def _valid_key_sets(table, keys):
+    return [keys[dep] for dep in SILVER_DEPENDENCIES[table]]
+
+def run_sequential(conn, tables, keys, chunksize, run_ts, schemas=LIVE_SCHEMAS):
+    """Clean and load tables one after another in load order; returns {table: seconds}."""
+    timings = {}
+    for table in tables:
+        start = time.perf_counter()
+        keys[table] = clean_and_load(
+            conn, table, *_valid_key_sets(table, keys), chunksize=chunksize, run_ts=run_ts, truncate=False, schemas=schemas
+        )
+        timings[table] = time.perf_counter() - start
+    return timings
+
+def _clean_and_load_worker(table, valid_key_sets, chunksize, run_ts, schemas):
+    # Runs in a pool process with its own connection; tables were truncated up front
+    conn = connect()
+    try:
+        start = time.perf_counter()
+        keys = clean_and_load(
+            conn, table, *valid_key_sets, chunksize=chunksize, run_ts=run_ts, truncate=False, schemas=schemas
+        )
+        return keys, time.perf_counter() - start
+    finally:
+        conn.close()
+
+def run_parallel(conn, tables, keys, chunksize, run_ts, workers=TRANSFORM_WORKERS, schemas=LIVE_SCHEMAS):
+    """Run each table's clean+load in a process pool as soon as its dependencies are loaded.
+
+    Only the key sets named in SILVER_DEPENDENCIES travel between processes.
+    Returns {table: seconds}.
+    """
+    timings = {}
+    pending = list(tables)
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for table in [t for t in pending if all(dep in keys for dep in SILVER_DEPENDENCIES[t])]:
+                pending.remove(table)
+                future = pool.submit(_clean_and_load_worker, table, _valid_key_sets(table, keys), chunksize, run_ts, schemas)
+                running[future] = table
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                table = running.pop(future)
+                keys[table], timings[table] = future.result()
+    return timings
+
+def critical_path(timings):
+    """Longest dependency chain through the steps that ran: (tables, seconds)."""
+    finish, previous = {}, {}
+    for table in SILVER_TABLES:
+        if table not in timings:
+            continue
+        deps = [dep for dep in SILVER_DEPENDENCIES[table] if dep in finish]
+        previous[table] = max(deps, key=finish.get, default=None)
+        finish[table] = timings[table] + (finish[previous[table]] if previous[table] else 0)
+    if not finish:
+        return [], 0.0
+
+    table = max(finish, key=finish.get)
+    total = finish[table]
+    path = []
+    while table:
+        path.append(table)
+        table = previous[table]
+    return path[::-1], total
+
+def report_silver_stage(mode, timings, elapsed):
+    for table, seconds in timings.items():
+        print(f"  {table}: {seconds:.2f}s")
+    path, path_seconds = critical_path(timings)
+    print(
+        f"Silver stage ({mode}) took {elapsed:.2f}s; steps sum to {sum(timings.values()):.2f}s; "
+        f"critical path {' -> '.join(path)} = {path_seconds:.2f}s"
     )
-    load_dataframe_to_postgres(df_feedback_clean, 'silver', 'feedback', conn)
-    load_dataframe_to_postgres(df_feedback_rejects, 'audit', 'feedback', conn)
+
+# ---------------- SHADOW BUILD ----------------
+# Views, materialized views and foreign keys outside the given schemas that
+# read a relation inside them
+EXTERNAL_DEPENDANTS_SQL = """
+SELECT DISTINCT dn.nspname || '.' || dep.relname
+FROM pg_depend d
+JOIN pg_class ref ON d.refclassid = 'pg_class'::regclass AND ref.oid = d.refobjid
+JOIN pg_namespace rn ON rn.oid = ref.relnamespace
+LEFT JOIN pg_rewrite rw ON d.classid = 'pg_rewrite'::regclass AND rw.oid = d.objid
+LEFT JOIN pg_constraint con ON d.classid = 'pg_constraint'::regclass AND con.oid = d.objid
+JOIN pg_class dep ON dep.oid = COALESCE(rw.ev_class, con.conrelid)
+JOIN pg_namespace dn ON dn.oid = dep.relnamespace
+WHERE rn.nspname = ANY(%s) AND dn.nspname <> ALL(%s)
+ORDER BY 1
+"""
+
+def copy_tables(conn, tables, schemas):
+    """Carry tables over from the live silver/audit schemas into schemas.
+
+    Every row is copied (and the tables' keys are rebuilt with the rest of
+    the shadow build), so a partial shadow build still costs a full silver
+    write; in_place builds only touch the tables they reload.
+    """
+    if not tables:
+        return
+    start = time.perf_counter()
+    rows = 0
+    with conn.cursor() as cur:
+        for table in tables:
+            if table in SILVER_PARTITIONS:
+                months = _months(cur, _target(LIVE_SCHEMAS[0], table), SILVER_PARTITIONS[table])
+                create_partitions(cur, schemas[0], table, months)
+            for live, target in zip(LIVE_SCHEMAS, schemas):
+                cur.execute(sql.SQL("INSERT INTO {} SELECT * FROM {}").format(_target(target, table), _target(live, table)))
+                rows += cur.rowcount
+        if _relkind(cur, LIVE_SCHEMAS[0], DIGEST_TABLE) is not None:
+            cur.execute(sql.SQL("INSERT INTO {} SELECT * FROM {} WHERE table_name = ANY(%s)").format(
+                _target(schemas[0], DIGEST_TABLE), _target(LIVE_SCHEMAS[0], DIGEST_TABLE)), (list(tables),))
+    conn.commit()
+    print(f"Carried {', '.join(tables)} over from the live schemas: {rows} rows in {time.perf_counter() - start:.2f}s")
+
+def _count_rows(cur, schema, table):
+    cur.execute(sql.SQL("SELECT count(*) FROM {}").format(_target(schema, table)))
+    return cur.fetchone()[0]
+
+def validate_shadow(conn, schemas=SHADOW_SCHEMAS):
+    """Check a shadow build before it goes live; raises RuntimeError listing every problem.
+
+    Every silver table must be non-empty, hold no less than SHADOW_MAX_SHRINK of
+    the live table's rows, and carry all its keys, checks and indexes.
+    """
+    silver_schema = schemas[0]
+    problems = []
+    live = silver_tables_exist(conn)
+    with conn.cursor() as cur:
+        for table in SILVER_TABLES:
+            rows = _count_rows(cur, silver_schema, table)
+            live_rows = _count_rows(cur, LIVE_SCHEMAS[0], table) if live else 0
+            if rows == 0:
+                problems.append(f"{silver_schema}.{table} is empty")
+            elif rows < live_rows * (1 - SHADOW_MAX_SHRINK):
+                problems.append(f"{silver_schema}.{table} has {rows} rows, live has {live_rows}")
+
+        # Counted on the tables themselves; partitions carry copies of theirs
+        expected = len(SILVER_PRIMARY_KEYS) + sum(map(len, SILVER_CHECKS.values())) + sum(map(len, SILVER_FOREIGN_KEYS.values()))
+        cur.execute(
+            "SELECT count(*) FROM pg_constraint con JOIN pg_class c ON c.oid = con.conrelid "
+            "WHERE c.relnamespace = %s::regnamespace AND NOT c.relispartition "
+            "AND con.conparentid = 0 AND con.contype IN ('p', 'c', 'f')",
+            (silver_schema,),
+        )
+        constraints = cur.fetchone()[0]
+        if constraints != expected:
+            problems.append(f"{silver_schema} has {constraints} of {expected} constraints")
+
+        cur.execute(
+            "SELECT count(*) FROM pg_index i JOIN pg_class c ON c.oid = i.indrelid "
+            "WHERE c.relnamespace = %s::regnamespace AND NOT c.relispartition",
+            (silver_schema,),
+        )
+        indexes = cur.fetchone()[0]
+        expected = len(SILVER_PRIMARY_KEYS) + sum(map(len, SILVER_INDEXES.values()))
+        if indexes != expected:
+            problems.append(f"{silver_schema} has {indexes} of {expected} indexes")
+
+    for problem in problems:
+        print(f"⚠️ {problem}")
+    if problems:
+        raise RuntimeError(f"Shadow build in {', '.join(schemas)} failed validation; live schemas left untouched")
+
+def _schema_exists(cur, schema):
+    cur.execute("SELECT 1 FROM pg_namespace WHERE nspname = %s", (schema,))
+    return cur.fetchone() is not None
+
+def _rename_schema(cur, old, new):
+    cur.execute(sql.SQL("ALTER SCHEMA {} RENAME TO {}").format(sql.Identifier(old), sql.Identifier(new)))
+
+def check_previous_droppable(cur):
+    """Raise RuntimeError if anything outside silver_prev/audit_prev reads them.
+
+    The next swap drops that generation; it must not take gold (or anyone
+    else's) views and foreign keys down with it.
+    """
+    cur.execute(EXTERNAL_DEPENDANTS_SQL, (list(PREVIOUS_SCHEMAS), list(PREVIOUS_SCHEMAS)))
+    dependants = [row[0] for row in cur.fetchall()]
+    if dependants:
+        raise RuntimeError(
+            f"{', '.join(dependants)} still read {', '.join(PREVIOUS_SCHEMAS)}, which the silver swap would drop; "
+            f"rebuild them against {LIVE_SCHEMAS[0]} (for gold, run the gold stage) or drop them first"
+        )
+
+def point_silver_views(cur):
+    """Point silver_views.<table> at the live silver.<table>, creating the views as needed.
+
+    CREATE OR REPLACE keeps each view (and whatever reads it) in place while
+    it is rebound, so this runs inside the swap's transaction.
+    """
+    cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(SILVER_VIEW_SCHEMA)))
+    for table in SILVER_TABLES:
+        cur.execute(sql.SQL("CREATE OR REPLACE VIEW {} AS SELECT * FROM {}").format(
+            _target(SILVER_VIEW_SCHEMA, table), _target(LIVE_SCHEMAS[0], table)))
+
+def swap_schemas(conn, schemas=SHADOW_SCHEMAS):
+    """Make schemas the live silver/audit in one transaction.
+
+    The replaced live schemas become silver_prev/audit_prev (dropping the
+    generation before them), so rollback_silver() can bring them back.
+    silver_views is repointed at the new tables in the same transaction.
+    Nothing outside that generation may still read it (check_previous_droppable).
+    """
+    start = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL lock_timeout = %s", (SWAP_LOCK_TIMEOUT,))
+            check_previous_droppable(cur)
+            for live, new, previous in zip(LIVE_SCHEMAS, schemas, PREVIOUS_SCHEMAS):
+                # Checked above: CASCADE only reaches the generation's own objects
+                cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(previous)))
+                if _schema_exists(cur, live):
+                    _rename_schema(cur, live, previous)
+                _rename_schema(cur, new, live)
+            point_silver_views(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"✅ Swapped {', '.join(schemas)} in as {', '.join(LIVE_SCHEMAS)} in {time.perf_counter() - start:.3f}s")
+
+def rollback_silver(conn=None):
+    """Swap silver_prev/audit_prev back in; the generation they replace becomes the new *_prev."""
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL lock_timeout = %s", (SWAP_LOCK_TIMEOUT,))
+            for live, previous in zip(LIVE_SCHEMAS, PREVIOUS_SCHEMAS):
+                if not _schema_exists(cur, previous):
+                    raise RuntimeError(f"No previous generation ({previous}) to roll back to")
+                _rename_schema(cur, live, f"{live}_rollback")
+                _rename_schema(cur, previous, live)
+                _rename_schema(cur, f"{live}_rollback", previous)
+            point_silver_views(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+    print(f"✅ Rolled {', '.join(LIVE_SCHEMAS)} back to the previous generation")
+
+def main_pipeline(tables=None, chunksize=CLEAN_CHUNKSIZE, mode=None, load_mode=None, build_mode=None):
+    """Clean bronze CSVs and load silver/audit.
+
+    tables limits the run to those tables and their dependants; the others are
+    left as loaded by the previous run. chunksize switches the cleaners to
+    streaming mode. mode is "parallel" or "sequential" (default TRANSFORM_MODE),
+    load_mode "deferred" or "immediate" (default SILVER_LOAD_MODE), build_mode
+    "shadow" or "in_place" (default SILVER_BUILD_MODE).
+    Returns the list of tables rebuilt.
+    """
+    mode = mode or TRANSFORM_MODE
+    if mode not in ("parallel", "sequential"):
+        raise ValueError(f"Unknown TRANSFORM_MODE '{mode}'")
+    load_mode = load_mode or SILVER_LOAD_MODE
+    if load_mode not in ("deferred", "immediate"):
+        raise ValueError(f"Unknown SILVER_LOAD_MODE '{load_mode}'")
+    build_mode = build_mode or SILVER_BUILD_MODE
+    if build_mode not in ("shadow", "in_place"):
+        raise ValueError(f"Unknown SILVER_BUILD_MODE '{build_mode}'")
+
+    conn = connect()
+
+    rebuild = SILVER_TABLES if tables is None else downstream_tables(tables)
+    if not rebuild:
+        print("No silver tables to rebuild.")
+        conn.close()
+        return []
+
+    if len(rebuild) == len(SILVER_TABLES) or not silver_tables_exist(conn) or not silver_partitioned(conn):
+        rebuild = SILVER_TABLES
+
+    shadow = build_mode == "shadow"
+    schemas = SHADOW_SCHEMAS if shadow else LIVE_SCHEMAS
+    silver_schema, audit_schema = schemas
+    if shadow:
+        # Fail before the build rather than at the swap
+        try:
+            with conn.cursor() as cur:
+                check_previous_droppable(cur)
+        finally:
+            conn.rollback()
+
+    # A shadow build always starts from empty schemas
+    fresh = shadow or rebuild == SILVER_TABLES
+    if fresh:
+        # Drop and recreate schemas
+        drop_and_create_schema(conn, silver_schema)
+        drop_and_create_schema(conn, audit_schema)
+
+        # Create all tables
+        create_tables(conn, silver_schema, create_table_queries_silver)
+        create_tables(conn, audit_schema, create_table_queries_audit)
+        create_digest_table(conn, silver_schema)
+
+        # Tables that are not rebuilt keep their live contents
+        copy_tables(conn, [t for t in SILVER_TABLES if t not in rebuild], schemas)
+        if load_mode == "immediate":
+            build_constraints(SILVER_TABLES, silver_schema)
+    else:
+        create_digest_table(conn, silver_schema)
+        if load_mode == "deferred":
+            # Reloaded tables lose their keys and indexes until the load is done;
+            # their dependants are reloaded too, so no kept table references them
+            drop_constraints(conn, rebuild)
+        # Emptied once up front, so parallel loads never wait on each other's
+        # TRUNCATE ... CASCADE locks. Partitioned tables only rewrite the months
+        # that changed, unless foreign keys (immediate) stop their partitions
+        # from being truncated one by one.
+        keep = SILVER_PARTITIONS if load_mode == "deferred" else ()
+        truncate_tables(conn, rebuild, schemas, keep=keep)
+
+    # One timestamp for all audit rows written by this run
+    run_ts = datetime.now()
+
+    # Key sets of tables kept from the previous run are read back from silver
+    keys = {}
+    for table in SILVER_TABLES:
+        needed = any(table in SILVER_DEPENDENCIES[t] for t in rebuild)
+        if table not in rebuild and needed:
+            keys[table] = read_key_set(conn, table, KEY_COLUMNS[table])
+
+    start = time.perf_counter()
+    if mode == "parallel":
+        timings = run_parallel(conn, rebuild, keys, chunksize, run_ts, schemas=schemas)
+    else:
+        timings = run_sequential(conn, rebuild, keys, chunksize, run_ts, schemas=schemas)
+    report_silver_stage(mode, timings, time.perf_counter() - start)
+
+    constrained = SILVER_TABLES if fresh else rebuild
+    if load_mode == "deferred":
+        build_constraints(constrained, silver_schema)
+    analyze_tables(constrained, silver_schema)
+
+    if shadow:
+        validate_shadow(conn, schemas)
+        swap_schemas(conn, schemas)
+    else:
+        # A full in-place rebuild dropped the views along with the old schema
+        with conn.cursor() as cur:
+            point_silver_views(cur)
+        conn.commit()
 
     conn.close()
+    return rebuild
 
 if __name__ == '__main__':
-    main_pipeline()
+    if sys.argv[1:] == ['rollback']:
+        rollback_silver()
+    else:
+        main_pipeline()
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# The pipeline modules import each other as src.*, load_data.* and transform.*
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import push_gold_to_sheets as push
+from fake_sheets import FakeSheets
+
+
+@pytest.fixture(scope="session")
+def private_key_pem():
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Sleeps requested by push_gold_to_sheets, recorded instead of slept."""
+    slept = []
+    monkeypatch.setattr(push, "time", SimpleNamespace(
+        monotonic=time.monotonic, perf_counter=time.perf_counter, sleep=slept.append,
+    ))
+    return slept
+
+
+@pytest.fixture
+def fake_sheets(tmp_path, monkeypatch, private_key_pem, sleeps):
+    """A running FakeSheets with push_gold_to_sheets pointed at it."""
+    fake = FakeSheets().start()
+    credentials_file = tmp_path / "service_account.json"
+    credentials_file.write_text(json.dumps({
+        "type": "service_account",
+        "project_id": "test",
+        "private_key_id": "test",
+        "private_key": private_key_pem,
+        "client_email": "etl@test.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": f"{fake.url}/token",
+    }))
+    monkeypatch.setattr(push, "TARGET_SHEET_ID", "test-sheet")
+    monkeypatch.setattr(push, "SERVICE_ACCOUNT_FILE", str(credentials_file))
+    monkeypatch.setattr(push, "SHEETS_API_URL", f"{fake.url}/v4/spreadsheets")
+    monkeypatch.setattr(push, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(push, "_session", None)
+    monkeypatch.setattr(push, "_limiter", push.TokenBucket(1000, 1000))
+    yield fake
+    fake.stop()
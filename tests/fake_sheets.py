@@ -0,0 +1,231 @@
+import json
+import random
+import re
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+# 'Title'!A2:C10, or just 'Title' (the whole tab)
+RANGE = re.compile(r"^'((?:[^']|'')*)'(?:!([A-Z]+)(\d+):([A-Z]+)(\d+))?$")
+
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+
+def parse_range(a1):
+    """'Title'!A2:C10 -> (title, (first row, first col, last row, last col)); the box is None for a whole tab."""
+    match = RANGE.match(a1)
+    if match is None:
+        raise ValueError(f"Unsupported range {a1!r}")
+    title = match.group(1).replace("''", "'")
+    if match.group(2) is None:
+        return title, None
+    return title, (
+        int(match.group(3)), _column_number(match.group(2)),
+        int(match.group(5)), _column_number(match.group(4)),
+    )
+
+
+class FakeSheets:
+    """In-memory stand-in for the parts of the Sheets v4 API the push uses, served on localhost.
+
+    Handles the service-account token exchange, spreadsheet metadata,
+    addSheet/updateSheetProperties, values:batchUpdate and values:clear.
+    Writes outside a tab's grid fail with 400, as they do on Google's side.
+    Every API request is recorded in `requests` as (method, path, body).
+
+    Faults: each API request first takes the next entry of `faults`, either
+    (status, headers) to answer with or DISCONNECT to drop the connection
+    unanswered. Past those, `fail_rate` of requests get a 503 (seeded, so
+    runs repeat), and bodies over `max_request_bytes` get a 413. Faults
+    served are recorded in `failures`.
+    """
+
+    DISCONNECT = "disconnect"
+
+    def __init__(self, fail_rate=0.0, seed=0, max_request_bytes=None):
+        self.sheets = {}
+        self.requests = []
+        self.faults = deque()
+        self.failures = []
+        self.fail_rate = fail_rate
+        self.max_request_bytes = max_request_bytes
+        self._random = random.Random(seed)
+        self.lock = threading.Lock()
+        self._next_sheet_id = 1
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # ---------------- TEST HELPERS ----------------
+    def add_sheet(self, title, rows=1000, cols=26):
+        with self.lock:
+            return self._add_sheet({"title": title, "gridProperties": {"rowCount": rows, "columnCount": cols}})
+
+    def delete_sheet(self, title):
+        with self.lock:
+            del self.sheets[title]
+
+    def grid(self, title):
+        """The tab's values as rows, trimmed to the last non-empty row and column."""
+        cells = self.sheets[title]["cells"]
+        if not cells:
+            return []
+        rows = max(row for row, _ in cells)
+        cols = max(col for _, col in cells)
+        return [[cells.get((row, col), "") for col in range(1, cols + 1)] for row in range(1, rows + 1)]
+
+    def grid_size(self, title):
+        grid = self.sheets[title]["properties"]["gridProperties"]
+        return grid["rowCount"], grid["columnCount"]
+
+    def writes(self):
+        """Recorded requests that change the spreadsheet."""
+        return [request for request in self.requests if request[0] == "POST"]
+
+    # ---------------- API ----------------
+    def _add_sheet(self, properties):
+        properties = {**properties, "sheetId": self._next_sheet_id}
+        self._next_sheet_id += 1
+        self.sheets[properties["title"]] = {"properties": properties, "cells": {}}
+        return properties
+
+    def _sheet_by_id(self, sheet_id):
+        return next(sheet for sheet in self.sheets.values() if sheet["properties"]["sheetId"] == sheet_id)
+
+    def _metadata(self):
+        return 200, {"sheets": [{"properties": sheet["properties"]} for sheet in self.sheets.values()]}
+
+    def _batch_update(self, body):
+        replies = []
+        for request in body["requests"]:
+            if "addSheet" in request:
+                replies.append({"addSheet": {"properties": self._add_sheet(request["addSheet"]["properties"])}})
+            elif "updateSheetProperties" in request:
+                properties = request["updateSheetProperties"]["properties"]
+                sheet = self._sheet_by_id(properties["sheetId"])
+                grid = properties["gridProperties"]
+                sheet["properties"]["gridProperties"] = dict(grid)
+                # Shrinking the grid deletes the cells cut off
+                sheet["cells"] = {
+                    (row, col): value for (row, col), value in sheet["cells"].items()
+                    if row <= grid["rowCount"] and col <= grid["columnCount"]
+                }
+                replies.append({})
+            else:
+                return 400, {"error": f"Unsupported request {sorted(request)}"}
+        return 200, {"replies": replies}
+
+    def _values_batch_update(self, body):
+        for value_range in body["data"]:
+            title, (first_row, first_col, last_row, last_col) = parse_range(value_range["range"])
+            sheet = self.sheets[title]
+            grid = sheet["properties"]["gridProperties"]
+            if last_row > grid["rowCount"] or last_col > grid["columnCount"]:
+                return 400, {"error": f"Range {value_range['range']} exceeds grid limits"}
+            if len(value_range["values"]) != last_row - first_row + 1:
+                return 400, {"error": f"Range {value_range['range']} does not match the rows sent"}
+            for row_offset, row in enumerate(value_range["values"]):
+                for col_offset, value in enumerate(row):
+                    key = (first_row + row_offset, first_col + col_offset)
+                    if value == "":
+                        sheet["cells"].pop(key, None)
+                    else:
+                        sheet["cells"][key] = value
+        return 200, {}
+
+    def _clear(self, a1):
+        title, box = parse_range(a1)
+        if box is not None:
+            return 400, {"error": "Only whole-tab clears are supported"}
+        self.sheets[title]["cells"].clear()
+        return 200, {}
+
+    def _fault(self, body):
+        fault = None
+        if self.faults:
+            fault = self.faults.popleft()
+        elif self.fail_rate and self._random.random() < self.fail_rate:
+            fault = 503, {}
+        elif self.max_request_bytes and len(body) > self.max_request_bytes:
+            fault = 413, {}
+        if fault is not None:
+            self.failures.append(fault)
+        return fault
+
+    def handle(self, method, path, body):
+        """Apply one API request; returns (status, JSON reply[, headers]) or DISCONNECT."""
+        with self.lock:
+            self.requests.append((method, path, body))
+            fault = self._fault(body)
+            if fault == self.DISCONNECT:
+                return fault
+            if fault is not None:
+                status, headers = fault
+                return status, {"error": {"code": status}}, headers
+            if method == "GET":
+                return self._metadata()
+            if path.endswith("/values:batchUpdate"):
+                return self._values_batch_update(json.loads(body))
+            if path.endswith(":batchUpdate"):
+                return self._batch_update(json.loads(body))
+            match = re.search(r"/values/(.+):clear$", path)
+            if match:
+                return self._clear(unquote(match.group(1)))
+        return 404, {"error": f"Unknown endpoint {method} {path}"}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                path = urlparse(self.path).path
+                if path == "/token":
+                    return self._reply(200, {"access_token": "fake-token", "expires_in": 3600, "token_type": "Bearer"})
+                if self.headers.get("Authorization") != "Bearer fake-token":
+                    return self._reply(401, {"error": "unauthenticated"})
+                reply = fake.handle(method, path, body)
+                if reply == fake.DISCONNECT:
+                    self.close_connection = True
+                    return
+                self._reply(*reply)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+        return Handler
@@ -0,0 +1,307 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+import requests
+
+from src import push_gold_to_sheets as push
+from fake_sheets import FakeSheets
+
+
+def users(n, start=0, rides=1):
+    return pd.DataFrame({
+        "user_id": [f"U{i:04d}" for i in range(start, start + n)],
+        "name": [f"User {i}" for i in range(start, start + n)],
+        "total_rides": [rides + i for i in range(start, start + n)],
+        "total_spent": [round(10.5 * i, 2) for i in range(start, start + n)],
+    })
+
+
+def expected_grid(df):
+    return [[str(column) for column in df.columns]] + push.frame_rows(df)
+
+
+def sheet_rows(fake, title):
+    """Data rows of the tab keyed by their first column, whatever their order."""
+    header, *rows = fake.grid(title)
+    width = len(header)
+    return header, {row[0]: row + [""] * (width - len(row)) for row in rows}
+
+
+def assert_tab_matches(fake, title, df):
+    header, rows = sheet_rows(fake, title)
+    assert header == [str(column) for column in df.columns]
+    assert rows == {row[0]: row for row in push.frame_rows(df)}
+
+
+# ---------------- ROW PLANNING ----------------
+def test_plan_row_writes_changed_and_added_rows():
+    old_keys = ["a", "b", "c", "d"]
+    old_rows = [["a", 1], ["b", 2], ["c", 3], ["d", 4]]
+    keys = ["a", "b", "d", "e"]
+    rows = [["a", 1], ["b", 20], ["d", 4], ["e", 5]]
+
+    layout, writes = push.plan_row_writes(old_keys, old_rows, keys, rows)
+
+    # e takes the row c was removed from; a and d stay where they are
+    assert layout == ["a", "b", "e", "d"]
+    assert writes == {1: ["b", 20], 2: ["e", 5]}
+    assert push.row_blocks(writes) == [(3, [["b", 20], ["e", 5]])]
+
+
+def test_plan_row_writes_removed_rows_are_filled_from_the_end():
+    old_keys = ["a", "b", "c", "d"]
+    old_rows = [["a", 1], ["b", 2], ["c", 3], ["d", 4]]
+
+    layout, writes = push.plan_row_writes(old_keys, old_rows, ["a", "c", "d"], [["a", 1], ["c", 3], ["d", 4]])
+
+    assert layout == ["a", "d", "c"]
+    # d moves into b's row and the last row is blanked
+    assert writes == {1: ["d", 4], 3: ["", ""]}
+    assert push.row_blocks(writes) == [(3, [["d", 4]]), (5, [["", ""]])]
+
+
+def test_plan_row_writes_appends_added_rows():
+    layout, writes = push.plan_row_writes(["a"], [["a", 1]], ["a", "b", "c"], [["a", 1], ["b", 2], ["c", 3]])
+
+    assert layout == ["a", "b", "c"]
+    assert push.row_blocks(writes) == [(3, [["b", 2], ["c", 3]])]
+
+
+def test_plan_row_writes_unchanged_rows_write_nothing():
+    rows = [["a", 1], ["b", 2]]
+    layout, writes = push.plan_row_writes(["a", "b"], rows, ["b", "a"], [["b", 2], ["a", 1]])
+
+    # Row order in the frame does not matter, only the keys' contents
+    assert layout == ["a", "b"]
+    assert writes == {}
+    assert push.row_blocks(writes) == []
+
+
+# ---------------- PUSHES AGAINST THE FAKE ----------------
+def test_first_push_writes_the_whole_table(fake_sheets):
+    df = users(50)
+
+    stats = push.push_df_to_gsheet(df, "users_data", "user_id")
+
+    assert stats["mode"] == "full"
+    assert stats["rows_written"] == 50
+    assert fake_sheets.grid("users_data") == expected_grid(df)
+    assert fake_sheets.grid_size("users_data") == (51, 4)
+
+
+def test_unchanged_table_sends_no_writes(fake_sheets):
+    df = users(50)
+    push.push_df_to_gsheet(df, "users_data", "user_id")
+    fake_sheets.requests.clear()
+
+    stats = push.push_df_to_gsheet(df, "users_data", "user_id")
+
+    assert stats["mode"] == "diff"
+    assert stats["rows_written"] == 0
+    assert stats["requests"] == 0
+    assert fake_sheets.writes() == []
+
+
+def test_diff_push_writes_only_changed_added_and_removed_rows(fake_sheets):
+    df = users(50)
+    push.push_df_to_gsheet(df, "users_data", "user_id")
+    fake_sheets.requests.clear()
+
+    changed = df.copy()
+    changed.loc[[3, 17], "total_rides"] += 1
+    changed = pd.concat([changed.drop(index=[5, 40]), users(3, start=100)], ignore_index=True)
+    stats = push.push_df_to_gsheet(changed, "users_data", "user_id")
+
+    assert (stats["mode"], stats["changed"], stats["added"], stats["removed"]) == ("diff", 2, 3, 2)
+    # Two changed rows, two added rows in the removed ones' places, one added row appended
+    assert stats["rows_written"] == 5
+    assert_tab_matches(fake_sheets, "users_data", changed)
+    written = [
+        value_range
+        for _, path, body in fake_sheets.writes() if path.endswith("/values:batchUpdate")
+        for value_range in json.loads(body)["data"]
+    ]
+    assert sum(len(value_range["values"]) for value_range in written) == 5
+
+
+def test_diff_push_after_shrinking_blanks_the_rows_left_over(fake_sheets):
+    df = users(20)
+    push.push_df_to_gsheet(df, "users_data", "user_id")
+
+    smaller = df.iloc[:12]
+    stats = push.push_df_to_gsheet(smaller, "users_data", "user_id")
+
+    assert stats["removed"] == 8
+    assert fake_sheets.grid("users_data") == expected_grid(smaller)
+
+
+def test_snapshot_is_ignored_when_the_tab_was_recreated(fake_sheets):
+    df = users(10)
+    push.push_df_to_gsheet(df, "users_data", "user_id")
+    # Someone deletes the tab and makes a new one with the same title (and a new sheetId)
+    fake_sheets.delete_sheet("users_data")
+    fake_sheets.add_sheet("users_data")
+
+    stats = push.push_df_to_gsheet(df, "users_data", "user_id")
+
+    assert stats["mode"] == "full"
+    assert fake_sheets.grid("users_data") == expected_grid(df)
+
+
+def test_snapshot_is_ignored_when_the_columns_change(fake_sheets):
+    df = users(10)
+    push.push_df_to_gsheet(df, "users_data", "user_id")
+
+    narrower = df.drop(columns=["total_spent"])
+    stats = push.push_df_to_gsheet(narrower, "users_data", "user_id")
+
+    assert stats["mode"] == "full"
+    assert fake_sheets.grid("users_data") == expected_grid(narrower)
+    assert fake_sheets.grid_size("users_data") == (11, 3)
+
+
+def test_snapshot_is_ignored_for_another_spreadsheet(fake_sheets):
+    df = users(10)
+    push.push_df_to_gsheet(df, "users_data", "user_id")
+    with open(os.path.join(push.SNAPSHOT_DIR, "users_data.json")) as f:
+        snapshot = json.load(f)
+    push.save_snapshot("users_data", {**snapshot, "spreadsheet_id": "some-other-sheet"})
+
+    stats = push.push_df_to_gsheet(df, "users_data", "user_id")
+
+    assert stats["mode"] == "full"
+
+
+def test_full_rewrite_clears_stale_content(fake_sheets):
+    # A tab filled by hand (or by a push whose snapshot is gone) with more rows and columns
+    fake_sheets.add_sheet("users_data", rows=200, cols=8)
+    push.push_df_to_gsheet(users(150, rides=7).assign(extra="x", more="y"), "users_data", "user_id")
+    os.remove(os.path.join(push.SNAPSHOT_DIR, "users_data.json"))
+
+    df = users(30)
+    stats = push.push_df_to_gsheet(df, "users_data", "user_id")
+
+    assert stats["mode"] == "full"
+    assert fake_sheets.grid("users_data") == expected_grid(df)
+    assert fake_sheets.grid_size("users_data") == (31, 4)
+
+
+def test_full_mode_rewrites_even_with_a_snapshot(fake_sheets):
+    df = users(10)
+    push.push_df_to_gsheet(df, "users_data", "user_id")
+    fake_sheets.requests.clear()
+
+    stats = push.push_df_to_gsheet(df, "users_data", "user_id", mode="full")
+
+    assert stats["mode"] == "full"
+    assert stats["rows_written"] == 10
+    assert any(path.endswith(":clear") for _, path, _ in fake_sheets.writes())
+    assert fake_sheets.grid("users_data") == expected_grid(df)
+
+
+def test_duplicate_keys_are_rejected(fake_sheets):
+    df = pd.concat([users(3), users(1)], ignore_index=True)
+
+    with pytest.raises(ValueError, match="Duplicate user_id"):
+        push.push_df_to_gsheet(df, "users_data", "user_id")
+    assert fake_sheets.writes() == []
+
+
+# ---------------- RETRIES, PACING AND CHUNKING ----------------
+def test_throttled_and_unavailable_responses_are_retried(fake_sheets, sleeps):
+    fake_sheets.faults.extend([(429, {"Retry-After": "7"}), (503, {})])
+
+    stats = push.push_df_to_gsheet(users(10), "users_data", "user_id")
+
+    assert stats["rows_written"] == 10
+    # Retry-After is honoured as is; the 503 gets a full-jitter backoff for the second attempt
+    assert sleeps[0] == 7.0
+    assert 0 <= sleeps[1] <= push.SHEETS_BACKOFF_SECONDS * 2
+    assert fake_sheets.grid("users_data") == expected_grid(users(10))
+
+
+def test_retries_give_up_after_max_retries(fake_sheets, sleeps, monkeypatch):
+    monkeypatch.setattr(push, "SHEETS_MAX_RETRIES", 2)
+    fake_sheets.faults.extend([(503, {})] * 3)
+
+    with pytest.raises(requests.HTTPError) as excinfo:
+        push.get_worksheets()
+
+    assert excinfo.value.response.status_code == 503
+    assert len(fake_sheets.requests) == 3
+    assert len(sleeps) == 2
+
+
+def test_client_errors_are_not_retried(fake_sheets, sleeps):
+    fake_sheets.faults.append((400, {}))
+
+    with pytest.raises(requests.HTTPError):
+        push.get_worksheets()
+
+    assert len(fake_sheets.requests) == 1
+    assert sleeps == []
+
+
+def test_dropped_connections_are_retried(fake_sheets, sleeps):
+    fake_sheets.faults.extend([FakeSheets.DISCONNECT, FakeSheets.DISCONNECT])
+
+    push.push_df_to_gsheet(users(10), "users_data", "user_id")
+
+    assert len(sleeps) == 2
+    assert fake_sheets.grid("users_data") == expected_grid(users(10))
+
+
+def test_dropped_connections_give_up_after_max_retries(fake_sheets, sleeps, monkeypatch):
+    monkeypatch.setattr(push, "SHEETS_MAX_RETRIES", 1)
+    fake_sheets.faults.extend([FakeSheets.DISCONNECT] * 2)
+
+    with pytest.raises(requests.ConnectionError):
+        push.get_worksheets()
+
+    assert len(fake_sheets.requests) == 2
+
+
+def test_writes_are_chunked_under_the_request_size_limit(fake_sheets, monkeypatch):
+    limit = 4000
+    monkeypatch.setattr(push, "SHEETS_MAX_REQUEST_BYTES", limit)
+    # The fake rejects anything bigger with 413, which is not retried
+    fake_sheets.max_request_bytes = limit
+    df = users(300)
+
+    stats = push.push_df_to_gsheet(df, "users_data", "user_id")
+
+    header = [str(column) for column in df.columns]
+    chunks = push.chunk_blocks([(1, [header] + push.frame_rows(df))])
+    value_writes = [body for _, path, body in fake_sheets.writes() if path.endswith("/values:batchUpdate")]
+    assert len(chunks) > 1
+    assert stats["requests"] == len(value_writes) == len(chunks)
+    assert max(len(body) for body in value_writes) <= limit
+    assert fake_sheets.grid("users_data") == expected_grid(df)
+
+
+def test_diff_push_survives_flaky_api(fake_sheets, monkeypatch):
+    monkeypatch.setattr(push, "SHEETS_MAX_REQUEST_BYTES", 4000)
+    fake_sheets.fail_rate = 0.3
+    df = users(300)
+    push.push_df_to_gsheet(df, "users_data", "user_id")
+
+    changed = df.copy()
+    changed.loc[::7, "total_spent"] += 1
+    changed = pd.concat([changed.drop(index=range(50, 90)), users(60, start=1000)], ignore_index=True)
+    stats = push.push_df_to_gsheet(changed, "users_data", "user_id")
+
+    assert stats["mode"] == "diff"
+    assert fake_sheets.failures
+    assert_tab_matches(fake_sheets, "users_data", changed)
+
+
+def test_token_bucket_spaces_out_requests_past_the_burst(sleeps):
+    bucket = push.TokenBucket(rate=1, capacity=2)
+
+    for _ in range(4):
+        bucket.acquire()
+
+    # Two requests go out at once; the next ones wait for a token each, one second apart
+    assert sleeps == [pytest.approx(1, abs=0.01), pytest.approx(2, abs=0.01)]
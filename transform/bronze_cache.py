@@ -0,0 +1,105 @@
+import hashlib
+import os
+
+import pandas as pd
+
+from transform.schemas import apply_schema, read_dtypes
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # cache disabled, bronze CSVs are parsed directly
+    pq = None
+
+# Set BRONZE_CACHE=0 to always parse the bronze CSVs
+BRONZE_CACHE = os.getenv("BRONZE_CACHE", "1") == "1"
+
+# Bump when the way a CSV is converted changes, so old cache files are not reused
+CACHE_VERSION = "1"
+
+CACHE_DIR_NAME = ".cache"
+
+
+# ---------------- CACHE KEYS ----------------
+def file_hash(path, dtypes=None, block_size=1 << 20):
+    # The schema is part of the key: the cached columns are stored already cast
+    digest = hashlib.sha256(CACHE_VERSION.encode())
+    digest.update(repr(sorted((dtypes or {}).items())).encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def cache_path(csv_path, dtypes=None):
+    """bronze_inputs/.cache/<name>-<content hash>.parquet for a bronze CSV."""
+    directory, file_name = os.path.split(os.path.abspath(csv_path))
+    stem = os.path.splitext(file_name)[0]
+    return os.path.join(directory, CACHE_DIR_NAME, f"{stem}-{file_hash(csv_path, dtypes)}.parquet")
+
+
+def _remove_stale(path):
+    directory, file_name = os.path.split(path)
+    prefix = file_name.rsplit("-", 1)[0] + "-"
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(".parquet") and name != file_name:
+            os.remove(os.path.join(directory, name))
+
+
+def _write_cache(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    _remove_stale(path)
+
+
+def _enabled():
+    return BRONZE_CACHE and pq is not None
+
+
+# ---------------- READERS ----------------
+def _read_csv(csv_path, columns=None, dtypes=None, **kwargs):
+    dtypes = dtypes or {}
+    return pd.read_csv(csv_path, usecols=columns, dtype=read_dtypes(dtypes), **kwargs)
+
+
+def read_bronze(csv_path, columns=None, dtypes=None):
+    """Read a bronze CSV through the Parquet cache, keeping only `columns`.
+
+    dtypes (see transform/schemas.py) are applied when the CSV is parsed. On a
+    miss the CSV is parsed once and its typed Parquet copy written next to it;
+    later reads of the same content load only the requested columns.
+    """
+    dtypes = dtypes or {}
+    if not _enabled():
+        return apply_schema(_read_csv(csv_path, columns, dtypes), dtypes)
+
+    path = cache_path(csv_path, dtypes)
+    if os.path.exists(path):
+        return pd.read_parquet(path, columns=columns)
+
+    df = apply_schema(_read_csv(csv_path, dtypes=dtypes), dtypes)
+    _write_cache(df, path)
+    return df[columns] if columns else df
+
+
+def iter_bronze(csv_path, chunksize, columns=None, dtypes=None):
+    """Yield a bronze CSV in DataFrame chunks of at most chunksize rows.
+
+    Reads record batches from the cache when it exists; a miss streams the CSV
+    itself, so a file is never held whole in memory in streaming mode.
+    """
+    dtypes = dtypes or {}
+    path = cache_path(csv_path, dtypes) if _enabled() else None
+    if path is None or not os.path.exists(path):
+        for chunk in _read_csv(csv_path, columns, dtypes, chunksize=chunksize):
+            yield apply_schema(chunk, dtypes)
+        return
+
+    offset = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+        chunk = batch.to_pandas()
+        # Row labels continue across chunks, as with read_csv(chunksize=...)
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
@@ -1,72 +1,41 @@
 import os
-import pandas as pd
-from datetime import datetime
 
-def clean_captains_data(bronze_file_path):
-    def safe_concat(df1, df2):
-        if df1.empty:
-            return df2.reset_index(drop=True)
-        if df2.empty:
-            return df1.reset_index(drop=True)
-        for col in df1.columns:
-            if col not in df2.columns:
-                df2[col] = pd.NA
-        for col in df2.columns:
-            if col not in df1.columns:
-                df1[col] = pd.NA
-        df2 = df2[df1.columns]
-        return pd.concat([df1, df2], ignore_index=True)
-
-    if not os.path.exists(bronze_file_path):
-        raise FileNotFoundError(f"Bronze file not found: {bronze_file_path}")
-
-    df = pd.read_csv(bronze_file_path)
-
-    rejects_columns = list(df.columns) + ['reason', 'run_ts']
-    df_rejects = pd.DataFrame(columns=rejects_columns)
+from transform.bronze_cache import read_bronze
+from transform.rules import compile_rules
+from transform.schemas import BRONZE_SCHEMAS
+from transform.streaming import DEFAULT_CHUNKSIZE
 
+RULES = [
     # Drop rows with null captain_id
-    null_cid_mask = df['captain_id'].isna()
-    if null_cid_mask.any():
-        null_cid = df[null_cid_mask].copy()
-        null_cid['reason'] = 'null_captain_id'
-        null_cid['run_ts'] = datetime.now()
-        df_rejects = safe_concat(df_rejects, null_cid)
-    df_clean = df[~null_cid_mask].copy()
-
+    {'rule': 'not_null', 'column': 'captain_id', 'reason': 'null_captain_id'},
     # Keep first and drop duplicates captain_id
-    duplicate_mask = df_clean['captain_id'].duplicated(keep='first')
-    if duplicate_mask.any():
-        duplicates = df_clean[duplicate_mask].copy()
-        duplicates['reason'] = 'duplicate_captain_id'
-        duplicates['run_ts'] = datetime.now()
-        df_rejects = safe_concat(df_rejects, duplicates)
-    df_clean = df_clean[~duplicate_mask].copy()
-
-    # Convert age and rating to numeric
-    df_clean['age'] = pd.to_numeric(df_clean['age'], errors='coerce')
-    df_clean['rating'] = pd.to_numeric(df_clean['rating'], errors='coerce')
-
+    {'rule': 'unique', 'column': 'captain_id', 'reason': 'duplicate_captain_id'},
     # Fill missing city with 'Unknown' and trim strings
-    df_clean['city'] = df_clean['city'].fillna('Unknown').astype(str).str.strip()
-
+    {'rule': 'fill', 'column': 'city', 'value': 'Unknown', 'strip': True},
     # Fill null age and rating with median
-    median_age = df_clean['age'].median()
-    median_rating = df_clean['rating'].median()
+    {'rule': 'impute', 'column': 'age', 'how': 'median', 'dtype': int},
+    {'rule': 'impute', 'column': 'rating', 'how': 'median', 'decimals': 1},
+    # Reject rows with null or empty name
+    {'rule': 'non_empty', 'column': 'name', 'reason': 'null_or_empty_name'},
+    # Keep only required columns
+    {'rule': 'select', 'columns': ['captain_id', 'name', 'age', 'city', 'rating']},
+]
 
-    df_clean['age'] = df_clean['age'].fillna(median_age).astype(int)
-    df_clean['rating'] = df_clean['rating'].fillna(median_rating).round(1)
+PLAN = compile_rules(RULES)
 
-    # Reject rows with null or empty name
-    null_name_mask = df_clean['name'].isna() | (df_clean['name'].str.strip() == '')
-    if null_name_mask.any():
-        null_names = df_clean[null_name_mask].copy()
-        null_names['reason'] = 'null_or_empty_name'
-        null_names['run_ts'] = datetime.now()
-        df_rejects = safe_concat(df_rejects, null_names)
-    df_clean = df_clean[~null_name_mask].copy()
+# Bronze columns the cleaner reads (all others are skipped) and their dtypes
+BRONZE_SCHEMA = BRONZE_SCHEMAS['captains']
+BRONZE_COLUMNS = list(BRONZE_SCHEMA)
 
-    # Keep only required columns
-    df_clean = df_clean[['captain_id', 'name', 'age', 'city', 'rating']]
+def clean_captains_data(bronze_file_path, run_ts=None):
+    if not os.path.exists(bronze_file_path):
+        raise FileNotFoundError(f"Bronze file not found: {bronze_file_path}")
+
+    df = read_bronze(bronze_file_path, BRONZE_COLUMNS, BRONZE_SCHEMA)
+    return PLAN.clean(df, run_ts=run_ts)
 
-    return df_clean.reset_index(drop=True), df_rejects.reset_index(drop=True)
+def iter_clean_captains_data(bronze_file_path, run_ts=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Streaming clean_captains_data: yields (clean, rejects) per chunk of the bronze file."""
+    if not os.path.exists(bronze_file_path):
+        raise FileNotFoundError(f"Bronze file not found: {bronze_file_path}")
+    return PLAN.iter_clean(bronze_file_path, chunksize, run_ts=run_ts, columns=BRONZE_COLUMNS, dtypes=BRONZE_SCHEMA)
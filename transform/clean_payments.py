@@ -1,53 +1,34 @@
-import pandas as pd
-from datetime import datetime
-
-def safe_concat(df1, df2):
-    """Concatenate two DataFrames safely, avoiding FutureWarning from empty/all-NA DataFrames."""
-    if df1.empty:
-        return df2.reset_index(drop=True)
-    if df2.empty:
-        return df1.reset_index(drop=True)
-    for col in df1.columns:
-        if col not in df2.columns:
-            df2[col] = pd.NA
-    for col in df2.columns:
-        if col not in df1.columns:
-            df1[col] = pd.NA
-    df2 = df2[df1.columns]
-    return pd.concat([df1, df2], ignore_index=True)
-
-
-def clean_payments_data(bronze_file_path, valid_ride_ids):
-    df = pd.read_csv(bronze_file_path)
-
-    rejects_cols = list(df.columns) + ['reason', 'run_ts']
-    df_rejects = pd.DataFrame(columns=rejects_cols)
+from transform.bronze_cache import read_bronze
+from transform.rules import compile_rules
+from transform.schemas import BRONZE_SCHEMAS
+from transform.streaming import DEFAULT_CHUNKSIZE
 
-    # Reject null or empty ride_id
-    null_ride_id_mask = df['ride_id'].isna() | (df['ride_id'].astype(str).str.strip() == '')
-    if null_ride_id_mask.any():
-        rejected = df[null_ride_id_mask].copy()
-        rejected['reason'] = 'null_or_empty_ride_id'
-        rejected['run_ts'] = datetime.now()
-        df_rejects = safe_concat(df_rejects, rejected)
-    df_clean = df[~null_ride_id_mask].copy()
 
+RULES = [
+    # Reject null or empty ride_id
+    {'rule': 'non_empty', 'column': 'ride_id', 'reason': 'null_or_empty_ride_id'},
     # Reject payments with ride_id not in cleaned rides
-    invalid_ride_mask = ~df_clean['ride_id'].isin(valid_ride_ids)
-    if invalid_ride_mask.any():
-        invalid_payments = df_clean[invalid_ride_mask].copy()
-        invalid_payments['reason'] = 'invalid_ride_id_not_in_rides'
-        invalid_payments['run_ts'] = datetime.now()
-        df_rejects = safe_concat(df_rejects, invalid_payments)
-    df_clean = df_clean[~invalid_ride_mask].copy()
-
+    {'rule': 'in_set', 'column': 'ride_id', 'values': 'valid_ride_ids', 'reason': 'invalid_ride_id_not_in_rides'},
     # Convert fare to numeric and fill NA with median
-    df_clean['fare'] = pd.to_numeric(df_clean['fare'], errors='coerce')
-    median_fare = df_clean['fare'].median()
-    df_clean['fare'] = df_clean['fare'].fillna(median_fare)
-
+    {'rule': 'impute', 'column': 'fare', 'how': 'median'},
     # Fill null discount_percent, discount_amount, final_amount with 0
-    for col in ['discount_percent', 'discount_amount', 'final_amount']:
-        df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce').fillna(0)
+    {'rule': 'fill', 'column': 'discount_percent', 'value': 0, 'numeric': True},
+    {'rule': 'fill', 'column': 'discount_amount', 'value': 0, 'numeric': True},
+    {'rule': 'fill', 'column': 'final_amount', 'value': 0, 'numeric': True},
+]
+
+PLAN = compile_rules(RULES)
+
+# Bronze columns the cleaner reads (all others are skipped) and their dtypes
+BRONZE_SCHEMA = BRONZE_SCHEMAS['payments']
+BRONZE_COLUMNS = list(BRONZE_SCHEMA)
+
+
+def clean_payments_data(bronze_file_path, valid_ride_ids, run_ts=None):
+    df = read_bronze(bronze_file_path, BRONZE_COLUMNS, BRONZE_SCHEMA)
+    return PLAN.clean(df, {'valid_ride_ids': valid_ride_ids}, run_ts)
+
 
-    return df_clean.reset_index(drop=True), df_rejects.reset_index(drop=True)
+def iter_clean_payments_data(bronze_file_path, valid_ride_ids, run_ts=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Streaming clean_payments_data: yields (clean, rejects) per chunk of the bronze file."""
+    return PLAN.iter_clean(bronze_file_path, chunksize, {'valid_ride_ids': valid_ride_ids}, run_ts, columns=BRONZE_COLUMNS, dtypes=BRONZE_SCHEMA)
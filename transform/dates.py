@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+# Ordered formats tried per column; the first format that parses a value wins
+DATE_FORMATS = {
+    'signup_date': ["%Y-%m-%d", "%d/%m/%Y", "%d.%m.%Y", "%m/%d/%Y"],
+    'ride_date': ["%Y-%m-%d", "%d/%m/%Y", "%d.%m.%Y", "%m-%d-%Y"],
+}
+
+
+def parse_dates(values, formats, strip=True):
+    """Vectorized multi-format date parsing; unparseable or null values become NaT.
+
+    Each distinct string is parsed once: the distinct values are tried against
+    one format at a time as a whole-column to_datetime pass, only over those
+    still unparsed, and the results are mapped back onto the rows.
+    """
+    codes, uniques = pd.factorize(values)
+    if len(uniques) == 0:
+        return pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+
+    keys = pd.Series(np.asarray(uniques, dtype=object)).astype(str)
+    if strip:
+        keys = keys.str.strip()
+
+    parsed = pd.Series(pd.NaT, index=keys.index, dtype="datetime64[ns]")
+    pending = pd.Series(True, index=keys.index)
+    for fmt in formats:
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(keys[pending], format=fmt, errors="coerce")
+        hits = attempt.index[attempt.notna()]
+        parsed[hits] = attempt[hits]
+        pending[hits] = False
+
+    mapped = parsed.to_numpy()[codes]
+    mapped[codes == -1] = np.datetime64("NaT")
+    return pd.Series(mapped, index=values.index)
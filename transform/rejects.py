@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from transform.streaming import mark_duplicates
+
+# Reason code for rows discarded without an audit record (e.g. duplicate users)
+DROPPED = -1
+
+
+# ---------------- REJECT COLLECTOR ----------------
+class RejectCollector:
+    """Records the first failing rule for each row of a bronze frame.
+
+    Rules only label rows (one small integer per row); clean and rejected rows
+    are split once at the end. Rejected rows keep their raw bronze values and
+    are stamped with a single run_ts.
+    """
+
+    def __init__(self, df, run_ts=None):
+        self.raw = df
+        self.codes = np.zeros(len(df), dtype=np.int16)
+        self.reasons = [None]
+        self.run_ts = run_ts or datetime.now()
+
+    @property
+    def active(self):
+        """Rows that have passed every rule so far."""
+        return self.codes == 0
+
+    def _code(self, reason):
+        if reason not in self.reasons:
+            self.reasons.append(reason)
+        return self.reasons.index(reason)
+
+    def reject(self, mask, reason):
+        # Register the reason even when nothing fails, so codes follow rule order
+        code = self._code(reason)
+        mask = np.asarray(mask, dtype=bool) & self.active
+        self.codes[mask] = code
+
+    def drop(self, mask):
+        mask = np.asarray(mask, dtype=bool) & self.active
+        self.codes[mask] = DROPPED
+
+    def duplicates(self, values, seen):
+        """Mask of active rows whose value already appeared (earlier in this frame or in `seen`)."""
+        mask = np.zeros(len(values), dtype=bool)
+        active = self.active
+        mask[active] = mark_duplicates(values[active], seen).to_numpy()
+        return mask
+
+    def split(self, df_clean):
+        """Return (clean rows of df_clean, rejects) with rejects grouped in rule order."""
+        clean = df_clean[self.active].reset_index(drop=True)
+
+        rejected = np.flatnonzero(self.codes > 0)
+        rejected = rejected[np.argsort(self.codes[rejected], kind='stable')]
+        rejects = self.raw.iloc[rejected].reset_index(drop=True)
+        rejects['reason'] = np.asarray(self.reasons, dtype=object)[self.codes[rejected]]
+        rejects['run_ts'] = pd.Timestamp(self.run_ts)
+        return clean, rejects
@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+
+from src import telemetry
+from transform.dates import DATE_FORMATS, parse_dates
+from transform.rejects import RejectCollector
+from transform.streaming import compute_stats, isin, stream_clean
+
+
+# ---------------- RULE TYPES ----------------
+# Each rule is a dict {'rule': <type>, 'column': ..., 'reason': ..., <options>}.
+# A rule type turns its dict into a step(work, collector, ctx) that is applied
+# to the whole frame at once; ctx holds 'seen' (cross-chunk duplicate state),
+# 'sets' (named runtime sets for in_set) and 'stats' (impute values).
+
+def _numeric(values):
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _fillna(values, value):
+    """fillna that also works when value is not yet a category of a categorical column."""
+    if isinstance(values.dtype, pd.CategoricalDtype) and value is not None and value not in values.cat.categories:
+        values = values.cat.add_categories([value])
+    return values.fillna(value)
+
+
+def _blank(values):
+    """Null or whitespace-only values; the string check runs once per distinct value."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.isna().to_numpy()
+    codes, uniques = pd.factorize(values)
+    blank = pd.Series(np.asarray(uniques, dtype=object), dtype=object).astype(str).str.strip().eq('').to_numpy()
+    # code -1 (null) picks the trailing True
+    return np.append(blank, True)[codes]
+
+
+def _not_null(rule):
+    column, reason = rule['column'], rule['reason']
+
+    def step(work, rc, ctx):
+        rc.reject(work[column].isna(), reason)
+    return step
+
+
+def _non_empty(rule):
+    column, reason = rule['column'], rule['reason']
+
+    def step(work, rc, ctx):
+        rc.reject(_blank(work[column]), reason)
+    return step
+
+
+def _in_set(rule):
+    column, name, reason = rule['column'], rule['values'], rule['reason']
+
+    def step(work, rc, ctx):
+        rc.reject(~isin(work[column], ctx['sets'][name]), reason)
+    return step
+
+
+def _unique(rule):
+    """Keep the first occurrence; a reason of None drops repeats without an audit row."""
+    column, reason = rule['column'], rule.get('reason')
+
+    def step(work, rc, ctx):
+        mask = rc.duplicates(work[column], ctx['seen'].setdefault(column, set()))
+        if reason is None:
+            rc.drop(mask)
+        else:
+            rc.reject(mask, reason)
+    return step
+
+
+def _range(rule):
+    column, reason = rule['column'], rule['reason']
+    low, high = rule.get('min'), rule.get('max')
+
+    def step(work, rc, ctx):
+        values = _numeric(work[column])
+        mask = np.zeros(len(values), dtype=bool)
+        if low is not None:
+            mask |= (values < low).to_numpy()
+        if high is not None:
+            mask |= (values > high).to_numpy()
+        rc.reject(mask, reason)
+    return step
+
+
+def _parse_date(rule):
+    column, reason = rule['column'], rule['reason']
+    formats = rule.get('formats', DATE_FORMATS.get(column))
+    strip, output = rule.get('strip', True), rule.get('output', '%Y-%m-%d')
+
+    def step(work, rc, ctx):
+        parsed = parse_dates(work[column], formats, strip=strip)
+        rc.reject(parsed.isna(), reason)
+        work[column] = parsed.dt.strftime(output)
+    return step
+
+
+def _impute(rule):
+    column, how = rule['column'], rule['how']
+    dtype, decimals, default = rule.get('dtype'), rule.get('decimals'), rule.get('default')
+
+    def step(work, rc, ctx):
+        value = ctx['stats'][column]
+        if how == 'median':
+            filled = _numeric(work[column])
+            if pd.api.types.is_integer_dtype(filled):
+                # The median may be fractional; nullable ints would refuse it
+                filled = filled.astype('Float64')
+            filled = filled.fillna(value)
+        else:
+            filled = _fillna(work[column], value if value is not None else default)
+        if dtype is not None:
+            filled = filled.astype(dtype)
+        if decimals is not None:
+            filled = filled.round(decimals)
+        work[column] = filled
+    return step
+
+
+def _fill(rule):
+    """Fill nulls with a constant; options: empty ('' counts as null), numeric, strip."""
+    column, value = rule['column'], rule['value']
+    empty, numeric, strip = rule.get('empty', False), rule.get('numeric', False), rule.get('strip', False)
+
+    def step(work, rc, ctx):
+        values = work[column]
+        if numeric:
+            values = _numeric(values)
+        if empty:
+            values = values.replace('', pd.NA)
+        values = _fillna(values, value)
+        if strip:
+            values = values.astype(str).str.strip()
+        work[column] = values
+    return step
+
+
+RULE_TYPES = {
+    'not_null': _not_null,
+    'non_empty': _non_empty,
+    'in_set': _in_set,
+    'unique': _unique,
+    'range': _range,
+    'parse_date': _parse_date,
+    'impute': _impute,
+    'fill': _fill,
+}
+
+
+# ---------------- COMPILED PLAN ----------------
+class RulePlan:
+    """A table's rule spec compiled into an ordered list of vectorized steps.
+
+    Rules run in spec order and a row is attributed to the first rule it fails.
+    Steps before the first impute form the filter phase; impute statistics are
+    taken over the rows still active after it, and the remaining steps run once
+    the statistics are known (in memory, or after a first pass when streaming).
+    """
+
+    def __init__(self, spec):
+        self.spec = list(spec)
+        self.columns = None
+        steps = []
+        for rule in self.spec:
+            if rule['rule'] == 'select':
+                self.columns = list(rule['columns'])
+                continue
+            if rule['rule'] not in RULE_TYPES:
+                raise ValueError(f"Unknown rule type: {rule['rule']}")
+            steps.append((rule, RULE_TYPES[rule['rule']](rule)))
+
+        first_impute = next((i for i, (rule, _) in enumerate(steps) if rule['rule'] == 'impute'), len(steps))
+        self.filter_steps = [step for _, step in steps[:first_impute]]
+        self.finalize_steps = [step for _, step in steps[first_impute:]]
+        self.stat_columns = {
+            rule['column']: (rule['how'], _numeric if rule['how'] == 'median' else None)
+            for rule, _ in steps if rule['rule'] == 'impute'
+        }
+
+    def filter(self, df, seen, sets=None, run_ts=None):
+        rc = RejectCollector(df, run_ts)
+        work = df.copy(deep=False)
+        ctx = {'seen': seen, 'sets': sets or {}}
+        for step in self.filter_steps:
+            step(work, rc, ctx)
+        return work, rc
+
+    def finalize(self, work, rc, stats):
+        ctx = {'stats': stats}
+        for step in self.finalize_steps:
+            step(work, rc, ctx)
+        # Bronze rows in, counted once per row (the streaming stats pass does not finalize)
+        telemetry.count(rows_in=len(rc.raw))
+        return rc.split(work[self.columns] if self.columns else work)
+
+    def clean(self, df, sets=None, run_ts=None):
+        work, rc = self.filter(df, {}, sets, run_ts)
+        return self.finalize(work, rc, compute_stats(work, rc.active, self.stat_columns))
+
+    def iter_clean(self, bronze_file_path, chunksize, sets=None, run_ts=None, columns=None, dtypes=None):
+        return stream_clean(
+            bronze_file_path, chunksize,
+            lambda chunk, seen: self.filter(chunk, seen, sets, run_ts),
+            self.finalize, self.stat_columns, columns, dtypes,
+        )
+
+
+def compile_rules(spec):
+    return RulePlan(spec)
@@ -0,0 +1,88 @@
+import importlib.util
+
+import pandas as pd
+
+# Arrow-backed strings when pyarrow is installed, Python object strings otherwise
+TEXT = "string[pyarrow]" if importlib.util.find_spec("pyarrow") else "string"
+CATEGORY = "category"
+INT = "Int64"
+FLOAT = "Float64"
+
+# ---------------- BRONZE SCHEMAS ----------------
+# pandas dtype per bronze column, in file order. Follows the silver DDL in
+# src/transform_data.py: VARCHAR/TEXT ids and free text -> TEXT, columns with
+# a handful of distinct values -> CATEGORY, INT -> INT, DECIMAL -> FLOAT.
+# Dates stay TEXT, the cleaners parse them. Bronze itself (create_table_queries
+# in src/extraction.py) stores every column as TEXT.
+BRONZE_SCHEMAS = {
+    'users': {
+        'user_id': TEXT,
+        'name': TEXT,
+        'gender': CATEGORY,
+        'age': INT,
+        'signup_date': TEXT,
+        'city': CATEGORY,
+    },
+    'captains': {
+        'captain_id': TEXT,
+        'name': TEXT,
+        'age': INT,
+        'city': CATEGORY,
+        'rating': FLOAT,
+    },
+    'rides': {
+        'ride_id': TEXT,
+        'user_id': TEXT,
+        'captain_id': TEXT,
+        'ride_date': TEXT,
+        'pickup_loc': CATEGORY,
+        'drop_loc': CATEGORY,
+        'distance_km': FLOAT,
+        'duration_min': INT,
+        'ride_status': CATEGORY,
+    },
+    'payments': {
+        'payment_id': TEXT,
+        'ride_id': TEXT,
+        'payment_method': CATEGORY,
+        'fare': FLOAT,
+        'discount_percent': FLOAT,
+        'discount_amount': FLOAT,
+        'final_amount': FLOAT,
+        'payment_status': CATEGORY,
+    },
+    'feedback': {
+        'feedback_id': TEXT,
+        'ride_id': TEXT,
+        'user_rating': FLOAT,
+        'captain_rating': FLOAT,
+        'issue_category': CATEGORY,
+        'comments': TEXT,
+    },
+}
+
+
+def read_dtypes(dtypes):
+    """dtype argument for read_csv: text and categories are parsed directly,
+    numbers are left to inference and coerced by apply_schema."""
+    return {col: dtype for col, dtype in dtypes.items() if dtype not in (INT, FLOAT)}
+
+
+def _to_number(values, dtype):
+    numbers = pd.to_numeric(values, errors='coerce')
+    if dtype == INT and not (numbers.dropna() % 1 == 0).all():
+        # Fractional values in an INT column are kept rather than truncated
+        return numbers.astype(FLOAT)
+    return numbers.astype(dtype)
+
+
+def apply_schema(df, dtypes):
+    """Cast df's columns to the schema; unparseable numbers become NA."""
+    for col, dtype in dtypes.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype in (INT, FLOAT):
+            df[col] = _to_number(df[col], dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
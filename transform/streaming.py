@@ -0,0 +1,116 @@
+import pandas as pd
+
+from transform.bronze_cache import iter_bronze
+
+# Default number of bronze rows held in memory at a time in streaming mode
+DEFAULT_CHUNKSIZE = 100_000
+
+
+# ---------------- RUNNING STATISTICS ----------------
+class RunningStats:
+    """Exact median/mode over a column seen one chunk at a time.
+
+    Keeps a histogram of distinct values rather than the values themselves, so
+    memory grows with the number of distinct values, not with the row count.
+    """
+
+    def __init__(self):
+        self.counts = pd.Series(dtype="float64")
+
+    def update(self, values):
+        chunk_counts = values.value_counts(dropna=True)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Categorical counts list every category; keep the observed ones, keyed by label
+            chunk_counts = chunk_counts[chunk_counts > 0]
+            chunk_counts.index = chunk_counts.index.astype(object)
+        if self.counts.empty:
+            self.counts = chunk_counts.astype("float64")
+        else:
+            self.counts = self.counts.add(chunk_counts, fill_value=0)
+
+    def median(self):
+        if self.counts.empty:
+            return float("nan")
+        counts = self.counts.sort_index()
+        total = counts.sum()
+        cumulative = counts.cumsum()
+        # Same definition as Series.median(): middle value, or mean of the two middle values
+        lower = counts.index[cumulative.searchsorted((total - 1) // 2 + 1)]
+        upper = counts.index[cumulative.searchsorted(total // 2 + 1)]
+        return (lower + upper) / 2
+
+    def mode(self, default=None):
+        if self.counts.empty:
+            return default
+        top = self.counts[self.counts == self.counts.max()]
+        return sorted(top.index)[0]
+
+
+# ---------------- MEMBERSHIP ----------------
+def isin(values, lookup):
+    """values.isin(lookup) as a boolean Series.
+
+    Arrow-backed string columns rebuild the lookup element by element in Python
+    on every isin call, so they are checked as object arrays, which hash it once.
+    """
+    if isinstance(values.dtype, pd.StringDtype):
+        values = values.astype(object)
+    return values.isin(lookup)
+
+
+# ---------------- CROSS-CHUNK DUPLICATES ----------------
+def mark_duplicates(values, seen):
+    """Mask of values already in `seen` or repeated earlier in this chunk; records the new ones."""
+    if isinstance(values.dtype, pd.StringDtype):
+        values = values.astype(object)
+    mask = values.duplicated(keep="first") | values.isin(seen)
+    seen.update(values[~mask])
+    return mask
+
+
+# ---------------- STATISTICS ----------------
+def compute_stats(work, active, stat_columns):
+    """Median/mode of each stat column over the rows still active, for in-memory cleaning."""
+    stats = {}
+    for col, (kind, convert) in stat_columns.items():
+        values = work[col][active]
+        values = convert(values) if convert else values
+        if kind == 'median':
+            stats[col] = values.median()
+        else:
+            modes = values.mode()
+            stats[col] = modes[0] if not modes.empty else None
+    return stats
+
+
+# ---------------- STREAMING DRIVER ----------------
+def stream_clean(bronze_file_path, chunksize, filter_chunk, finalize_chunk, stat_columns=None, columns=None, dtypes=None):
+    """Clean a bronze CSV chunk by chunk, yielding (clean, rejects) per chunk.
+
+    filter_chunk(df, seen) applies the row rules and returns (work, collector);
+    `seen` carries duplicate-detection state between chunks.
+    finalize_chunk(work, collector, stats) imputes using the whole-file
+    statistics and returns (clean, rejects).
+    stat_columns maps column -> (kind, converter) with kind 'median' or 'mode'.
+    When statistics are needed a first pass over the file collects them, so the
+    imputed values are the same as in the in-memory cleaners. columns and
+    dtypes select and type the bronze columns read.
+    """
+    stat_columns = stat_columns or {}
+    stats = {}
+
+    if stat_columns:
+        running = {col: RunningStats() for col in stat_columns}
+        seen = {}
+        for chunk in iter_bronze(bronze_file_path, chunksize, columns, dtypes):
+            work, collector = filter_chunk(chunk, seen)
+            for col, (kind, convert) in stat_columns.items():
+                values = work[col][collector.active]
+                running[col].update(convert(values) if convert else values)
+        for col, (kind, _) in stat_columns.items():
+            stats[col] = running[col].median() if kind == 'median' else running[col].mode()
+
+    seen = {}
+    for chunk in iter_bronze(bronze_file_path, chunksize, columns, dtypes):
+        work, collector = filter_chunk(chunk, seen)
+        yield finalize_chunk(work, collector, stats)